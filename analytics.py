@@ -2,51 +2,146 @@
 
 Key pattern: ANALYTICS|{event_type}|{YYYY-MM-DD}
 All daily keys get 90-day TTL for auto-cleanup.
+
+``track`` doesn't touch Redis. Events are aggregated in process (per
+event, day and user) and written as one pipeline every
+``ANALYTICS_FLUSH_INTERVAL`` seconds (default 1) by a background greenlet,
+and once more at exit. Readers see the same keys, at most one interval
+late; an interval of 0 writes every event through immediately.
+
+Active and known users are counted with HyperLogLogs
+(``ANALYTICS|dau_hll|{date}``, ``ANALYTICS|known_users_hll``): about 12KB
+each whatever the user count, and 0.81% standard error. Week and month
+actives are one PFCOUNT over the daily keys. The exact email sets
+(``ANALYTICS|dau|{date}``, ``ANALYTICS|known_users``) are only written with
+``ANALYTICS_EXACT_USERS: true``; per-user event counts stay exact either way.
 """
 
+import atexit
+import collections
 import datetime
 import logging
 
+import gevent
+
+from config import CONF
+
 logger = logging.getLogger(__name__)
 
 _TTL_DAYS = 90
 _TTL_SECONDS = _TTL_DAYS * 86400
+_DEFAULT_FLUSH_INTERVAL = 1.0
+_KNOWN_USERS_HLL = "ANALYTICS|known_users_hll"
+_HLL_MIGRATED_KEY = "ANALYTICS|hll_migrated"   # exact user sets already folded in
 
 
 def _today():
     return datetime.date.today().isoformat()
 
 
-def track(r, event_type, email=None, metadata=None):
-    """Record an event. Fire-and-forget — failures are logged, never raised."""
-    try:
-        date = _today()
-        pipe = r.pipeline(transaction=False)
+class _Pending(object):
+    """Unwritten counts for one Redis client."""
 
-        # Increment per-user counter for this event (sorted set)
+    def __init__(self, r):
+        self.r = r
+        self.events = collections.defaultdict(collections.Counter)   # (event, date) -> {email: n}
+        self.dau = collections.defaultdict(set)                      # date -> {email}
+        self.known_users = set()
+        self.totals = collections.defaultdict(collections.Counter)   # date -> {event: n}
+
+    def add(self, event_type, email, date):
         if email:
+            self.events[(event_type, date)][email] += 1
+            self.dau[date].add(email)
+            self.known_users.add(email)
+        self.totals[date][event_type] += 1
+
+    def write(self):
+        exact = _exact_users()
+        pipe = self.r.pipeline(transaction=False)
+        for (event_type, date), counts in self.events.items():
             event_key = f"ANALYTICS|{event_type}|{date}"
-            pipe.zincrby(event_key, 1, email)
+            for email, n in counts.items():
+                pipe.zincrby(event_key, n, email)
             pipe.expire(event_key, _TTL_SECONDS)
-
-            # Track daily active users
-            dau_key = f"ANALYTICS|dau|{date}"
-            pipe.sadd(dau_key, email)
+        for date, emails in self.dau.items():
+            dau_key = f"ANALYTICS|dau_hll|{date}"
+            pipe.pfadd(dau_key, *emails)
             pipe.expire(dau_key, _TTL_SECONDS)
+            if exact:
+                pipe.sadd(f"ANALYTICS|dau|{date}", *emails)
+                pipe.expire(f"ANALYTICS|dau|{date}", _TTL_SECONDS)
+        if self.known_users:
+            # Globally known users (no TTL)
+            pipe.pfadd(_KNOWN_USERS_HLL, *self.known_users)
+            if exact:
+                pipe.sadd("ANALYTICS|known_users", *self.known_users)
+        for date, counts in self.totals.items():
+            totals_key = f"ANALYTICS|totals|{date}"
+            for event_type, n in counts.items():
+                pipe.hincrby(totals_key, event_type, n)
+            pipe.expire(totals_key, _TTL_SECONDS)
+        pipe.execute()
 
-            # Track globally known users (no TTL)
-            pipe.sadd("ANALYTICS|known_users", email)
 
-        # Increment daily total for this event type
-        totals_key = f"ANALYTICS|totals|{date}"
-        pipe.hincrby(totals_key, event_type, 1)
-        pipe.expire(totals_key, _TTL_SECONDS)
+_pending = {}        # id(redis client) -> _Pending
+_flusher = None
 
-        pipe.execute()
+
+def _flush_interval():
+    interval = getattr(CONF, 'ANALYTICS_FLUSH_INTERVAL', None)
+    return _DEFAULT_FLUSH_INTERVAL if interval is None else float(interval)
+
+
+def _exact_users():
+    return bool(getattr(CONF, 'ANALYTICS_EXACT_USERS', None))
+
+
+def _flush_loop(interval):
+    while True:
+        gevent.sleep(interval)
+        flush()
+
+
+def _ensure_flusher(interval):
+    global _flusher
+    if _flusher is None:
+        _flusher = gevent.spawn(_flush_loop, interval)
+        atexit.register(flush)
+
+
+def track(r, event_type, email=None, metadata=None):
+    """Record an event. Fire-and-forget — failures are logged, never raised."""
+    try:
+        pending = _pending.get(id(r))
+        if pending is None:
+            pending = _pending[id(r)] = _Pending(r)
+        pending.add(event_type, email, _today())
+        interval = _flush_interval()
+        if interval > 0:
+            _ensure_flusher(interval)
+        else:
+            flush(r)
     except Exception:
         logger.debug("analytics.track failed for %s", event_type, exc_info=True)
 
 
+def flush(r=None):
+    """Write buffered events (for one client, or all) to Redis now."""
+    keys = [id(r)] if r is not None else list(_pending)
+    for key in keys:
+        # Swap the buffer out first: events tracked while the pipeline is
+        # in flight go into a fresh one.
+        pending = _pending.pop(key, None)
+        if pending is None:
+            continue
+        try:
+            pending.write()
+        except Exception:
+            logger.warning("analytics flush failed, %d events dropped",
+                           sum(sum(c.values()) for c in pending.totals.values()), exc_info=True)
+
+
 def get_daily_stats(r, date=None):
     """Return {event_type: count} for a given day."""
     date = date or _today()
@@ -55,31 +150,194 @@ def get_daily_stats(r, date=None):
 
 
 def get_daily_active_users(r, date=None):
-    """Return set of emails active on a given day."""
+    """Return set of emails active on a given day.
+
+    Only recorded with ANALYTICS_EXACT_USERS; use get_active_user_count for counts.
+    """
     date = date or _today()
     return r.smembers(f"ANALYTICS|dau|{date}")
 
 
+def get_active_user_count(r, days=1):
+    """Approximate distinct users active over the last N days (DAU/WAU/MAU)."""
+    keys = [f"ANALYTICS|dau_hll|{d.isoformat()}" for d in _dates(days)]
+    return r.pfcount(*keys) if keys else 0
+
+
+def migrate_user_sets(r):
+    """Fold the exact user sets into the HyperLogLogs.
+
+    Unless ANALYTICS_EXACT_USERS is set, the sets are deleted afterwards.
+    Otherwise they are kept and listed in ANALYTICS|hll_migrated, so later
+    runs skip them (new members already go to both). Returns the number of
+    sets folded.
+    """
+    exact = _exact_users()
+    sets = [(f"ANALYTICS|dau|{d.isoformat()}", f"ANALYTICS|dau_hll|{d.isoformat()}")
+            for d in _dates(_TTL_DAYS)]
+    sets.append(("ANALYTICS|known_users", _KNOWN_USERS_HLL))
+    done = r.smembers(_HLL_MIGRATED_KEY)
+    expired = done - {set_key for set_key, _ in sets}
+    if expired:
+        r.srem(_HLL_MIGRATED_KEY, *expired)
+    migrated = 0
+    for set_key, hll_key in sets:
+        if set_key in done or r.type(set_key) != 'set':
+            continue
+        ttl = r.ttl(set_key)
+        batch = []
+        for email in r.sscan_iter(set_key, count=1000):
+            batch.append(email)
+            if len(batch) >= 1000:
+                r.pfadd(hll_key, *batch)
+                batch = []
+        if batch:
+            r.pfadd(hll_key, *batch)
+        if ttl > 0:
+            r.expire(hll_key, ttl)
+        if exact:
+            r.sadd(_HLL_MIGRATED_KEY, set_key)
+        else:
+            r.delete(set_key)
+        migrated += 1
+    return migrated
+
+
+# ---------------------------------------------------------------------------
+# Rollups
+#
+# Once an ISO week (YYYY-Www) or a month (YYYY-MM) is over, rollup() sums
+# its daily keys into keys of the same layout with the period in place of
+# the date: ANALYTICS|{event_type}|{period} (per-user sorted set) and
+# ANALYTICS|totals|{period}. Rolled-up periods are listed in
+# ANALYTICS|rollups. Range readers cover whole closed periods with one key
+# and only read daily keys at the edges, all in one pipeline.
+# ---------------------------------------------------------------------------
+
+_ROLLUPS_KEY = "ANALYTICS|rollups"
+
+
+def _dates(days, today=None):
+    """The last *days* dates (datetime.date), oldest first."""
+    today = today or datetime.date.today()
+    return [today - datetime.timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+
+
+def _week_id(day):
+    iso = day.isocalendar()
+    return '%d-W%02d' % (iso[0], iso[1])
+
+
+def _periods(day):
+    """(period id, first day, last day) for the month and week starting on *day*."""
+    periods = []
+    if day.day == 1:
+        next_month = (day + datetime.timedelta(days=31)).replace(day=1)
+        periods.append((day.strftime('%Y-%m'), day, next_month - datetime.timedelta(days=1)))
+    if day.weekday() == 0:
+        periods.append((_week_id(day), day, day + datetime.timedelta(days=6)))
+    return periods
+
+
+def _segments(r, days, today=None):
+    """Key suffixes (dates or rolled-up periods) covering the last *days* days."""
+    dates = _dates(days, today)
+    if not dates:
+        return []
+    rolled_up = r.smembers(_ROLLUPS_KEY)
+    segments, day = [], dates[0]
+    while day <= dates[-1]:
+        for period, _, last in _periods(day):
+            if period in rolled_up and last <= dates[-1]:
+                segments.append(period)
+                day = last + datetime.timedelta(days=1)
+                break
+        else:
+            segments.append(day.isoformat())
+            day += datetime.timedelta(days=1)
+    return segments
+
+
+def rollup(r, today=None):
+    """Roll up every closed week and month still within the daily TTL.
+
+    Returns the number of periods rolled up. Run periodically by the
+    master player; already rolled-up periods are skipped.
+    """
+    today = today or datetime.date.today()
+    oldest = today - datetime.timedelta(days=_TTL_DAYS - 1)
+    rolled_up = r.smembers(_ROLLUPS_KEY)
+    done = 0
+    for day in _dates(_TTL_DAYS, today):
+        for period, first, last in _periods(day):
+            if period in rolled_up or last >= today or first < oldest:
+                continue
+            dates = [d.isoformat() for d in _dates((last - first).days + 1, last)]
+            pipe = r.pipeline(transaction=False)
+            for date in dates:
+                pipe.hgetall(f"ANALYTICS|totals|{date}")
+            totals = collections.Counter()
+            for raw in pipe.execute():
+                totals.update({k: int(v) for k, v in raw.items()})
+
+            pipe = r.pipeline(transaction=False)
+            for event_type in totals:
+                event_key = f"ANALYTICS|{event_type}|{period}"
+                pipe.zunionstore(event_key, [f"ANALYTICS|{event_type}|{date}" for date in dates])
+                pipe.expire(event_key, _TTL_SECONDS)
+            if totals:
+                totals_key = f"ANALYTICS|totals|{period}"
+                pipe.delete(totals_key)
+                pipe.hset(totals_key, mapping=dict(totals))
+                pipe.expire(totals_key, _TTL_SECONDS)
+            pipe.sadd(_ROLLUPS_KEY, period)
+            pipe.execute()
+            done += 1
+
+    # Forget periods whose rollups have expired along with their days
+    stale = [p for p in rolled_up if _period_start(p) < oldest]
+    if stale:
+        r.srem(_ROLLUPS_KEY, *stale)
+    return done
+
+
+def _period_start(period):
+    if '-W' in period:
+        year, week = period.split('-W')
+        return datetime.date.fromisocalendar(int(year), int(week), 1)
+    return datetime.datetime.strptime(period, '%Y-%m').date()
+
+
+def _user_counts(r, event_types, days):
+    """{event_type: {email: count}} over the last *days* days, one pipeline."""
+    segments = _segments(r, days)
+    pipe = r.pipeline(transaction=False)
+    for event_type in event_types:
+        for segment in segments:
+            pipe.zrange(f"ANALYTICS|{event_type}|{segment}", 0, -1, withscores=True)
+    results = iter(pipe.execute())
+    counts = {}
+    for event_type in event_types:
+        combined = counts[event_type] = {}
+        for _ in segments:
+            for email, score in next(results):
+                combined[email] = combined.get(email, 0) + int(score)
+    return counts
+
+
 def get_user_stats(r, days=30):
     """Return per-user activity summary over N days.
 
     Returns list of dicts sorted by total activity descending:
     [{'email': '...', 'song_add': 5, 'vote': 12, ...}, ...]
     """
-    today = datetime.date.today()
-    user_totals = {}
-
     event_types = ['login', 'signup', 'ws_connect', 'song_add', 'vote', 'jam', 'airhorn']
-
-    for day_offset in range(days):
-        date = (today - datetime.timedelta(days=day_offset)).isoformat()
-        for event_type in event_types:
-            key = f"ANALYTICS|{event_type}|{date}"
-            members = r.zrangebyscore(key, '-inf', '+inf', withscores=True)
-            for email, score in members:
-                if email not in user_totals:
-                    user_totals[email] = {'email': email}
-                user_totals[email][event_type] = user_totals[email].get(event_type, 0) + int(score)
+    user_totals = {}
+    for event_type, counts in _user_counts(r, event_types, days).items():
+        for email, count in counts.items():
+            if email not in user_totals:
+                user_totals[email] = {'email': email}
+            user_totals[email][event_type] = count
 
     result = list(user_totals.values())
     result.sort(key=lambda u: sum(v for k, v in u.items() if k != 'email'), reverse=True)
@@ -91,33 +349,31 @@ def get_top_users(r, event_type, days=7):
 
     Returns list of (email, count) sorted by count descending.
     """
-    today = datetime.date.today()
-    combined = {}
-
-    for day_offset in range(days):
-        date = (today - datetime.timedelta(days=day_offset)).isoformat()
-        key = f"ANALYTICS|{event_type}|{date}"
-        members = r.zrangebyscore(key, '-inf', '+inf', withscores=True)
-        for email, score in members:
-            combined[email] = combined.get(email, 0) + int(score)
-
+    combined = _user_counts(r, [event_type], days)[event_type]
     return sorted(combined.items(), key=lambda x: x[1], reverse=True)
 
 
 def get_dau_trend(r, days=7):
     """Return list of (date_str, dau_count) for the last N days, oldest first."""
-    today = datetime.date.today()
-    trend = []
-    for day_offset in range(days - 1, -1, -1):
-        date = (today - datetime.timedelta(days=day_offset)).isoformat()
-        count = r.scard(f"ANALYTICS|dau|{date}")
-        trend.append((date, count))
-    return trend
+    dates = [d.isoformat() for d in _dates(days)]
+    pipe = r.pipeline(transaction=False)
+    for date in dates:
+        pipe.pfcount(f"ANALYTICS|dau_hll|{date}")
+    return list(zip(dates, pipe.execute()))
+
+
+def _daily_totals(r, days):
+    """[(date_str, {event_type: count})] for the last N days, oldest first."""
+    dates = [d.isoformat() for d in _dates(days)]
+    pipe = r.pipeline(transaction=False)
+    for date in dates:
+        pipe.hgetall(f"ANALYTICS|totals|{date}")
+    return list(zip(dates, pipe.execute()))
 
 
 def get_known_user_count(r):
-    """Return total number of unique users ever seen."""
-    return r.scard("ANALYTICS|known_users")
+    """Return (approximately) the number of unique users ever seen."""
+    return r.pfcount(_KNOWN_USERS_HLL)
 
 
 # Spotify API event types tracked by the system
@@ -139,8 +395,8 @@ def get_spotify_api_stats(r, days=7):
     Returns dict with keys: today (dict of short_name: count), total_today (int),
     trend (list of {date, calls}).
     """
-    today = _today()
-    today_raw = r.hgetall(f"ANALYTICS|totals|{today}")
+    daily = _daily_totals(r, max(days, 1))
+    today_raw = daily[-1][1]
 
     today_counts = {}
     for event, short in _SPOTIFY_API_SHORT.items():
@@ -149,13 +405,8 @@ def get_spotify_api_stats(r, days=7):
     total_today = sum(today_counts.values())
 
     # Build daily trend
-    current = datetime.date.today()
-    trend = []
-    for day_offset in range(days - 1, -1, -1):
-        date = (current - datetime.timedelta(days=day_offset)).isoformat()
-        day_raw = r.hgetall(f"ANALYTICS|totals|{date}")
-        day_total = sum(int(day_raw.get(e, 0)) for e in _SPOTIFY_API_EVENTS)
-        trend.append({'date': date, 'calls': day_total})
+    trend = [{'date': date, 'calls': sum(int(day_raw.get(e, 0)) for e in _SPOTIFY_API_EVENTS)}
+             for date, day_raw in daily[len(daily) - days:]]
 
     return {
         'today': today_counts,
@@ -179,28 +430,25 @@ def get_spotify_oauth_stats(r, days=7):
 
     Helps diagnose user auth issues (stale tokens, reconnect frequency).
     """
-    today = _today()
-    today_raw = r.hgetall(f"ANALYTICS|totals|{today}")
+    daily = _daily_totals(r, max(days, 1))
+    today_raw = daily[-1][1]
 
     today_counts = {}
     for event, short in _SPOTIFY_OAUTH_SHORT.items():
         today_counts[short] = int(today_raw.get(event, 0))
 
-    # Per-user breakdown of stale tokens (who's having problems?)
-    stale_users = []
-    current = datetime.date.today()
-    for day_offset in range(days):
-        date = (current - datetime.timedelta(days=day_offset)).isoformat()
-        key = f"ANALYTICS|spotify_oauth_stale|{date}"
-        members = r.zrangebyscore(key, '-inf', '+inf', withscores=True)
-        for email, score in members:
-            stale_users.append({'email': email, 'count': int(score), 'date': date})
+    # Per-user breakdown of stale tokens (who's having problems?), newest day first
+    dates = [d.isoformat() for d in reversed(_dates(days))]
+    pipe = r.pipeline(transaction=False)
+    for date in dates:
+        pipe.zrange(f"ANALYTICS|spotify_oauth_stale|{date}", 0, -1, withscores=True)
+    stale_users = [{'email': email, 'count': int(score), 'date': date}
+                   for date, members in zip(dates, pipe.execute())
+                   for email, score in members]
 
     # Daily trend
     trend = []
-    for day_offset in range(days - 1, -1, -1):
-        date = (current - datetime.timedelta(days=day_offset)).isoformat()
-        day_raw = r.hgetall(f"ANALYTICS|totals|{date}")
+    for date, day_raw in daily[len(daily) - days:]:
         day_counts = {short: int(day_raw.get(event, 0))
                       for event, short in _SPOTIFY_OAUTH_SHORT.items()}
         trend.append({'date': date, **day_counts})
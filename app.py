@@ -15,8 +15,8 @@ import urllib.request
 import socket as psocket
 import re
 import gevent
-import redis
 import requests
+import dateutil.parser
 import time
 import psycopg2
 
@@ -27,10 +27,20 @@ from flask import Flask, request, render_template, session, redirect, jsonify, m
 from flask_assets import Environment, Bundle
 
 from config import CONF
-from db import DB, is_spotify_rate_limited, set_spotify_rate_limit, handle_spotify_exception
+from db import (DB, is_spotify_rate_limited, set_spotify_rate_limit, handle_spotify_exception,
+                acquire_spotify_budget, SpotifyBudgetExceeded, spotify_retry_after,
+                TimedSpotify)
+from spotify_budget import PRIORITY_INTERACTIVE
+from history import (parse_play_time, decode_history_cursor, LEADERBOARD_DIMENSIONS,
+                     LEADERBOARD_PERIODS)
 from nests import pubsub_channel, NestManager, refresh_member_ttl, member_key, members_key
+from nests import metadata_cache as nest_metadata_cache, get_cached_nest
 import analytics
+import metrics
+import redis_trace
 import slack
+from redis_trace import make_redis
+from response_cache import cached
 
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -147,7 +157,7 @@ def _handle_websocket():
     if len(parts) >= 3 and parts[2]:
         nest_id = parts[2]
         # Validate nest exists
-        if nest_manager and nest_manager.get_nest(nest_id) is None:
+        if nest_manager and get_cached_nest(nest_manager._r, nest_id) is None:
             logger.warning('WebSocket: nest %s not found', nest_id)
             return 'Nest not found', 404
     else:
@@ -172,7 +182,7 @@ def _handle_volume_websocket():
     # /volume -> ['', 'volume'], /volume/ABC -> ['', 'volume', 'ABC']
     if len(parts) >= 3 and parts[2]:
         nest_id = parts[2]
-        if nest_manager and nest_manager.get_nest(nest_id) is None:
+        if nest_manager and get_cached_nest(nest_manager._r, nest_id) is None:
             return 'Nest not found', 404
     else:
         nest_id = "main"
@@ -191,10 +201,12 @@ __setup_bundles()
 
 d = DB(False)
 logger.setLevel(logging.DEBUG)
+metrics.start(d._r)
 
 # Initialize NestManager for nest CRUD operations
 try:
     nest_manager = NestManager()
+    nest_metadata_cache.start_listener(nest_manager._r)
 except Exception as e:
     logger.warning("NestManager init failed (nests disabled): %s", e)
     nest_manager = None
@@ -315,7 +327,8 @@ class WebSocketManager(object):
                     event = data[0]
                     args = data[1:]
                     try:
-                        getattr(self, 'on_' + event.replace('-', '_'))(*args)
+                        with redis_trace.trace('ws %s' % event):
+                            getattr(self, 'on_' + event.replace('-', '_'))(*args)
                     except Exception:
                         logger.exception('Socket handler error for event: %s', event)
                 elif T == '0':
@@ -428,7 +441,8 @@ class MusicNamespace(WebSocketManager):
                     event = data[0]
                     args = data[1:]
                     try:
-                        getattr(self, 'on_' + event.replace('-', '_'))(*args)
+                        with redis_trace.trace('ws %s' % event):
+                            getattr(self, 'on_' + event.replace('-', '_'))(*args)
                     except Exception:
                         logger.exception('Socket handler error for event: %s', event)
                 elif T == '0':
@@ -446,41 +460,53 @@ class MusicNamespace(WebSocketManager):
             gevent.killall(self._children)
 
     def listener(self):
-        r = redis.StrictRedis(host=CONF.REDIS_HOST or 'localhost', port=CONF.REDIS_PORT or 6379, password=CONF.REDIS_PASSWORD or None, decode_responses=True).pubsub()
+        r = make_redis().pubsub()
         r.subscribe(pubsub_channel(self.nest_id))
         for m in r.listen():
             if m['type'] != 'message':
                 continue
             msg = m['data']
-
-            if msg == 'playlist_update':
-                self.on_fetch_playlist()
-            elif msg == 'now_playing_update':
-                self.on_fetch_now_playing()
-                self.on_fetch_playlist()
-            elif msg.startswith('pp|'):
-                #self.log('sending position update to {0}'.format(self.email))
-                _, src, track, pos = msg.split('|', 3)
-#                logger.debug(session['spotify_token'])
-                self.emit('player_position', src, track, int(pos))
-            elif msg.startswith('v|'):
-                _, vol = msg.split('|', 1)
-                self.emit('volume', vol)
-            elif msg.startswith('do_airhorn'):
-                _, v, c = msg.split('|', 2)
-                self.logger.info('about to emit')
-                self.emit('do_airhorn', v, c)
-            elif msg.startswith('no_airhorn'):
-                _, data = msg.split('|', 1)
-                self.emit('no_airhorn', json.loads(data))
-            elif msg == 'update_freehorn':
-                self.emit('free_horns', self.db.get_free_horns(self.email))
-            elif msg.startswith('member_update|'):
-                _, count_str = msg.split('|', 1)
-                try:
-                    self.emit('member_update', int(count_str))
-                except (ValueError, TypeError):
-                    pass
+            if msg.startswith('pp|'):
+                # Position ticks reach every socket once a second; too
+                # frequent to time and trace per socket. The message rate
+                # is echonest_pubsub_published, counted once per publish.
+                self._dispatch(msg)
+                continue
+            kind = msg.split('|', 1)[0]
+            with metrics.timer('echonest_ws_fanout_seconds', message=kind), \
+                    redis_trace.trace('pubsub %s' % kind):
+                self._dispatch(msg)
+
+    def _dispatch(self, msg):
+        """Forward one pub/sub message to this socket."""
+        if msg == 'playlist_update':
+            self.on_fetch_playlist()
+        elif msg == 'now_playing_update':
+            self.on_fetch_now_playing()
+            self.on_fetch_playlist()
+        elif msg.startswith('pp|'):
+            #self.log('sending position update to {0}'.format(self.email))
+            _, src, track, pos = msg.split('|', 3)
+#            logger.debug(session['spotify_token'])
+            self.emit('player_position', src, track, int(pos))
+        elif msg.startswith('v|'):
+            _, vol = msg.split('|', 1)
+            self.emit('volume', vol)
+        elif msg.startswith('do_airhorn'):
+            _, v, c = msg.split('|', 2)
+            self.logger.info('about to emit')
+            self.emit('do_airhorn', v, c)
+        elif msg.startswith('no_airhorn'):
+            _, data = msg.split('|', 1)
+            self.emit('no_airhorn', json.loads(data))
+        elif msg == 'update_freehorn':
+            self.emit('free_horns', self.db.get_free_horns(self.email))
+        elif msg.startswith('member_update|'):
+            _, count_str = msg.split('|', 1)
+            try:
+                self.emit('member_update', int(count_str))
+            except (ValueError, TypeError):
+                pass
 
     def log(self, msg, debug=True):
         if debug:
@@ -503,6 +529,9 @@ class MusicNamespace(WebSocketManager):
                 self.emit('error', {'message': f'Queue is full{limit_note}'})
                 return None
             raise
+        except SpotifyBudgetExceeded:
+            self.emit('error', {'message': 'Spotify is busy right now, try again in a moment'})
+            return None
         except (ConnectionError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
             logger.warning("Spotify connection error in %s: %s", fn.__name__, e)
             set_spotify_rate_limit(30)  # Back off 30 seconds
@@ -776,7 +805,7 @@ class VolumeNamespace(WebSocketManager):
         self.emit('volume', str(self.db.set_volume(vol)))
 
     def listener(self):
-        r = redis.StrictRedis(host=CONF.REDIS_HOST or 'localhost', port=CONF.REDIS_PORT or 6379, password=CONF.REDIS_PASSWORD or None, decode_responses=True).pubsub()
+        r = make_redis().pubsub()
         r.subscribe(pubsub_channel(self.nest_id))
         for m in r.listen():
             if m['type'] != 'message':
@@ -802,6 +831,13 @@ VALID_HOSTS = ('localhost:5000', 'localhost:5001', '127.0.0.1:5000', '127.0.0.1:
                str(CONF.ECHONEST_DOMAIN) if getattr(CONF, 'ECHONEST_DOMAIN', None) else '')
 
 
+@app.before_request
+def start_redis_trace():
+    # WebSocket connections trace each event instead (see serve())
+    if request.headers.get('Upgrade', '').lower() != 'websocket':
+        redis_trace.start('%s %s' % (request.method, request.path))
+
+
 @app.before_request
 def require_auth():
     # Handle WebSocket upgrades BEFORE Flask route dispatch
@@ -847,6 +883,12 @@ if CONF.DEBUG:
     }
 
 
+@app.after_request
+def finish_redis_trace(response):
+    response.headers.extend(redis_trace.response_headers(redis_trace.finish()))
+    return response
+
+
 @app.after_request
 def add_cors_header(response):
     origin = request.environ.get('HTTP_ORIGIN')
@@ -1135,7 +1177,7 @@ def nest_page(code):
     """Render the main page scoped to a specific nest."""
     if nest_manager is None:
         return 'Nests not available', 503
-    nest = nest_manager.get_nest(code)
+    nest = get_cached_nest(nest_manager._r, code)
     if nest is None:
         return 'Nest not found', 404
     return render_template('main.html',
@@ -1210,8 +1252,7 @@ def signup():
     if client_ip:
         client_ip = client_ip.split(',')[0].strip()
     rate_key = 'SIGNUP_RATE|{}'.format(client_ip)
-    r = redis.StrictRedis(host=CONF.REDIS_HOST or 'localhost', port=CONF.REDIS_PORT or 6379,
-                          password=CONF.REDIS_PASSWORD or None, decode_responses=True)
+    r = make_redis()
     attempts = r.get(rate_key)
     if attempts and int(attempts) >= 5:
         return render_template('signup.html', error='Too many signups from this address. Please try again later.', email=email)
@@ -1236,6 +1277,7 @@ def signup():
 
 # , content_type="application/javascript")
 @app.route('/config.js', methods=['GET'])
+@cached()
 def configjs():
     r = make_response(render_template('config.js'))
     r.headers['Content-type'] = 'application/javascript'
@@ -1300,30 +1342,91 @@ def user_jam_history_api(userid):
     return jsonify(jams=jams, userid_requested=userid, n_retrieved=len(jams))
 
 
+_HISTORY_PAGE_DEFAULT = 100
+_HISTORY_PAGE_MAX = 1000
+
+
+def _history_range_args():
+    """Parse start/end (ISO-8601 or epoch seconds), user, track and cursor."""
+    try:
+        start = parse_play_time(request.args['start']) if request.args.get('start') else None
+        end = parse_play_time(request.args['end']) if request.args.get('end') else None
+    except (ValueError, OverflowError):
+        raise ProseccoAPIError("invalid start/end; use ISO-8601 or epoch seconds")
+    cursor = request.args.get('cursor') or None
+    if cursor:
+        try:
+            decode_history_cursor(cursor)
+        except ValueError:
+            raise ProseccoAPIError("invalid cursor '%s'" % cursor)
+    return dict(start=start, end=end, cursor=cursor,
+                user=request.args.get('user') or None,
+                track=request.args.get('track') or None)
+
+
+@app.route('/history/range')
+def history_range_api():
+    # one page of plays between two end times, oldest first; pass
+    # next_cursor back as ?cursor= for the following page
+    args = _history_range_args()
+    limit = request.args.get('limit', _HISTORY_PAGE_DEFAULT, type=int)
+    limit = max(1, min(limit, _HISTORY_PAGE_MAX))
+    plays, next_cursor = d.get_historian().get_plays_page(limit=limit, **args)
+    return jsonify(plays=plays, next_cursor=next_cursor, n_retrieved=len(plays))
+
+
+@app.route('/history/range.ndjson')
+def history_range_ndjson_api():
+    # stream every matching play as a JSON line ({"cursor": ..., "play": ...})
+    # for long exports; an interrupted export resumes from the last cursor
+    args = _history_range_args()
+    historian = d.get_historian()
+
+    def generate():
+        for play, cursor in historian.iter_plays(**args):
+            yield json.dumps({'cursor': cursor, 'play': play}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/history/leaderboard/<string:dimension>')
+def history_leaderboard_api(dimension):
+    # top tracks/artists/users/jammed tracks for a day or week (?date= picks
+    # the period containing that date, default now)
+    period = request.args.get('period', 'week')
+    if dimension not in LEADERBOARD_DIMENSIONS or period not in LEADERBOARD_PERIODS:
+        raise ProseccoAPIError("unknown leaderboard '%s' for period '%s'" % (dimension, period))
+    try:
+        when = dateutil.parser.parse(request.args['date']) if request.args.get('date') else None
+    except (ValueError, OverflowError):
+        raise ProseccoAPIError("invalid date '%s'" % request.args['date'])
+    limit = max(1, min(request.args.get('limit', 10, type=int), _HISTORY_PAGE_MAX))
+    historian = d.get_historian()
+    return jsonify(dimension=dimension, period=period,
+                   leaders=historian.get_leaderboard(dimension, period, when, limit),
+                   unique_listeners=historian.get_unique_listeners(period, when))
+
+
 @app.route('/search/v2', methods=['GET'])
 def search_spotify():
     q = request.values['q']
 
-    # Check if we're rate limited before making API call
-    if is_spotify_rate_limited():
-        resp = jsonify({"error": "Spotify rate limited. Please try again later."})
-        resp.status_code = 429
-        return resp
+    # Check if we're rate limited (or over the shared budget) before making API call
+    if not acquire_spotify_budget(PRIORITY_INTERACTIVE):
+        return _spotify_busy_response()
 
     # Handle get_access_token returning dict in newer spotipy versions
     token = auth.get_access_token()
     if isinstance(token, dict):
         token = token.get('access_token', token)
-    sp = spotipy.Spotify(auth=token)
+    sp = TimedSpotify(auth=token)
 
     try:
         search_result = sp.search(q, 10)
         analytics.track(d._r, 'spotify_api_search')
     except spotipy.exceptions.SpotifyException as e:
         if handle_spotify_exception(e):
-            resp = jsonify({"error": "Spotify rate limited. Please try again later."})
-            resp.status_code = 429
-            return resp
+            return _spotify_busy_response()
         analytics.track(d._r, 'spotify_api_error')
         raise
 
@@ -1445,6 +1548,14 @@ def youtube_playlist():
         return jsonify({"error": "Internal error"}), 500
 
 
+def _spotify_busy_response():
+    """429 for a Spotify call refused by the shared request budget or a rate limit."""
+    resp = jsonify(error='Spotify is busy right now, try again in a moment')
+    resp.status_code = 429
+    resp.headers['Retry-After'] = str(spotify_retry_after())
+    return resp
+
+
 @app.route('/add_song', methods=['POST'])
 @require_session_or_api_token
 def add_song_v2():
@@ -1453,7 +1564,10 @@ def add_song_v2():
     email = g.auth_email
     app.logger.debug('add_spotify_song "{0}" "{1}"'.format(email, track_uri))
     _log_action('add_song', email, track_uri=track_uri)
-    d.add_spotify_song(email, track_uri, penalty=0)
+    try:
+        d.add_spotify_song(email, track_uri, penalty=0)
+    except SpotifyBudgetExceeded:
+        return _spotify_busy_response()
 
     resp = jsonify({"success": True})
     resp.status_code = 200
@@ -1478,6 +1592,7 @@ def blast_airhorn():
 
 
 @app.route('/airhorn_list', methods=['GET'])
+@cached(version=lambda: len(airhorns))
 def airhorn_list():
     airhorns_list = list(airhorns)
     resp = jsonify(airhorns_list)
@@ -1489,6 +1604,10 @@ def airhorn_list():
 # Admin stats dashboard
 # ---------------------------------------------------------------------------
 
+# Stats pages are served from memory for this long (see response_cache.py)
+_STATS_CACHE_SECONDS = 30
+
+
 def _is_admin(email):
     admin_emails = CONF.ADMIN_EMAILS or []
     if isinstance(admin_emails, str):
@@ -1497,9 +1616,10 @@ def _is_admin(email):
 
 
 @app.route('/stats')
+@cached(ttl=_STATS_CACHE_SECONDS, vary=lambda: session.get('email'), private=True)
 def public_stats():
     today_stats = analytics.get_daily_stats(d._r)
-    dau_today = analytics.get_daily_active_users(d._r)
+    dau_count = analytics.get_active_user_count(d._r)
     dau_trend = analytics.get_dau_trend(d._r, days=7)
     all_users = analytics.get_user_stats(d._r, days=7)
     known_users = analytics.get_known_user_count(d._r)
@@ -1522,7 +1642,7 @@ def public_stats():
 
     return render_template('stats.html',
                            today=today_stats,
-                           dau_count=len(dau_today),
+                           dau_count=dau_count,
                            dau_trend=dau_trend,
                            my_stats=my_stats,
                            others_stats=others_stats,
@@ -1538,11 +1658,14 @@ def admin_stats_redirect():
     return redirect('/stats')
 
 
+_GUIDE_PATH = os.path.join(os.path.dirname(__file__), 'docs', 'GETTING_STARTED.md')
+
+
 @app.route('/help')
+@cached(files=[_GUIDE_PATH])
 def help_page():
-    guide_path = os.path.join(os.path.dirname(__file__), 'docs', 'GETTING_STARTED.md')
     try:
-        with open(guide_path, 'r') as f:
+        with open(_GUIDE_PATH, 'r') as f:
             md = f.read()
         guide_html = _markdown_to_html(md)
     except Exception:
@@ -1742,7 +1865,10 @@ def api_add_song():
     if not track_uri:
         return jsonify(error='Missing required field: track_uri'), 400
     email = getattr(g, 'auth_email', API_EMAIL)
-    new_id = d.add_spotify_song(email, track_uri, penalty=0)
+    try:
+        new_id = d.add_spotify_song(email, track_uri, penalty=0)
+    except SpotifyBudgetExceeded:
+        return _spotify_busy_response()
     if new_id:
         return jsonify(ok=True, id=new_id)
     return jsonify(error='Failed to add song'), 500
@@ -1779,7 +1905,7 @@ def _get_spotify_client():
         analytics.track(d._r, 'spotify_oauth_stale', email)
         return None, "No cached Spotify token for %s — visit the web UI and click 'sync audio' first" % email
 
-    return spotipy.Spotify(auth=token_info['access_token']), None
+    return TimedSpotify(auth=token_info['access_token']), None
 
 
 @app.route('/api/spotify/devices', methods=['GET'])
@@ -1879,12 +2005,13 @@ def api_playing():
 
 
 @app.route('/api/stats', methods=['GET'])
+@cached(ttl=_STATS_CACHE_SECONDS, vary=lambda: hashlib.sha1(
+    request.headers.get('Authorization', '').encode()).hexdigest(), private=True)
 def api_stats():
     """Concise JSON analytics snapshot. Public for aggregate data;
     Bearer token required to include per-user email details."""
     days = min(int(request.args.get('days', 7)), 90)
     today_stats = analytics.get_daily_stats(d._r)
-    dau_today = analytics.get_daily_active_users(d._r)
     dau_trend = analytics.get_dau_trend(d._r, days=days)
     known_users = analytics.get_known_user_count(d._r)
 
@@ -1909,14 +2036,28 @@ def api_stats():
 
     return jsonify(
         today=today_stats,
-        dau=len(dau_today),
+        dau=analytics.get_active_user_count(d._r),
+        wau=analytics.get_active_user_count(d._r, days=7),
+        mau=analytics.get_active_user_count(d._r, days=30),
         dau_trend=[{'date': date, 'users': count} for date, count in dau_trend],
         known_users=known_users,
         spotify_api=spotify_api,
         spotify_oauth=spotify_oauth,
+        bender_yield=d.get_bender_yield(),
     )
 
 
+@app.route('/metrics', methods=['GET'])
+@require_api_token
+def metrics_endpoint():
+    """Prometheus metrics, summed across workers (see metrics.py)."""
+    gauges = []
+    if nest_manager:
+        for nest_id, meta in nest_manager.list_nests():
+            gauges.append(('echonest_nest_listeners', {'nest': nest_id}, meta.get('member_count', 0)))
+    return Response(metrics.render(d._r, gauges), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/sync/link')
 def sync_link_page():
     """Show a linking code for echonest-sync account linking.
@@ -2021,12 +2162,7 @@ def api_sync_token():
 @require_api_token
 def api_events():
     def generate():
-        r = redis.StrictRedis(
-            host=CONF.REDIS_HOST or 'localhost',
-            port=CONF.REDIS_PORT or 6379,
-            password=CONF.REDIS_PASSWORD or None,
-            decode_responses=True,
-        ).pubsub()
+        r = make_redis().pubsub()
         r.subscribe(pubsub_channel("main"))
         try:
             while True:
@@ -2131,29 +2267,17 @@ def api_nests_create():
 def api_nests_list():
     if nest_manager is None:
         return jsonify(error='Nests not available'), 503
-    nests_list = nest_manager.list_nests()
-    result = []
-    for nest_id, meta in nests_list:
-        # Include now-playing summary and member count
-        try:
-            nest_db = DB(init_history_to_redis=False, nest_id=nest_id)
-            np = nest_db.get_now_playing()
-            if np and np.get('title'):
-                meta['now_playing'] = {
-                    'title': np.get('title', ''),
-                    'artist': np.get('secondary_text') or np.get('artist', ''),
-                }
-            else:
-                meta['now_playing'] = None
-        except Exception:
-            meta['now_playing'] = None
-        try:
-            mkey = members_key(nest_id)
-            meta['member_count'] = nest_manager._r.scard(mkey)
-        except Exception:
-            meta['member_count'] = 0
-        result.append(meta)
-    return jsonify(nests=result)
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = request.args.get('limit')
+        limit = min(max(int(limit), 1), 1000) if limit else None
+    except ValueError:
+        return jsonify(error='bad_request', message='offset and limit must be integers.'), 400
+    total, page = nest_manager.page_nests(offset=offset, limit=limit,
+                                          query=request.args.get('q') or None, with_summary=True)
+    # Member count, queue size and now playing come from one pipeline
+    next_offset = offset + len(page) if limit and offset + len(page) < total else None
+    return jsonify(nests=[meta for _, meta in page], total=total, next_offset=next_offset)
 
 
 @app.route('/api/nests/<code>', methods=['GET'])
@@ -2173,6 +2297,18 @@ def api_nests_get(code):
     return jsonify(nest)
 
 
+@app.route('/api/nests/<code>/bender-yield', methods=['GET'])
+@require_session_or_api_token
+def api_nests_bender_yield(code):
+    if nest_manager is None:
+        return jsonify(error='Nests not available'), 503
+    nest = nest_manager.get_nest(code)
+    if nest is None:
+        return jsonify(error='not_found', message='Nest not found.'), 404
+    nest_db = DB(init_history_to_redis=False, nest_id=nest['nest_id'])
+    return jsonify(strategies=nest_db.get_bender_yield(), weights=nest_db._get_strategy_weights())
+
+
 @app.route('/api/nests/<code>', methods=['PATCH'])
 @require_session_or_api_token
 def api_nests_update(code):
@@ -2189,12 +2325,9 @@ def api_nests_update(code):
 
     body = request.get_json(silent=True) or {}
 
-    # Update name if provided
+    # Update name if provided (keyed by nest_id, not the URL code, to avoid duplicates)
     if 'name' in body:
-        nest['name'] = body['name']
-
-    # Store updated metadata (use nest_id, not the URL code, to avoid duplicates)
-    nest_manager._r.hset('NESTS|registry', nest['nest_id'], json.dumps(nest))
+        nest = nest_manager.update_nest(nest['nest_id'], {'name': body['name']}) or nest
     return jsonify(nest)
 
 
@@ -2228,7 +2361,7 @@ def nest_code_catchall(code):
         from nests import slugify
         slug = slugify(code)
         if slug:
-            nest = nest_manager.get_nest(slug)
+            nest = get_cached_nest(nest_manager._r, slug)
             if nest:
                 return redirect('/nest/' + nest['code'])
     abort(404)
@@ -0,0 +1,116 @@
+"""Warm Bender pools for themed nests.
+
+Nests named after NEST_SEED_MAP entries share a seed track and genre, so
+their first fills are predictable. A background warmer (run by the master
+player) keeps a small pool of candidate tracks, with display metadata, per
+themed seed in ``BENDER|pool:{seed_uri}``. A cold nest whose seed is themed
+takes its first tracks from the pool instead of resolving the seed and
+filling a strategy cache itself, so its first preview is instant.
+
+Pools come from one genre search per refill; search results already carry
+title, artists, duration and artwork, so no per-track lookups are needed.
+Taking from a pool consumes it, and the warmer refills from a random
+offset, so consecutive nests of the same theme see different tracks.
+"""
+import json
+import logging
+import random
+
+import redis
+
+from config import CONF
+from spotify_budget import PRIORITY_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+_POOL_SIZE = 10
+_POOL_REFILL_BELOW = 5
+_POOL_TTL = 24 * 60 * 60
+_SEARCH_OFFSET_MAX = 50   # refills start at a random offset so pools rotate
+
+
+def pool_key(seed_uri):
+    return 'BENDER|pool:{0}'.format(seed_uri)
+
+
+def themed_seeds():
+    """Return sorted (seed_uri, genre) pairs for every themed nest."""
+    from nests import NEST_SEED_MAP
+    return sorted({(uri, genre) for uri, genre in NEST_SEED_MAP.values() if genre})
+
+
+def is_themed_seed(seed_uri):
+    return any(uri == seed_uri for uri, _ in themed_seeds())
+
+
+def _pool_item(track):
+    """Reduce a Spotify track object to the fields a FILL-INFO preview needs."""
+    images = (track.get('album') or {}).get('images') or []
+    big_img = images[0].get('url') if images else ''
+    img = images[-1].get('url') if len(images) > 1 else big_img
+    return {
+        'trackid': track['uri'],
+        'src': 'spotify',
+        'title': track.get('name', ''),
+        'artist': ", ".join(a['name'] for a in track.get('artists', [])),
+        'duration': str(int(track.get('duration_ms', 0)) // 1000),
+        'img': img or '',
+        'big_img': big_img or '',
+    }
+
+
+def refill_pool(r, seed_uri, genre):
+    """Top up one themed pool with a genre search. Returns tracks added."""
+    from db import spotify_client, acquire_spotify_budget, handle_spotify_exception
+    import analytics
+
+    if not acquire_spotify_budget(PRIORITY_BACKGROUND):
+        return 0
+    market = CONF.BENDER_REGIONS[0] if CONF.BENDER_REGIONS else 'US'
+    try:
+        results = spotify_client.search(q='genre:"%s"' % genre, type='track', limit=_POOL_SIZE,
+                                        offset=random.randint(0, _SEARCH_OFFSET_MAX), market=market)
+        analytics.track(r, 'spotify_api_search')
+    except Exception as e:
+        if not handle_spotify_exception(e):
+            analytics.track(r, 'spotify_api_error')
+            logger.warning("Error refilling Bender pool for '%s': %s", genre, e)
+        return 0
+
+    items = [json.dumps(_pool_item(t)) for t in results.get('tracks', {}).get('items', [])
+             if t and t.get('uri') and t['uri'] != seed_uri]
+    if not items:
+        return 0
+    key = pool_key(seed_uri)
+    pipe = r.pipeline()
+    pipe.rpush(key, *items)
+    pipe.ltrim(key, -_POOL_SIZE, -1)
+    pipe.expire(key, _POOL_TTL)
+    pipe.execute()
+    return len(items)
+
+
+def warm_pools(r):
+    """Refill every themed pool that is running low. Returns pools refilled."""
+    refilled = 0
+    for seed_uri, genre in themed_seeds():
+        try:
+            if r.llen(pool_key(seed_uri)) >= _POOL_REFILL_BELOW:
+                continue
+            if refill_pool(r, seed_uri, genre):
+                refilled += 1
+        except redis.RedisError as e:
+            logger.warning("Error warming Bender pool for %s: %s", seed_uri, e)
+    if refilled:
+        logger.info("Refilled %d themed Bender pools", refilled)
+    return refilled
+
+
+def take_from_pool(r, seed_uri, count):
+    """Atomically take up to *count* pool items (dicts) for a themed seed."""
+    key = pool_key(seed_uri)
+    pipe = r.pipeline()
+    pipe.lrange(key, 0, count - 1)
+    pipe.ltrim(key, count, -1)
+    raw, _ = pipe.execute()
+    return [json.loads(item) for item in raw]
@@ -1,4 +1,6 @@
 from gevent import monkey;monkey.patch_all()
+import gevent
+import gevent.event
 import time
 import datetime
 import json
@@ -21,7 +23,11 @@ import spotipy.oauth2, spotipy.client
 from flask import render_template
 from config import CONF
 from history import PlayHistory
+from redis_trace import make_redis
+from spotify_budget import SpotifyBudget, PRIORITY_INTERACTIVE, PRIORITY_METADATA, PRIORITY_BACKGROUND
 import analytics
+import metrics
+import play_log
 import slack
 
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s')
@@ -51,7 +57,21 @@ def pickle_load_b64(data):
 _client_creds_cache = os.path.join(CONF.OAUTH_CACHE_PATH, '.client_credentials')
 server_tokens = spotipy.oauth2.SpotifyClientCredentials(CONF.SPOTIFY_CLIENT_ID, CONF.SPOTIFY_CLIENT_SECRET,
                                                         cache_handler=spotipy.cache_handler.CacheFileHandler(cache_path=_client_creds_cache))
-spotify_client = spotipy.client.Spotify(client_credentials_manager=server_tokens)
+_SPOTIFY_ID_RE = re.compile(r'^[0-9A-Za-z]{22}$')
+
+
+class TimedSpotify(spotipy.client.Spotify):
+    """Spotify client that records request latency by endpoint in metrics."""
+
+    def _internal_call(self, method, url, payload, params):
+        path = url.split('/v1/', 1)[-1].split('?', 1)[0]
+        endpoint = '/'.join(part for part in path.split('/')
+                            if part and not _SPOTIFY_ID_RE.match(part)) or path
+        with metrics.timer('echonest_spotify_request_seconds', endpoint=endpoint):
+            return super(TimedSpotify, self)._internal_call(method, url, payload, params)
+
+
+spotify_client = TimedSpotify(client_credentials_manager=server_tokens)
 
 auth = spotipy.oauth2.SpotifyClientCredentials(CONF.SPOTIFY_CLIENT_ID, CONF.SPOTIFY_CLIENT_SECRET,
                                                cache_handler=spotipy.cache_handler.CacheFileHandler(cache_path=_client_creds_cache))
@@ -101,35 +121,79 @@ def _get_rate_limit_redis():
     """Get a Redis connection for rate limit tracking."""
     global _rate_limit_redis
     if _rate_limit_redis is None:
-        _rate_limit_redis = redis.StrictRedis(
-            host=CONF.REDIS_HOST or 'localhost',
-            port=CONF.REDIS_PORT or 6379,
-            password=CONF.REDIS_PASSWORD or None,
-            decode_responses=True
-        )
+        _rate_limit_redis = make_redis()
     return _rate_limit_redis
 
+# Local view of the rate-limit window so hot paths skip the Redis TTL call
+_rate_limit_cache = {'until': 0.0, 'checked': 0.0}
+_RATE_LIMIT_RECHECK_SECONDS = 1.0
+_RATE_LIMIT_ERROR_BACKOFF = 30
+
 def is_spotify_rate_limited():
-    """Check if we're currently rate limited by Spotify (persisted in Redis)."""
+    """Check if we're currently rate limited by Spotify (persisted in Redis).
+
+    A known limit is answered from the local cache until it expires; a
+    "not limited" answer is re-checked against Redis at most once a second.
+    """
+    now = time.time()
+    if now < _rate_limit_cache['until']:
+        return True
+    if now - _rate_limit_cache['checked'] < _RATE_LIMIT_RECHECK_SECONDS:
+        return False
     try:
         r = _get_rate_limit_redis()
         ttl = r.ttl('MISC|spotify-rate-limited')
+        _rate_limit_cache['checked'] = now
         if ttl and ttl > 0:
+            _rate_limit_cache['until'] = now + ttl
             logger.debug("Spotify rate limited for %d more seconds", ttl)
             return True
         return False
     except Exception as e:
+        # Don't retry a broken connection on every call
+        _rate_limit_cache['checked'] = now + _RATE_LIMIT_ERROR_BACKOFF
         logger.warning("Error checking rate limit: %s", e)
         return False
 
 def set_spotify_rate_limit(retry_after_seconds):
     """Set the rate limit expiry time (stored in Redis)."""
+    _rate_limit_cache['until'] = time.time() + int(retry_after_seconds)
     try:
         r = _get_rate_limit_redis()
         r.setex('MISC|spotify-rate-limited', int(retry_after_seconds), '1')
         logger.warning("Spotify rate limited for %d seconds", retry_after_seconds)
     except Exception as e:
         logger.warning("Error setting rate limit: %s", e)
+    get_spotify_budget().drain()
+
+_spotify_budget = None
+
+def get_spotify_budget():
+    """Get the process-wide Spotify request budget (shared bucket in Redis)."""
+    global _spotify_budget
+    if _spotify_budget is None:
+        _spotify_budget = SpotifyBudget(_get_rate_limit_redis())
+    return _spotify_budget
+
+class SpotifyBudgetExceeded(Exception):
+    """Raised when a Spotify call is refused by the shared request budget."""
+
+def acquire_spotify_budget(priority, cost=1):
+    """Return True if a Spotify call of this priority may go out now.
+
+    Combines the hard 429 window with the shared token bucket, so callers
+    only need one check before talking to Spotify.
+    """
+    if is_spotify_rate_limited():
+        return False
+    return get_spotify_budget().acquire(priority, cost)
+
+def spotify_retry_after():
+    """Seconds a refused Spotify caller should wait before trying again."""
+    remaining = _rate_limit_cache['until'] - time.time()
+    if remaining > 0:
+        return int(remaining) + 1
+    return max(1, int(round(1.0 / get_spotify_budget().rate)))
 
 def handle_spotify_exception(e):
     """Check if exception is a rate limit and set tracker. Returns True if rate limited."""
@@ -146,6 +210,126 @@ def handle_spotify_exception(e):
         return True
     return False
 
+# Shared (cross-nest) seed resolution cache: seed track -> artist/album, and
+# artist -> genres. Entries are served for a week and refreshed in the
+# background once they are a day old.
+_SEED_CACHE_TTL = 7 * 24 * 60 * 60
+_SEED_REFRESH_AGE = 24 * 60 * 60
+
+def _seed_cache_key(seed_uri):
+    return 'SPOTIFY|seed:{0}'.format(seed_uri)
+
+def _artist_genres_key(artist_id):
+    return 'SPOTIFY|artist-genres:{0}'.format(artist_id)
+
+def _get_artist_genres(r, artist_id, priority, refresh=False):
+    """Return the artist's genres from the shared cache, fetching on a miss.
+
+    Returns None if the genres couldn't be fetched (budget, rate limit, error).
+    """
+    key = _artist_genres_key(artist_id)
+    if not refresh:
+        cached = r.hget(key, 'genres')
+        if cached is not None:
+            return json.loads(cached)
+    if not acquire_spotify_budget(priority):
+        return None
+    try:
+        genres = spotify_client.artist(artist_id).get('genres', [])
+        analytics.track(r, 'spotify_api_artist')
+    except Exception as e:
+        if not handle_spotify_exception(e):
+            analytics.track(r, 'spotify_api_error')
+            logger.warning("Error getting genres for artist %s: %s", artist_id, e)
+        return None
+    r.hset(key, mapping={'genres': json.dumps(genres), 'fetched_at': time.time()})
+    r.expire(key, _SEED_CACHE_TTL)
+    return genres
+
+def _fetch_seed_info(r, seed_uri, priority, refresh=False):
+    """Resolve a seed track from Spotify into the shared cache. Returns info or None."""
+    if not acquire_spotify_budget(priority):
+        return None
+    try:
+        song_deets = spotify_client.track(seed_uri.split(':')[-1])
+        analytics.track(r, 'spotify_api_track')
+    except Exception as e:
+        if not handle_spotify_exception(e):
+            analytics.track(r, 'spotify_api_error')
+            logger.warning("Error getting seed info for %s: %s", seed_uri, e)
+        return None
+    artists = song_deets.get('artists', [])
+    if not artists:
+        return None
+
+    info = {
+        'artist_id': artists[0]['id'],
+        'artist_name': artists[0]['name'],
+        'album_id': (song_deets.get('album') or {}).get('id', ''),
+        'seed_uri': seed_uri,
+    }
+    key = _seed_cache_key(seed_uri)
+    r.hset(key, mapping=dict(info, fetched_at=time.time()))
+    r.expire(key, _SEED_CACHE_TTL)
+
+    genres = _get_artist_genres(r, info['artist_id'], priority, refresh=refresh)
+    if genres is None:
+        return None
+    info['genres'] = genres
+    return info
+
+def _refresh_seed_info(r, seed_uri):
+    try:
+        _fetch_seed_info(r, seed_uri, PRIORITY_BACKGROUND, refresh=True)
+    except Exception:
+        logger.warning("Error refreshing seed info for %s: %s", seed_uri, traceback.format_exc())
+
+def get_seed_info(r, seed_uri, priority=PRIORITY_BACKGROUND):
+    """Resolve a seed track URI to its artist, album and genres.
+
+    Served from the shared SPOTIFY|seed / SPOTIFY|artist-genres cache, so
+    nests with the same seed (e.g. themed nests) resolve it once. Entries
+    older than a day are refreshed in the background while still served.
+    Returns dict with keys: artist_id, artist_name, album_id, genres,
+    seed_uri, or None if it can't be resolved right now.
+    """
+    cached = r.hgetall(_seed_cache_key(seed_uri))
+    if not cached:
+        return _fetch_seed_info(r, seed_uri, priority)
+
+    genres = _get_artist_genres(r, cached['artist_id'], priority)
+    if genres is None:
+        return None
+    if time.time() - float(cached.get('fetched_at', 0)) > _SEED_REFRESH_AGE:
+        if r.set('SPOTIFY|seed-refresh:{0}'.format(seed_uri), 1, nx=True, ex=300):
+            gevent.spawn(_refresh_seed_info, r, seed_uri)
+    return {
+        'artist_id': cached['artist_id'],
+        'artist_name': cached.get('artist_name', ''),
+        'album_id': cached.get('album_id', ''),
+        'genres': genres,
+        'seed_uri': seed_uri,
+    }
+
+def warm_seed_cache(r):
+    """Resolve the default and every themed nest seed into the shared cache.
+
+    Fresh entries are skipped, so this is cheap to run periodically.
+    Returns the number of seeds resolved from Spotify.
+    """
+    from nests import NEST_SEED_MAP, _DEFAULT_SEED
+    seeds = sorted({uri for uri, _ in NEST_SEED_MAP.values()} | {_DEFAULT_SEED[0]})
+    fetched = 0
+    for seed_uri in seeds:
+        cached = r.hgetall(_seed_cache_key(seed_uri))
+        if cached and r.exists(_artist_genres_key(cached.get('artist_id', ''))):
+            continue
+        if get_seed_info(r, seed_uri) is not None:
+            fetched += 1
+    if fetched:
+        logger.info("Warmed shared seed cache with %d seeds", fetched)
+    return fetched
+
 
 def _now():
     return datetime.datetime.now()
@@ -154,12 +338,8 @@ def _log_file_for_today():
     return datetime.datetime.strftime(_now(), CONF.LOG_DIR + '/play_log_%Y_%m_%d.json')
 
 def _log_play(song_json):
-    play_logger = _log_file_for_today()
-    try:
-        with open(play_logger, "a", encoding="utf-8") as _appendable_log:
-            _appendable_log.write(song_json + '\n')
-    except Exception as _e:
-        logger.error('failed to log %s' % song_json)
+    # Buffered; play_log's writer greenlet does the disk I/O off the player
+    play_log.get_writer().write(_log_file_for_today(), song_json)
 
 def _clean_song(song):
     REMOVABLE_FIELDS = ('background_color', 'foreground_color', 'big_img', 'img', 'data')
@@ -190,6 +370,7 @@ def parse_yt_duration(d):
 class DB(object):
     STRATEGY_WEIGHTS_DEFAULT = {
         'genre': 35, 'throwback': 30, 'artist_search': 25, 'artist_album_tracks': 5, 'album': 5,
+        'offline': 10,
     }
 
     # Maps strategy name to its Redis cache key suffix (bare keys, resolved via _cache_key())
@@ -199,8 +380,23 @@ class DB(object):
         'artist_search': 'BENDER|cache:artist-search',
         'artist_album_tracks': 'BENDER|cache:artist-albums',
         'album': 'BENDER|cache:album',
+        'offline': 'BENDER|cache:offline',
     }
 
+    # Strategies that never call Spotify, usable while rate limited
+    _OFFLINE_STRATEGIES = ('throwback', 'offline')
+
+    # Singleflight lease for strategy cache fills
+    _FILL_LOCK_SECONDS = 30     # lease expiry if a filler dies mid-fill
+    _FILL_WAIT_SECONDS = 2.0    # how long other workers wait for the filler
+    _FILL_POLL_SECONDS = 0.1
+
+    # Per-strategy counters in BENDER|yield, stored as "<strategy>:<field>"
+    _YIELD_FIELDS = ('calls', 'fetched', 'cached', 'accepted', 'rejected')
+    _YIELD_WINDOW = 200        # halve a strategy's counters past this many calls
+    _YIELD_MIN_CALLS = 10      # calls before a strategy's weight adapts
+    _YIELD_FACTOR_RANGE = (0.25, 2.0)
+
     def _cache_key(self, strategy):
         """Resolve a strategy name to its nest-scoped Redis cache key."""
         bare = self._STRATEGY_CACHE_KEYS.get(strategy)
@@ -214,10 +410,7 @@ class DB(object):
         if redis_client is not None:
             self._r = redis_client
         else:
-            redis_host = CONF.REDIS_HOST or 'localhost'
-            redis_port = CONF.REDIS_PORT or 6379
-            redis_password = CONF.REDIS_PASSWORD or None
-            self._r = redis.StrictRedis(host=redis_host, port=redis_port, password=redis_password, decode_responses=True)
+            self._r = make_redis()
         if redis_client is None:
             self._h = PlayHistory(self)
             if init_history_to_redis:
@@ -275,6 +468,7 @@ class DB(object):
         client = client or self._r
         client.delete(
             self._key('MISC|now-playing'),
+            self._key('MISC|now-playing-summary'),
             self._key('MISC|current-done'),
             self._key('MISC|started-on'),
             self._key('MISC|now-playing-done'),
@@ -342,9 +536,9 @@ class DB(object):
         Priority: explicit seed_uri from metadata (user-supplied) →
         name-based NEST_SEED_MAP lookup → default Billy Joel track.
         """
-        from nests import NestManager, get_nest_seed_info
+        from nests import get_cached_nest, get_nest_seed_info
         try:
-            meta = NestManager(redis_client=self._r).get_nest(self.nest_id)
+            meta = get_cached_nest(self._r, self.nest_id)
             if meta:
                 # Prefer explicit seed_uri from nest creation
                 explicit = meta.get('seed_uri')
@@ -362,13 +556,14 @@ class DB(object):
         return "spotify:track:3utq2FgD1pkmIoaWfjXWAU"
 
     def _get_seed_info(self):
-        """Fetch and cache seed artist metadata in BENDER|seed-info hash.
+        """Resolve and cache seed artist metadata in BENDER|seed-info hash.
 
+        Misses go through the shared cross-nest seed cache (get_seed_info),
+        so a seed already resolved by any nest costs no Spotify calls.
         Returns dict with keys: artist_id, artist_name, album_id, genres, seed_uri
         or None if unable to resolve.
         """
         seed_uri = self._resolve_seed_uri()
-        track_id = seed_uri.split(":")[-1]
 
         # Check cache
         cached = self._r.hgetall(self._key('BENDER|seed-info'))
@@ -376,46 +571,17 @@ class DB(object):
             cached['genres'] = json.loads(cached.get('genres', '[]'))
             return cached
 
-        # Stale or missing — delete and re-fetch
+        # Stale or missing — delete and re-resolve
         if cached:
             self._r.delete(self._key('BENDER|seed-info'))
 
-        if is_spotify_rate_limited():
-            logger.debug("_get_seed_info: Spotify rate limited")
+        info = get_seed_info(self._r, seed_uri)
+        if info is None:
+            logger.debug("_get_seed_info: couldn't resolve %s (rate limited, over budget or error)", seed_uri)
             return None
 
-        try:
-            song_deets = spotify_client.track(track_id)
-            analytics.track(self._r, 'spotify_api_track')
-            artists = song_deets.get('artists', [])
-            if not artists:
-                return None
-            artist_id = artists[0]['id']
-            artist_name = artists[0]['name']
-            album_id = song_deets.get('album', {}).get('id', '')
-
-            # Fetch genres from artist endpoint
-            artist_data = spotify_client.artist(artist_id)
-            analytics.track(self._r, 'spotify_api_artist')
-            genres = artist_data.get('genres', [])
-        except Exception as e:
-            if handle_spotify_exception(e):
-                return None
-            analytics.track(self._r, 'spotify_api_error')
-            logger.warning("Error getting seed info for %s: %s", track_id, e)
-            return None
-
-        info = {
-            'artist_id': artist_id,
-            'artist_name': artist_name,
-            'album_id': album_id,
-            'genres': json.dumps(genres),
-            'seed_uri': seed_uri,
-        }
-        self._r.hset(self._key('BENDER|seed-info'), mapping=info)
+        self._r.hset(self._key('BENDER|seed-info'), mapping=dict(info, genres=json.dumps(info['genres'])))
         self._r.expire(self._key('BENDER|seed-info'), 60 * 20)
-
-        info['genres'] = genres
         return info
 
     def _get_strategy_weights(self):
@@ -440,18 +606,110 @@ class DB(object):
         if hint and 'genre' in weights:
             weights['genre'] += 20
 
+        # Shift API budget towards strategies whose tracks actually get played
+        if getattr(CONF, 'BENDER_ADAPTIVE_WEIGHTS', None) is not False:
+            try:
+                factors = self._yield_factors(self._read_yield())
+            except redis.RedisError as e:
+                logger.warning("Error reading Bender yield stats: %s", e)
+                factors = {}
+            for strategy, factor in factors.items():
+                if strategy in weights:
+                    weights[strategy] *= factor
+
         return weights
 
+    def _track_api_call(self, strategy, event):
+        """Record a Spotify call made while filling a strategy's cache."""
+        analytics.track(self._r, event)
+        self._record_yield(strategy, calls=1)
+
+    def _record_yield(self, strategy, **counts):
+        """Add to this nest's per-strategy Bender yield counters (BENDER|yield).
+
+        Fields: calls (Spotify calls spent on fills), fetched (candidates
+        returned), cached (left after seed/dupe/FILTER removal), accepted
+        (handed to the queue) and rejected (filtered after caching).
+        A strategy's counters are halved once it passes _YIELD_WINDOW calls
+        so the adaptive weights follow recent behaviour.
+        """
+        counts = [(field, n) for field, n in counts.items() if n]
+        if not strategy or not counts:
+            return
+        key = self._key('BENDER|yield')
+        try:
+            pipe = self._r.pipeline(transaction=False)
+            for field, n in counts:
+                pipe.hincrby(key, '%s:%s' % (strategy, field), n)
+            totals = dict(zip((field for field, _ in counts), pipe.execute()))
+            if totals.get('calls', 0) > self._YIELD_WINDOW:
+                self._decay_yield(key, strategy)
+        except redis.RedisError as e:
+            logger.warning("Error recording Bender yield for %s: %s", strategy, e)
+
+    def _decay_yield(self, key, strategy):
+        """Halve a strategy's yield counters without losing concurrent increments."""
+        fields = ['%s:%s' % (strategy, f) for f in self._YIELD_FIELDS]
+        with self._r.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    values = pipe.hmget(key, fields)
+                    # Another player may have halved them already
+                    if int(values[0] or 0) <= self._YIELD_WINDOW:
+                        return
+                    pipe.multi()
+                    pipe.hset(key, mapping={f: int(v or 0) // 2 for f, v in zip(fields, values)})
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+    def _read_yield(self):
+        """Return {strategy: {field: count}} from BENDER|yield."""
+        stats = {}
+        for name, value in self._r.hgetall(self._key('BENDER|yield')).items():
+            strategy, _, field = name.rpartition(':')
+            stats.setdefault(strategy, dict.fromkeys(self._YIELD_FIELDS, 0))[field] = int(value)
+        return stats
+
+    def _yield_factors(self, stats):
+        """Weight multipliers from accepted tracks per Spotify call.
+
+        Each strategy with at least _YIELD_MIN_CALLS calls is compared to
+        the nest-wide average and scaled within _YIELD_FACTOR_RANGE.
+        Strategies that make no calls (throwback, offline) are left alone.
+        """
+        eligible = {s: v for s, v in stats.items() if v['calls'] >= self._YIELD_MIN_CALLS}
+        total_calls = sum(v['calls'] for v in eligible.values())
+        total_accepted = sum(v['accepted'] for v in eligible.values())
+        if not total_calls or not total_accepted:
+            return {}
+        average = float(total_accepted) / total_calls
+        low, high = self._YIELD_FACTOR_RANGE
+        return {s: min(high, max(low, (float(v['accepted']) / v['calls']) / average))
+                for s, v in eligible.items()}
+
+    def get_bender_yield(self):
+        """Per-strategy yield counters and current weight factors, for monitoring."""
+        stats = self._read_yield()
+        factors = self._yield_factors(stats)
+        for strategy, v in stats.items():
+            v['calls_per_accepted'] = round(float(v['calls']) / v['accepted'], 2) if v['accepted'] else None
+            v['weight_factor'] = round(factors.get(strategy, 1.0), 2)
+        return stats
+
     def _get_nest_genre_hint(self):
         """Return the genre keyword for this nest, or None.
 
         Priority: explicit genre_hint from metadata (user-supplied) →
         name-based NEST_SEED_MAP lookup → None.
-        Fresh lookup every call (single hget) to handle renames.
+        Served from the in-process nest metadata cache, which is
+        invalidated on renames.
         """
-        from nests import NestManager, get_nest_seed_info
+        from nests import get_cached_nest, get_nest_seed_info
         try:
-            meta = NestManager(redis_client=self._r).get_nest(self.nest_id)
+            meta = get_cached_nest(self._r, self.nest_id)
             if meta:
                 # Prefer explicit genre_hint from nest creation
                 explicit = meta.get('genre_hint')
@@ -483,13 +741,59 @@ class DB(object):
         return 5 if self.nest_id != "main" else 10
 
     def _fill_strategy_cache(self, strategy, seed_info):
-        """Dispatch to the appropriate fetch method and cache results.
+        """Fill a strategy's cache, with at most one filler per nest and strategy.
 
-        Returns count of tracks cached.
+        The web workers (via get_additional_src) and the player can all find
+        the same cache empty. The first takes a short lease
+        (BENDER|fill-lock:{strategy}) and fills; the rest wait up to
+        _FILL_WAIT_SECONDS for its tracks instead of repeating the Spotify
+        calls. Returns count of tracks cached (or now available, for waiters).
         """
-        if is_spotify_rate_limited() and strategy != 'throwback':
+        if is_spotify_rate_limited() and strategy not in self._OFFLINE_STRATEGIES:
             return 0
+        cache_key = self._cache_key(strategy)
+        if cache_key is None:
+            return 0
+
+        lock_key = self._key('BENDER|fill-lock:{0}'.format(strategy))
+        token = uuid.uuid4().hex
+        if not self._r.set(lock_key, token, nx=True, ex=self._FILL_LOCK_SECONDS):
+            return self._wait_for_fill(cache_key, lock_key)
+        try:
+            # Someone may have filled it between our empty read and the lease
+            available = self._r.llen(cache_key)
+            if available:
+                return available
+            return self._fetch_into_cache(strategy, seed_info)
+        finally:
+            self._release_fill_lock(lock_key, token)
+
+    def _wait_for_fill(self, cache_key, lock_key):
+        """Wait for another worker's fill. Returns tracks available (0 on timeout)."""
+        deadline = time.time() + self._FILL_WAIT_SECONDS
+        while True:
+            available = self._r.llen(cache_key)
+            if available or not self._r.exists(lock_key) or time.time() >= deadline:
+                return available
+            gevent.sleep(self._FILL_POLL_SECONDS)
+
+    def _release_fill_lock(self, lock_key, token):
+        """Delete the fill lease only if we still hold it."""
+        with self._r.pipeline() as pipe:
+            try:
+                pipe.watch(lock_key)
+                if pipe.get(lock_key) == token:
+                    pipe.multi()
+                    pipe.delete(lock_key)
+                    pipe.execute()
+            except redis.WatchError:
+                pass
 
+    def _fetch_into_cache(self, strategy, seed_info):
+        """Dispatch to the appropriate fetch method and cache results.
+
+        Returns count of tracks cached.
+        """
         market = CONF.BENDER_REGIONS[0] if CONF.BENDER_REGIONS else 'US'
         seed_uri = seed_info.get('seed_uri', '') if seed_info else ''
         limit = self._bender_fetch_limit
@@ -506,6 +810,8 @@ class DB(object):
             uris = self._fetch_artist_album_tracks(seed_info, market)
         elif strategy == 'album':
             uris = self._fetch_album_tracks(seed_info)
+        elif strategy == 'offline':
+            uris = self._fetch_offline_tracks(seed_info, limit)
         else:
             return 0
 
@@ -522,6 +828,7 @@ class DB(object):
             seen.add(uri)
             filtered.append(uri)
 
+        self._record_yield(strategy, fetched=len(uris), cached=len(filtered))
         random.shuffle(filtered)
 
         if not filtered:
@@ -557,9 +864,11 @@ class DB(object):
             all_uris = []
             page_size = min(limit, 10)
             for offset in range(0, limit, page_size):
+                if not acquire_spotify_budget(PRIORITY_BACKGROUND):
+                    break
                 results = spotify_client.search(q='genre:"%s"' % genre, type='track',
                                                 limit=page_size, offset=offset, market=market)
-                analytics.track(self._r, 'spotify_api_search')
+                self._track_api_call('genre', 'spotify_api_search')
                 uris = [t['uri'] for t in results.get('tracks', {}).get('items', [])]
                 all_uris.extend(uris)
                 if len(uris) < page_size:
@@ -584,9 +893,11 @@ class DB(object):
             all_uris = []
             page_size = min(limit, 10)
             for offset in range(0, limit, page_size):
+                if not acquire_spotify_budget(PRIORITY_BACKGROUND):
+                    break
                 results = spotify_client.search(artist_name, limit=page_size,
                                                 type='track', offset=offset, market=market)
-                analytics.track(self._r, 'spotify_api_search')
+                self._track_api_call('artist_search', 'spotify_api_search')
                 uris = [t['uri'] for t in results.get('tracks', {}).get('items', [])]
                 all_uris.extend(uris)
                 if len(uris) < page_size:
@@ -606,18 +917,22 @@ class DB(object):
         artist_id = seed_info.get('artist_id', '')
         if not artist_id:
             return []
+        if not acquire_spotify_budget(PRIORITY_BACKGROUND):
+            return []
         try:
             albums = spotify_client.artist_albums(artist_id, album_type='album,single',
                                                   country=market, limit=5)
-            analytics.track(self._r, 'spotify_api_artist_album_tracks')
+            self._track_api_call('artist_album_tracks', 'spotify_api_artist_album_tracks')
             album_ids = [a['id'] for a in albums.get('items', [])]
             if not album_ids:
                 return []
             all_uris = []
             for aid in album_ids[:3]:
+                if not acquire_spotify_budget(PRIORITY_BACKGROUND):
+                    break
                 try:
                     result = spotify_client.album_tracks(aid)
-                    analytics.track(self._r, 'spotify_api_album_tracks')
+                    self._track_api_call('artist_album_tracks', 'spotify_api_album_tracks')
                     all_uris.extend([t['uri'] for t in result.get('items', [])])
                 except Exception:
                     continue
@@ -636,9 +951,11 @@ class DB(object):
         album_id = seed_info.get('album_id', '')
         if not album_id:
             return []
+        if not acquire_spotify_budget(PRIORITY_BACKGROUND):
+            return []
         try:
             result = spotify_client.album_tracks(album_id)
-            analytics.track(self._r, 'spotify_api_album_tracks')
+            self._track_api_call('album', 'spotify_api_album_tracks')
             return [t['uri'] for t in result.get('items', [])]
         except Exception as e:
             if handle_spotify_exception(e):
@@ -647,6 +964,71 @@ class DB(object):
             logger.warning("Error getting album tracks for %s: %s", album_id, e)
             return []
 
+    def _fetch_offline_tracks(self, seed_info, limit=10):
+        """Recommend tracks from play history with no Spotify calls.
+
+        Only reads the model last built by the player's recommender loop.
+        seed_info may be None (e.g. while rate limited); the seed URI is then
+        resolved from Redis alone. While rate limited, the logged metadata is
+        also written to FILL-INFO so the preview needs no track lookup.
+        """
+        from recommender import get_recommender
+        recommender = get_recommender()
+        if recommender is None:
+            return []
+        try:
+            seed_uri = (seed_info or {}).get('seed_uri') or self._resolve_seed_uri()
+            artist_name = (seed_info or {}).get('artist_name')
+            uris = recommender.recommend(seed_uri, artist_name=artist_name, limit=limit)
+        except Exception:
+            logger.warning("Error getting offline recommendations: %s", traceback.format_exc())
+            return []
+
+        if uris and is_spotify_rate_limited():
+            pipe = self._r.pipeline()
+            for uri in uris:
+                key = self._key('FILL-INFO|{0}'.format(uri))
+                pipe.hset(key, mapping=recommender.track_info(uri))
+                pipe.expire(key, 20*60)
+            pipe.execute()
+        return uris
+
+    def _adopt_themed_pool(self):
+        """Fill a cold themed nest's genre cache from the warm pool.
+
+        Only applies while the nest's seed is still its NEST_SEED_MAP track.
+        Pool items carry metadata, which is written to FILL-INFO so the
+        first preview needs no track lookup. Returns count cached.
+        """
+        import bender_pools
+        seed_uri = self._resolve_seed_uri()
+        if not bender_pools.is_themed_seed(seed_uri):
+            return 0
+        try:
+            items = bender_pools.take_from_pool(self._r, seed_uri, self._bender_fetch_limit)
+        except redis.RedisError as e:
+            logger.warning("Error taking from themed pool for %s: %s", seed_uri, e)
+            return 0
+
+        uris = []
+        pipe = self._r.pipeline()
+        for item in items:
+            uri = item.get('trackid')
+            if not uri or uri in uris or self._r.get(self._key("FILTER|%s" % uri)):
+                continue
+            info_key = self._key('FILL-INFO|{0}'.format(uri))
+            pipe.hset(info_key, mapping=item)
+            pipe.expire(info_key, 20*60)
+            uris.append(uri)
+        if not uris:
+            return 0
+        cache_key = self._cache_key('genre')
+        pipe.rpush(cache_key, *uris)
+        pipe.expire(cache_key, 60 * 20)
+        pipe.execute()
+        self._record_yield('genre', fetched=len(items), cached=len(uris))
+        return len(uris)
+
     def _fill_throwback_cache(self):
         """Fill the throwback cache from historical play logs.
 
@@ -685,6 +1067,7 @@ class DB(object):
         keys = [self._key(k) for k in self._STRATEGY_CACHE_KEYS.values()] + [
             self._key('BENDER|seed-info'), self._key('BENDER|throwback-users'),
             self._key('BENDER|throwback-jam-pending'), self._key('BENDER|next-preview'),
+            self._key('BENDER|preview-ready'),
         ]
         self._r.delete(*keys)
 
@@ -736,6 +1119,7 @@ class DB(object):
             if self._r.get(self._key("FILTER|%s" % track_uri)):
                 while track_uri and self._r.get(self._key("FILTER|%s" % track_uri)):
                     self._r.lpop(cache_key)
+                    self._record_yield(strategy, rejected=1)
                     track_uri = self._r.lindex(cache_key, 0)
                 if not track_uri:
                     tried.add(strategy)
@@ -812,9 +1196,20 @@ class DB(object):
             if self._r.llen(cache_key) > 0:
                 return  # At least one cache is warm
 
+        # Themed nests start from the warm pool: no seed or search calls
+        adopted = self._adopt_themed_pool()
+        if adopted > 0:
+            logger.debug("ensure_fill_songs: adopted %d tracks from themed pool", adopted)
+            return
+
         # All caches empty — fill the first strategy that succeeds
         seed_info = self._get_seed_info()
         if not seed_info:
+            # Offline strategies don't need seed metadata from Spotify
+            for strategy in self._OFFLINE_STRATEGIES:
+                if self._fill_strategy_cache(strategy, None) > 0:
+                    logger.debug("ensure_fill_songs: pre-warmed %s without seed info", strategy)
+                    return
             logger.warning("ensure_fill_songs: couldn't resolve seed info")
             return
 
@@ -861,34 +1256,34 @@ class DB(object):
 
             # Verify it's not filtered since the preview was created
             if not self._r.get(self._key("FILTER|%s" % track)):
+                self._record_yield(strategy, accepted=1)
                 self._r.set(self._key('MISC|last-bender-track'), track)
                 logger.info("get_fill_song: strategy=%s, track=%s, user=%s (from preview)", strategy, track, user)
                 return user, track
             # If filtered, fall through to normal rotation below
 
         if is_spotify_rate_limited():
-            # Throwback doesn't need Spotify API — but only for main nest
-            if self.nest_id == "main":
-                track = self._r.lpop(self._key('BENDER|cache:throwback'))
-                if track:
+            # Throwback (main nest only) and offline recommendations don't
+            # need the Spotify API
+            for strategy in self._OFFLINE_STRATEGIES:
+                if strategy == 'throwback' and self.nest_id != "main":
+                    continue
+                cache_key = self._cache_key(strategy)
+                track = self._r.lpop(cache_key)
+                if not track and self._fill_strategy_cache(strategy, None) > 0:
+                    track = self._r.lpop(cache_key)
+                if not track:
+                    continue
+                original_user = ''
+                if strategy == 'throwback':
                     original_user = self._r.hget(self._key('BENDER|throwback-users'), track) or ''
                     self._r.hdel(self._key('BENDER|throwback-users'), track)
                     if original_user:
                         self._r.hset(self._key('BENDER|throwback-jam-pending'), track, original_user)
-                    self._r.set(self._key('MISC|last-bender-track'), track)
-                    logger.info("get_fill_song: strategy=throwback, track=%s, original_user=%s", track, original_user)
-                    return 'the@echonest.com', track
-                # Try to fill throwback cache
-                if self._fill_throwback_cache() > 0:
-                    track = self._r.lpop(self._key('BENDER|cache:throwback'))
-                    if track:
-                        original_user = self._r.hget(self._key('BENDER|throwback-users'), track) or ''
-                        self._r.hdel(self._key('BENDER|throwback-users'), track)
-                        if original_user:
-                            self._r.hset(self._key('BENDER|throwback-jam-pending'), track, original_user)
-                        self._r.set(self._key('MISC|last-bender-track'), track)
-                        logger.info("get_fill_song: strategy=throwback, track=%s, original_user=%s", track, original_user)
-                        return 'the@echonest.com', track
+                self._record_yield(strategy, accepted=1)
+                self._r.set(self._key('MISC|last-bender-track'), track)
+                logger.info("get_fill_song: strategy=%s, track=%s, original_user=%s", strategy, track, original_user)
+                return 'the@echonest.com', track
             return None, None
 
         seed_info = self._get_seed_info()
@@ -918,6 +1313,7 @@ class DB(object):
             while track and self._r.get(self._key("FILTER|%s" % track)):
                 if strategy == 'throwback':
                     self._r.hdel(self._key('BENDER|throwback-users'), track)
+                self._record_yield(strategy, rejected=1)
                 track = self._r.lpop(cache_key)
 
             if not track:
@@ -933,6 +1329,7 @@ class DB(object):
                     self._r.hset(self._key('BENDER|throwback-jam-pending'), track, original_user)
             user = 'the@echonest.com'
 
+            self._record_yield(strategy, accepted=1)
             self._r.set(self._key('MISC|last-bender-track'), track)
             logger.info("get_fill_song: strategy=%s, track=%s, user=%s", strategy, track, user)
             return user, track
@@ -960,6 +1357,21 @@ class DB(object):
         self._r.expire(self._key('MISC|master-player'), 5)
         #I'm the player.
         logger.info('Grabbing player')
+        preview_wake = gevent.event.Event()
+        producer = gevent.spawn(self._preview_producer, preview_wake)
+        try:
+            self._play_loop(preview_wake)
+        finally:
+            producer.kill()
+
+    def _play_loop(self, preview_wake):
+        """Advance the playback clock once a second, forever.
+
+        The Bender preview is no longer computed here: _preview_producer()
+        builds it, and *preview_wake* nudges it after each song. Fills, adds
+        and ensure_queue_depth() still call Spotify from this loop.
+        """
+        transition_start = None
         while True:
 
             song = self.get_now_playing()
@@ -967,6 +1379,9 @@ class DB(object):
             if finish_on and pickle_load_b64(finish_on) > self.player_now():
                 done = pickle_load_b64(finish_on)
             else:
+                # Gap between one song ending and the next starting, fills included
+                if transition_start is None:
+                    transition_start = time.time()
                 if song and song.get('id'):
                     self._complete_song(song)
                     self._clear_now_playing_state()
@@ -1012,11 +1427,8 @@ class DB(object):
             except Exception:
                 logger.warning("ensure_queue_depth failed: %s", traceback.format_exc())
 
-            # Pre-warm Bender preview so the next playlist_update has fresh data
-            try:
-                self._peek_next_fill_song()
-            except Exception:
-                pass
+            # The next fill changed; have the producer refresh the preview now
+            preview_wake.set()
             self._msg('playlist_update')
 
             track_id = song['trackid']
@@ -1027,6 +1439,9 @@ class DB(object):
                           pickle_dump_b64(done))
             self._r.set(self._key('MISC|started-on'),
                           self.player_now().isoformat())
+            if transition_start is not None:
+                metrics.observe('echonest_player_transition_seconds', time.time() - transition_start)
+                transition_start = None
             while self.player_now() < done:
                 paused = self._r.get(self._key('MISC|paused'))
                 if paused:
@@ -1054,6 +1469,22 @@ class DB(object):
             self._complete_song(song)
             self._clear_now_playing_state()
 
+    def _preview_producer(self, wake, poll_seconds=1):
+        """Keep BENDER|preview-ready current for this nest.
+
+        Runs in its own greenlet beside the player so the fill, Spotify
+        and fill-lock waits in refresh_preview() never hold up the clock.
+        Replaces a preview that was queued, filtered or cleared mid-song.
+        """
+        while True:
+            wake.wait(poll_seconds)
+            wake.clear()
+            try:
+                if not self._preview_is_current() and self.refresh_preview() is not None:
+                    self._msg('playlist_update')
+            except Exception:
+                logger.warning("refresh_preview failed: %s", traceback.format_exc())
+
     def player_now(self):
         t = self._r.get(self._key('MISC|player-now'))
         if t:
@@ -1148,6 +1579,7 @@ class DB(object):
         grav = hashlib.md5(userid.strip().lower().encode('utf-8')).hexdigest()
         return 'http://www.gravatar.com/avatar/{0}?d=monsterid&s=180'.format(grav)
 
+    @metrics.timed('echonest_db_call_seconds', op='add_song')
     def _add_song(self, userid, song, force_first, penalty=0):
         self._check_nest_active()
 
@@ -1295,9 +1727,9 @@ class DB(object):
         # Don't make Spotify API calls when rate limited
         if is_spotify_rate_limited():
             logger.debug("get_fill_info: Spotify rate limited, raising exception")
-            raise Exception("Spotify rate limited")
+            raise SpotifyBudgetExceeded("Spotify rate limited")
 
-        song = self.get_spotify_song(trackid, scrobble=False)
+        song = self.get_spotify_song(trackid, scrobble=False, priority=PRIORITY_METADATA)
         # Serialize for Redis storage
         serialized = {}
         for k, v in song.items():
@@ -1311,16 +1743,25 @@ class DB(object):
         self._r.expire(key, 20*60) # 20 minutes should be long enough -- if not, no worries, just refetch
         return song
 
-    def get_spotify_song(self, trackid, scrobble):
+    def get_spotify_song(self, trackid, scrobble, priority=None):
+        # Human adds are interactive; Bender/auto-fill metadata yields to them.
+        # Only the bucket applies here (not the 429 window) so rate-limited
+        # throwback fills can still be queued once the bucket refills.
+        if priority is None:
+            priority = PRIORITY_INTERACTIVE if scrobble else PRIORITY_METADATA
+        if not get_spotify_budget().acquire(priority):
+            raise SpotifyBudgetExceeded("Spotify request budget exhausted (%s)" % priority)
+
         # Handle get_access_token returning dict in newer spotipy versions
         token = auth.get_access_token()
         if isinstance(token, dict):
             token = token.get('access_token', token)
 
-        resp = requests.get(
-            'https://api.spotify.com/v1/tracks/'+trackid.split(':')[-1],
-            headers={'Authorization': 'Bearer ' + str(token)},
-            timeout=10)
+        with metrics.timer('echonest_spotify_request_seconds', endpoint='tracks'):
+            resp = requests.get(
+                'https://api.spotify.com/v1/tracks/'+trackid.split(':')[-1],
+                headers={'Authorization': 'Bearer ' + str(token)},
+                timeout=10)
         analytics.track(self._r, 'spotify_api_get_track')
 
         if resp.status_code != 200:
@@ -1368,6 +1809,9 @@ class DB(object):
         Args:
             episode_id: Either a full URI (spotify:episode:xxx) or just the ID
         """
+        if not get_spotify_budget().acquire(PRIORITY_INTERACTIVE):
+            raise SpotifyBudgetExceeded("Spotify request budget exhausted (%s)" % PRIORITY_INTERACTIVE)
+
         token = auth.get_access_token()
         if isinstance(token, dict):
             token = token.get('access_token', token)
@@ -1376,10 +1820,11 @@ class DB(object):
         if ':' in episode_id:
             episode_id = episode_id.split(':')[-1]
 
-        resp = requests.get(
-            'https://api.spotify.com/v1/episodes/' + episode_id,
-            headers={'Authorization': 'Bearer ' + str(token)},
-            timeout=10)
+        with metrics.timer('echonest_spotify_request_seconds', endpoint='episodes'):
+            resp = requests.get(
+                'https://api.spotify.com/v1/episodes/' + episode_id,
+                headers={'Authorization': 'Bearer ' + str(token)},
+                timeout=10)
         analytics.track(self._r, 'spotify_api_get_episode')
 
         if resp.status_code != 200:
@@ -1528,10 +1973,15 @@ class DB(object):
             logger.warning("benderqueue mismatch: trackId=%s preview=%s", trackId, preview)
             return
 
+        # Add first: if Spotify refuses (budget, rate limit) the preview and
+        # its cache entry are still there to retry
+        newId = self.add_spotify_song(userid, trackId)
+
         strategy = preview.get('strategy', '')
         cache_key = self._cache_key(strategy)
         if cache_key:
             self._r.lpop(cache_key)
+        self._record_yield(strategy, accepted=1)
 
         original_user = preview.get('original_user', '')
         if strategy == 'throwback':
@@ -1539,7 +1989,6 @@ class DB(object):
             self._r.hdel(self._key('BENDER|throwback-jam-pending'), trackId)
 
         self._r.delete(self._key('BENDER|next-preview'))
-        newId = self.add_spotify_song(userid, trackId)
         if original_user:
             # Throwback: only jam the original queuer, not the person who clicked Queue
             self.add_jam(self._key('QUEUEJAM|{0}'.format(newId)), original_user)
@@ -1562,8 +2011,9 @@ class DB(object):
                 self._r.lpop(cache_key)
             if strategy == 'throwback':
                 self._r.hdel(self._key('BENDER|throwback-users'), trackId)
+            self._record_yield(strategy, rejected=1)
 
-        # Always clear the preview so a fresh one is generated on next get_additional_src
+        # Always clear the preview so the player produces a fresh one
         self._r.delete(self._key('BENDER|next-preview'))
         self._r.setex(self._key('FILTER|%s' % trackId), CONF.BENDER_FILTER_TIME, 1)
         self._msg('playlist_update')
@@ -1634,65 +2084,121 @@ class DB(object):
         self._delete_song_state(id)
         self._msg('playlist_update')
 
-    def get_additional_src(self):
-        raw = self._r.hgetall(self._key('MISC|backup-queue-data'))
-        if not raw:
-            # Use _peek_next_fill_song to find the next preview
-            for _ in range(5):
-                try:
-                    self.ensure_fill_songs()
-                except Exception as e:
-                    logger.warning("Failed to ensure fill songs: %s", e)
-                    break
+    def refresh_preview(self):
+        """Compute the next Bender preview and store it in BENDER|preview-ready.
 
-                track_uri, user, strategy = self._peek_next_fill_song()
-                if not track_uri:
-                    break
+        This is the producer side of get_additional_src(). It may fill strategy
+        caches and fetch track metadata from Spotify, so it runs in the master
+        player's preview producer greenlet (after each song, and whenever the
+        record goes stale) rather than on queue reads or the clock loop.
 
-                try:
-                    fillInfo = self.get_fill_info(track_uri)
-                    title = fillInfo['title']
-                    fillInfo['title'] = fillInfo['artist'] + " : " + title
+        Returns the stored record, or None (storing nothing) when Spotify
+        won't serve metadata yet.
+        """
+        record = None
+        # Use _peek_next_fill_song to find the next preview
+        for _ in range(5):
+            try:
+                self.ensure_fill_songs()
+            except Exception as e:
+                logger.warning("Failed to ensure fill songs: %s", e)
+                break
+
+            track_uri, user, strategy = self._peek_next_fill_song()
+            if not track_uri:
+                break
 
-                    fillInfo['name'] = 'Benderbot'
-                    fillInfo['user'] = 'the@echonest.com'
+            try:
+                fillInfo = self.get_fill_info(track_uri)
+            except SpotifyBudgetExceeded as e:
+                # Not the track's fault: keep the candidate and leave the
+                # preview stale so the producer retries once Spotify allows
+                logger.info("Preview metadata for %s deferred: %s", track_uri, e)
+                return None
+            except Exception:
+                logger.error('song not available: %s', track_uri)
+                logger.error('backtrace: %s', traceback.format_exc())
+                # Clear preview and pop from cache so we move to next
+                preview = self._r.hgetall(self._key('BENDER|next-preview'))
+                if preview:
+                    strat = preview.get('strategy', '')
+                    ck = self._cache_key(strat)
+                    if ck:
+                        self._r.lpop(ck)
+                    if strat == 'throwback':
+                        self._r.hdel(self._key('BENDER|throwback-users'), track_uri)
+                    self._r.delete(self._key('BENDER|next-preview'))
+                continue
 
-                    if strategy == 'throwback':
-                        fillInfo['name'] = 'Benderbot (throwback)'
+            record = {}
+            for k, v in fillInfo.items():
+                if isinstance(v, (dict, list)):
+                    record[k] = json.dumps(v)
+                elif v is None:
+                    record[k] = ''
+                else:
+                    record[k] = str(v) if not isinstance(v, str) else v
+            record['trackid'] = track_uri
+            record['title'] = record.get('artist', '') + " : " + record.get('title', '')
+            record['name'] = 'Benderbot (throwback)' if strategy == 'throwback' else 'Benderbot'
+            record['user'] = 'the@echonest.com'
+
+            # Show original queuer as a throwback jam in the preview
+            original_user = self._r.hget(self._key('BENDER|next-preview'), 'original_user')
+            jam = [{'user': original_user, 'throwback': True}] if original_user else []
+            record['jam'] = json.dumps(jam)
+            break
+
+        if record is None:
+            # Fallback when fill songs are unavailable. Keyed to whatever
+            # preview is left so the player doesn't retry every tick.
+            record = {'name': 'Benderbot', 'user': 'the@echonest.com',
+                      'title': 'No songs available', 'img': '', 'jam': '[]',
+                      'trackid': self._r.hget(self._key('BENDER|next-preview'), 'trackid') or ''}
+
+        key = self._key('BENDER|preview-ready')
+        pipe = self._r.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=record)
+        pipe.execute()
+        return record
 
-                    fillInfo['playlist_src'] = True
-                    fillInfo['dm_buttons'] = False
+    def _preview_is_current(self):
+        """True if BENDER|preview-ready describes the current BENDER|next-preview."""
+        pipe = self._r.pipeline()
+        pipe.hget(self._key('BENDER|preview-ready'), 'trackid')
+        pipe.exists(self._key('BENDER|preview-ready'))
+        pipe.hget(self._key('BENDER|next-preview'), 'trackid')
+        ready_track, ready, preview_track = pipe.execute()
+        return bool(ready) and (ready_track or '') == (preview_track or '')
 
-                    # Show original queuer as a throwback jam in the preview
-                    preview = self._r.hgetall(self._key('BENDER|next-preview'))
-                    original_user = preview.get('original_user', '') if preview else ''
-                    if original_user:
-                        fillInfo['jam'] = [{'user': original_user, 'throwback': True}]
-                    else:
-                        fillInfo['jam'] = []
-                    return fillInfo
-                except Exception:
-                    logger.error('song not available: %s', track_uri)
-                    logger.error('backtrace: %s', traceback.format_exc())
-                    # Clear preview and pop from cache so we move to next
-                    preview = self._r.hgetall(self._key('BENDER|next-preview'))
-                    if preview:
-                        strat = preview.get('strategy', '')
-                        ck = self._cache_key(strat)
-                        if ck:
-                            self._r.lpop(ck)
-                        if strat == 'throwback':
-                            self._r.hdel(self._key('BENDER|throwback-users'), track_uri)
-                        self._r.delete(self._key('BENDER|next-preview'))
-                    continue
+    def get_additional_src(self):
+        """Return the playlist-src card shown after the queue.
 
-            # Fallback when fill songs are unavailable
+        Pure Redis: the Bender preview is produced by refresh_preview() in
+        the master player. While it's missing, or stale because the preview
+        was queued or filtered, a placeholder is returned until the player
+        stores the next one.
+        """
+        pipe = self._r.pipeline()
+        pipe.hgetall(self._key('MISC|backup-queue-data'))
+        pipe.hgetall(self._key('BENDER|preview-ready'))
+        pipe.hget(self._key('BENDER|next-preview'), 'trackid')
+        raw, ready, preview_track = pipe.execute()
+        if raw:
+            raw['playlist_src'] = True
+            return raw
+
+        if not ready or ready.get('trackid', '') != (preview_track or ''):
             return {'playlist_src': True, 'name': 'Benderbot', 'user': 'the@echonest.com',
-                    'title': 'No songs available', 'img': '', 'jam': [], 'dm_buttons': False}
+                    'title': 'Picking the next song...', 'img': '', 'jam': [], 'dm_buttons': False}
 
-        raw['playlist_src'] = True
-        return raw
+        ready['jam'] = json.loads(ready.get('jam') or '[]')
+        ready['playlist_src'] = True
+        ready['dm_buttons'] = False
+        return ready
 
+    @metrics.timed('echonest_db_call_seconds', op='get_queued')
     def get_queued(self):
         self._purge_stale_queue_entries()
         songs = self._r.zrange(self._key('MISC|priority-queue'), 0, -1, withscores=True)
@@ -1732,7 +2238,18 @@ class DB(object):
                 logger.warning("Skipping song %s with missing data (keys: %s)", song, list(data.keys()))
                 continue
 
-            self._r.setex(self._key('MISC|now-playing'), 2*60*60, song)
+            # The summary lets nest listings show what's playing without
+            # reading the queue entry (see NestManager.page_nests)
+            pipe = self._r.pipeline(transaction=False)
+            pipe.setex(self._key('MISC|now-playing'), 2*60*60, song)
+            summary_key = self._key('MISC|now-playing-summary')
+            pipe.delete(summary_key)
+            pipe.hset(summary_key, mapping={
+                'title': data.get('title') or '',
+                'artist': data.get('secondary_text') or data.get('artist') or '',
+            })
+            pipe.expire(summary_key, 2*60*60)
+            pipe.execute()
             self._msg('now_playing_update')
             if self.nest_id == "main":
                 slack.notify_now_playing(data)
@@ -1755,6 +2272,7 @@ class DB(object):
             end_time = self.player_now().isoformat()
         return end_time
 
+    @metrics.timed('echonest_db_call_seconds', op='get_now_playing')
     def get_now_playing(self):
         rv = {}
         song = self._r.get(self._key('MISC|now-playing'))
@@ -1785,6 +2303,7 @@ class DB(object):
     def get_current_airhorns(self):
         return self._r.lrange(self._key('AIRHORNS'), 0, -1)
 
+    @metrics.timed('echonest_db_call_seconds', op='vote')
     def vote(self, userid, id, up):
         self._check_nest_active()
         norm_color = [34, 34, 34]
@@ -1986,6 +2505,7 @@ class DB(object):
         return new_vol
 
     def _msg(self, msg):
+        metrics.inc('echonest_pubsub_published', message=msg.split('|', 1)[0])
         self._r.publish(self._key('MISC|update-pubsub'), msg)
 
     def try_login(self, email, passwd):
@@ -1,12 +1,21 @@
-from datetime import datetime
+import calendar
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+from datetime import datetime, timedelta
 import dateutil.parser
+import gzip
+import hashlib
 import logging
 import os.path
+import time
+import types
 import simplejson as json
 from simplejson import JSONDecodeError
+import numpy as np
 
 from config import CONF
 from glob import glob
+from history_archive import HistoryArchive
 
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -16,11 +25,238 @@ else:
     logger.setLevel(logging.INFO)
 
 DAILY_MIX_USER = 'dailymix@spotify.com'
+BENDER_USER = 'the@echonest.com'
+
+# Per-weekday throwback index: hash of trackid -> user who queued it
+THROWBACK_INDEX_KEY = 'THROWBACK|index:%d'
+THROWBACK_INDEX_BUILT_KEY = 'THROWBACK|index-built'
+_THROWBACK_BACKFILL_BATCH = 1000
+
+# Play store: hash of play id -> play json, plus sorted-set indexes of play
+# ids scored by endtime.  a play's id is a digest of its canonical json, so
+# re-adding the same play is a no-op.
+PLAYS_KEY = 'PLAYHISTORY|plays'
+PLAYS_BY_TIME_KEY = 'PLAYHISTORY|by-time'
+PLAYS_BY_USER_KEY = 'PLAYHISTORY|user:%s'
+PLAYS_BY_JAMMER_KEY = 'PLAYHISTORY|jammer:%s'
+PLAYS_BY_TRACK_KEY = 'PLAYHISTORY|track:%s'
+PLAYS_BY_ARTIST_KEY = 'PLAYHISTORY|artist:%s'
+LEGACY_PLAYS_KEY = 'playhistory'
+# redis index key per HistoryArchive index name
+_INDEX_KEYS = {
+    'time': PLAYS_BY_TIME_KEY,
+    'user': PLAYS_BY_USER_KEY,
+    'jammer': PLAYS_BY_JAMMER_KEY,
+    'track': PLAYS_BY_TRACK_KEY,
+    'artist': PLAYS_BY_ARTIST_KEY,
+}
+# plays older than this live only in the on-disk archive (history_archive)
+_DEFAULT_REDIS_DAYS = 30
+_MIGRATE_LOCK_KEY = 'PLAYHISTORY|migrating'
+_MIGRATE_BATCH = 1000
+
+# Leaderboards: per-day and per-week sorted sets of plays per track, artist
+# and (human) user, plus jams received per track, and HyperLogLogs of unique
+# listeners (queuers and jammers).  updated for each newly stored play.
+LEADERBOARD_KEY = 'LEADERBOARD|%s:%s:%s'        # dimension, period, period id
+LISTENERS_KEY = 'LEADERBOARD|listeners:%s:%s'   # period, period id
+LEADERBOARD_DIMENSIONS = ('track', 'artist', 'user', 'jam')
+LEADERBOARD_PERIODS = {'day': 35 * 24 * 60 * 60, 'week': 400 * 24 * 60 * 60}   # retention after period end
+
+# Plays in the on-disk archive, cached so history reads skip its COUNT(*).
+# Dropped whenever plays are archived; the TTL bounds a racing recount.
+ARCHIVED_COUNT_KEY = 'PLAYHISTORY|archived-count'
+_ARCHIVED_COUNT_TTL = 60 * 60
+
+# Bulk loader: byte offset already ingested per play log file (by basename)
+LOG_OFFSETS_KEY = 'PLAYHISTORY|log-offsets'
+_LOAD_BATCH = 5000
+
+
+def play_id(json_play):
+    '''
+    return the store id for a play given its canonical (sort_keys) json.
+
+    '''
+    return hashlib.sha1(json_play.encode('utf-8')).hexdigest()
+
+
+def parse_play_time(value):
+    '''
+    return a history score (seconds since the epoch, naive times read as
+    UTC like play endtimes) for an ISO-8601 time or a number of seconds.
+
+    '''
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    dt = dateutil.parser.parse(value)
+    if dt.tzinfo is not None:
+        return dt.timestamp()
+    return (dt - datetime(1970, 1, 1)).total_seconds()
+
+
+def encode_history_cursor(score, pid):
+    return '%r:%s' % (score, pid)
+
+
+def decode_history_cursor(cursor):
+    '''
+    return (score, play id) for a cursor from encode_history_cursor.
+    raises ValueError for anything else.
+
+    '''
+    score, _, pid = (cursor or '').partition(':')
+    if not pid:
+        raise ValueError('bad history cursor: %r' % cursor)
+    return float(score), pid
+
+
+def leaderboard_period(period, when):
+    '''
+    return (period id, unix time the period ends) for the 'day' or 'week'
+    containing the datetime when.  days are YYYY-MM-DD, weeks ISO YYYY-Www.
+
+    '''
+    day = when.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    if period == 'day':
+        start, period_id = day, day.strftime('%Y-%m-%d')
+        end = start + timedelta(days=1)
+    elif period == 'week':
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=7)
+        iso = start.isocalendar()
+        period_id = '%d-W%02d' % (iso[0], iso[1])
+    else:
+        raise ValueError('unknown leaderboard period %r' % period)
+    return period_id, calendar.timegm(end.timetuple())
+
+
+def _log_load_stats(stats):
+    seconds = max(stats['seconds'], 0.001)
+    logger.info('Loaded %d new plays from %d lines in %d files (%.1f MB) in %.1fs: %d lines/s, %.1f MB/s'
+                % (stats['plays'], stats['lines'], stats['files'], stats['bytes'] / 1e6,
+                   stats['seconds'], stats['lines'] / seconds, stats['bytes'] / 1e6 / seconds))
+
+
+def _load_play_logs_worker(redis_kwargs, log_files, batch_size):
+    import redis
+    client = redis.StrictRedis(**redis_kwargs)
+    history = PlayHistory(types.SimpleNamespace(_r=client))
+    history._play_store_ready = True
+    return history.load_play_logs(log_files, batch_size, report=False)
+
+
+def load_play_logs_parallel(redis_kwargs, log_files=None, workers=4, batch_size=_LOAD_BATCH):
+    '''
+    bulk load play logs with *workers* processes, each with its own redis
+    connection (built from *redis_kwargs*) and a share of the files.  for
+    multi-year archives; offsets are per file, so this resumes like
+    PlayHistory.load_play_logs.  returns the combined stats.
+
+    '''
+    import redis
+    if log_files is None:
+        log_files = play_log_files()
+    PlayHistory(types.SimpleNamespace(_r=redis.StrictRedis(**redis_kwargs))).ensure_play_store()
+
+    start = time.time()
+    totals = dict.fromkeys(('files', 'lines', 'plays', 'bytes'), 0)
+    with ProcessPoolExecutor(workers) as pool:
+        shares = [log_files[i::workers] for i in range(workers)]
+        for stats in pool.map(_load_play_logs_worker, [redis_kwargs] * workers, shares,
+                              [batch_size] * workers):
+            for k in totals:
+                totals[k] += stats[k]
+    totals['seconds'] = time.time() - start
+    _log_load_stats(totals)
+    return totals
+
+
+def play_log_files(log_dir=None):
+    '''
+    return the daily play log paths under log_dir (default CONF.LOG_DIR),
+    oldest first.  file names are play_log_YYYY_MM_DD.json, gzipped to
+    play_log_YYYY_MM_DD.json.gz once the day is closed, so a plain sort is
+    chronological (a compressed day sorts before any late plain lines).
+
+    '''
+    log_dir = log_dir or CONF.LOG_DIR
+    return sorted(glob(os.path.join(log_dir, 'play_log_*.json'))
+                  + glob(os.path.join(log_dir, 'play_log_*.json.gz')),
+                  key=lambda path: (path.replace('.json.gz', '.json'), not path.endswith('.gz')))
+
+
+def open_play_log(log_file, mode='r'):
+    '''
+    open a play log, plain or gzipped, in text ('r') or binary ('rb') mode.
+
+    '''
+    if log_file.endswith('.gz'):
+        return gzip.open(log_file, 'rt' if mode == 'r' else mode, encoding='utf-8' if mode == 'r' else None)
+    return open(log_file, mode, encoding='utf-8' if mode == 'r' else None)
+
+
+def iter_logged_plays(log_files=None):
+    '''
+    yield play dicts from the given play log files (default: all of them,
+    oldest first), skipping unreadable files and broken lines.
+
+    '''
+    if log_files is None:
+        log_files = play_log_files()
+    for log_file in log_files:
+        try:
+            with open_play_log(log_file) as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except JSONDecodeError:
+                        continue
+        except (IOError, EOFError):
+            logger.warning('Could not read play log %s' % log_file)
+
 
 class PlayHistory(object):
-    def __init__(self, db):
+    def __init__(self, db, archive_path=None):
         self._db = db
         self._epoch = datetime(1970,1,1,0,0,0)
+        self._throwback_index_ready = False
+        self._play_store_ready = False
+        self._archive_path = archive_path
+        self._archive = None
+
+    @property
+    def archive(self):
+        '''
+        the on-disk tier: plays older than HISTORY_REDIS_DAYS.
+
+        '''
+        if self._archive is None:
+            path = (self._archive_path or getattr(CONF, 'HISTORY_ARCHIVE_PATH', None)
+                    or os.path.join(CONF.LOG_DIR, 'history.sqlite3'))
+            self._archive = HistoryArchive(path)
+        return self._archive
+
+    def _redis_cutoff(self):
+        days = getattr(CONF, 'HISTORY_REDIS_DAYS', None) or _DEFAULT_REDIS_DAYS
+        return (datetime.now() - self._epoch).total_seconds() - days * 24 * 60 * 60
+
+    def _index_keys(self, play):
+        '''
+        the redis index keys other than the time index that list a play.
+
+        '''
+        keys = []
+        if play.get('user'):
+            keys.append(PLAYS_BY_USER_KEY % play['user'])
+        keys.extend(PLAYS_BY_JAMMER_KEY % jammer for jammer in set(self._jams(play)))
+        if play.get('trackid'):
+            keys.append(PLAYS_BY_TRACK_KEY % play['trackid'])
+        if play.get('artist'):
+            keys.append(PLAYS_BY_ARTIST_KEY % play['artist'])
+        return keys
 
     def add_play(self, play, initial_init=False):
         '''
@@ -28,18 +264,166 @@ class PlayHistory(object):
 
         '''
         if isinstance(play, str):
-            json_play = play
-            endtime = self.play_endtime(json.loads(play))
-        else:
-            json_play = json.dumps(play, sort_keys=True)
-            endtime = self.play_endtime(play)
-
-        if self._db._r.zscore('playhistory', json_play):
+            play = json.loads(play)
+        self.ensure_play_store()
+        if not self._store_plays(self._db._r, [play]):
             return # play already in redis
-        # New redis-py API: zadd(key, {member: score})
-        self._db._r.zadd('playhistory', {json_play: endtime})
         if not initial_init:
-            logger.debug("added play; store is now %d plays" % self.num_plays())
+            logger.debug("added play %s", play.get('trackid'))
+
+    def _store_plays(self, client, plays):
+        '''
+        store a batch of plays by id and add the new ones to the time, user,
+        jammer, track, artist and throwback indexes, in two round trips.
+        plays older than the redis window go straight to the archive.
+        returns the plays that weren't already stored.
+
+        '''
+        cutoff = self._redis_cutoff()
+        entries = []
+        archived = []
+        for play in plays:
+            try:
+                endtime = self.play_endtime(play)
+            except (KeyError, TypeError, ValueError, OverflowError):
+                logger.warning('Skipping play without a valid endtime: %s' % play)
+                continue
+            json_play = json.dumps(play, sort_keys=True)
+            if endtime < cutoff:
+                archived.append((play_id(json_play), endtime, play, json_play))
+            else:
+                entries.append((play, play_id(json_play), json_play, endtime))
+
+        pipe = client.pipeline(transaction=False)
+        new_plays = []
+        if archived:
+            added = self.archive.add_plays(archived, self._jams)
+            if added:
+                pipe.delete(ARCHIVED_COUNT_KEY)
+            for pid, _endtime, play, _json_play in archived:
+                if pid in added:
+                    added.discard(pid)
+                    self._index_throwback(pipe, play)
+                    self._count_play(pipe, play)
+                    new_plays.append(play)
+        if not entries:
+            if new_plays:
+                pipe.execute()
+            return new_plays
+
+        for _play, pid, json_play, _endtime in entries:
+            pipe.hsetnx(PLAYS_KEY, pid, json_play)
+        stored = pipe.execute()[-len(entries):]
+
+        for (play, pid, _json_play, endtime), is_new in zip(entries, stored):
+            if not is_new:
+                continue
+            pipe.zadd(PLAYS_BY_TIME_KEY, {pid: endtime})
+            for key in self._index_keys(play):
+                pipe.zadd(key, {pid: endtime})
+            self._index_throwback(pipe, play)
+            self._count_play(pipe, play)
+            new_plays.append(play)
+        if new_plays:
+            pipe.execute()
+        return new_plays
+
+    def _count_play(self, client, play):
+        '''
+        add a play to its day's and week's leaderboards and listener counts.
+        keys expire a while after their period ends, so backfilled plays
+        older than that don't build leaderboards at all.
+
+        '''
+        try:
+            endtime = dateutil.parser.parse(play['endtime'])
+        except (KeyError, TypeError, ValueError, OverflowError):
+            return
+        user = play.get('user')
+        jammers = set(self._jams(play))
+        members = {
+            'track': play.get('trackid'),
+            'artist': play.get('artist'),
+            'user': user if user != BENDER_USER else None,
+        }
+        listeners = jammers | ({user} if user and user != BENDER_USER else set())
+        for period, retention in LEADERBOARD_PERIODS.items():
+            period_id, period_end = leaderboard_period(period, endtime)
+            keys = []
+            for dimension, member in members.items():
+                if member:
+                    key = LEADERBOARD_KEY % (dimension, period, period_id)
+                    client.zincrby(key, 1, member)
+                    keys.append(key)
+            if jammers and play.get('trackid'):
+                key = LEADERBOARD_KEY % ('jam', period, period_id)
+                client.zincrby(key, len(jammers), play['trackid'])
+                keys.append(key)
+            if listeners:
+                key = LISTENERS_KEY % (period, period_id)
+                client.pfadd(key, *listeners)
+                keys.append(key)
+            for key in keys:
+                client.expireat(key, period_end + retention)
+
+    def get_leaderboard(self, dimension, period='week', when=None, limit=10):
+        '''
+        return [(member, count)], highest first, for a dimension ('track',
+        'artist', 'user' or 'jam') in the day or week containing when
+        (default now).
+
+        '''
+        if dimension not in LEADERBOARD_DIMENSIONS:
+            raise ValueError('unknown leaderboard dimension %r' % dimension)
+        period_id, _ = leaderboard_period(period, when or datetime.now())
+        rows = self._db._r.zrevrange(LEADERBOARD_KEY % (dimension, period, period_id),
+                                     0, limit - 1, withscores=True)
+        return [(member, int(score)) for member, score in rows]
+
+    def get_unique_listeners(self, period='week', when=None):
+        period_id, _ = leaderboard_period(period, when or datetime.now())
+        return self._db._r.pfcount(LISTENERS_KEY % (period, period_id))
+
+    def ensure_play_store(self):
+        '''
+        move plays from the legacy 'playhistory' sorted set (json members)
+        into the indexed store on first use.  one process migrates, guarded
+        by a short lock; the legacy key is deleted when done.  the store is
+        only marked ready once that key is gone, so a process that lost the
+        lock checks again on its next call (and takes over if the migrating
+        process died).
+
+        '''
+        if self._play_store_ready:
+            return
+        r = self._db._r
+        if r.exists(LEGACY_PLAYS_KEY):
+            if not r.set(_MIGRATE_LOCK_KEY, 1, nx=True, ex=600):
+                return
+            try:
+                self.migrate_legacy_plays()
+            finally:
+                r.delete(_MIGRATE_LOCK_KEY)
+        self._play_store_ready = True
+
+    def migrate_legacy_plays(self):
+        r = self._db._r
+        start = datetime.now()
+        migrated = 0
+        for _ in range(0, r.zcard(LEGACY_PLAYS_KEY), _MIGRATE_BATCH):
+            batch = r.zrange(LEGACY_PLAYS_KEY, 0, _MIGRATE_BATCH - 1)
+            if not batch:
+                break
+            plays = []
+            for json_play in batch:
+                try:
+                    plays.append(json.loads(json_play))
+                except JSONDecodeError:
+                    logger.warning('Dropping unreadable legacy play: %s' % json_play)
+            migrated += len(self._store_plays(r, plays))
+            r.zrem(LEGACY_PLAYS_KEY, *batch)
+        r.delete(LEGACY_PLAYS_KEY)
+        logger.info("Migrated %d legacy plays in %s" % (migrated, datetime.now() - start))
 
     def play_endtime(self, play):
         if isinstance(play, str):
@@ -48,7 +432,170 @@ class PlayHistory(object):
         return (endtime - self._epoch).total_seconds()
 
     def num_plays(self):
-        return self._db._r.zcard('playhistory')
+        self.ensure_play_store()
+        return self._archived_count() + self._db._r.zcard(PLAYS_BY_TIME_KEY)
+
+    def _archived_count(self):
+        '''
+        number of plays in the archive tier, from ARCHIVED_COUNT_KEY when
+        cached.
+
+        '''
+        r = self._db._r
+        count = r.get(ARCHIVED_COUNT_KEY)
+        if count is None:
+            count = self.archive.count()
+            r.set(ARCHIVED_COUNT_KEY, count, ex=_ARCHIVED_COUNT_TTL)
+        return int(count)
+
+    def trim_recent_history(self, batch_size=_MIGRATE_BATCH):
+        '''
+        move plays older than HISTORY_REDIS_DAYS from redis to the archive,
+        so history can't grow redis without bound.  plays are archived
+        before they're deleted from redis; readers dedupe the overlap.
+        returns the number of plays moved.
+
+        '''
+        r = self._db._r
+        cutoff = self._redis_cutoff()
+        moved = 0
+        while True:
+            rows = r.zrangebyscore(PLAYS_BY_TIME_KEY, '-inf', '(%r' % cutoff,
+                                   start=0, num=batch_size, withscores=True)
+            if not rows:
+                break
+            pids = [pid for pid, _score in rows]
+            entries = []
+            unreadable = []
+            for (pid, score), json_play in zip(rows, r.hmget(PLAYS_KEY, pids)):
+                try:
+                    entries.append((pid, score, json.loads(json_play), json_play))
+                except (TypeError, JSONDecodeError):
+                    logger.warning('Dropping unreadable play %s: %s' % (pid, json_play))
+                    unreadable.append(pid)
+            self.archive.add_plays(entries, self._jams)
+            if unreadable:
+                self._drop_from_indexes(unreadable)
+            pipe = r.pipeline(transaction=False)
+            pipe.delete(ARCHIVED_COUNT_KEY)
+            pipe.hdel(PLAYS_KEY, *pids)
+            pipe.zrem(PLAYS_BY_TIME_KEY, *pids)
+            for pid, _score, play, _json_play in entries:
+                for key in self._index_keys(play):
+                    pipe.zrem(key, pid)
+            pipe.execute()
+            moved += len(rows)
+        if moved:
+            logger.info('Archived %d plays older than the redis history window' % moved)
+        return moved
+
+    def _drop_from_indexes(self, pids):
+        '''
+        remove play ids from every user/jammer/track/artist index.  used for
+        plays whose json is gone or unreadable, so their index keys can't be
+        worked out; scans the index keys instead.
+
+        '''
+        r = self._db._r
+        pipe = r.pipeline(transaction=False)
+        for index, template in _INDEX_KEYS.items():
+            if index == 'time':
+                continue
+            for key in r.scan_iter(match=template % '*', count=1000):
+                pipe.zrem(key, *pids)
+        pipe.execute()
+
+    def _redis_rows(self, index, value=None, low=None, high=None, after=None, batch_size=500):
+        '''
+        yield (endtime, id, json) from a redis index in (endtime, id) order,
+        with ZRANGEBYSCORE ... LIMIT pages.  after is an (endtime, id)
+        cursor; rows at or before it are skipped.
+
+        '''
+        key = _INDEX_KEYS[index] if index == 'time' else _INDEX_KEYS[index] % value
+        low = '-inf' if low is None else low
+        high = '+inf' if high is None else high
+        after_id = None
+        if after is not None:
+            low, after_id = after
+        r = self._db._r
+        num = batch_size
+        while True:
+            rows = r.zrangebyscore(key, low, high, start=0, num=num, withscores=True)
+            # members with equal scores come back in lexical order, so the
+            # ones at or before the cursor are a prefix of the page
+            fresh = [(pid, score) for pid, score in rows
+                     if after_id is None or score != low or pid > after_id]
+            if fresh:
+                for (pid, score), json_play in zip(fresh, r.hmget(PLAYS_KEY, [pid for pid, _ in fresh])):
+                    if json_play is not None:
+                        yield score, pid, json_play
+            if len(rows) < num:
+                return
+            last_pid, last_score = rows[-1]
+            # a page that is all ties can't move the cursor; widen it instead
+            num = num * 2 if last_score == low else batch_size
+            low, after_id = last_score, last_pid
+
+    def _rows(self, index, value=None, low=None, high=None, after=None, batch_size=500):
+        '''
+        yield (endtime, id, json) from both tiers, merged in (endtime, id)
+        order, each play once.
+
+        '''
+        self.ensure_play_store()
+        merged = heapq.merge(
+            self.archive.rows(index, value, low, high, after, batch_size),
+            self._redis_rows(index, value, low, high, after, batch_size),
+            key=lambda row: (row[0], row[1]))
+        last_id = None
+        for row in merged:
+            if row[1] != last_id:
+                last_id = row[1]
+                yield row
+
+    def _load_plays(self, index, value=None):
+        '''
+        return every play in one of the indexes, oldest first.
+
+        '''
+        response = []
+        for _endtime, _pid, play in self._rows(index, value):
+            try:
+                response.append(json.loads(play))
+            except Exception as _e:
+                logger.debug('Exception deserializing play: %s' % play)
+                logger.debug(_e)
+        return response
+
+    def _plays_at(self, start, end):
+        '''
+        return the plays at positions start..end (inclusive, oldest first)
+        across both tiers; archived plays come first.
+
+        '''
+        self.ensure_play_store()
+        archived = self._archived_count()
+        end = min(end, archived + self._db._r.zcard(PLAYS_BY_TIME_KEY) - 1)
+        start = max(start, 0)
+        if end < start:
+            return []
+        rows = []
+        if start < archived:
+            rows = [play for _endtime, _pid, play
+                    in self.archive.rows_at(start, min(end, archived - 1) - start + 1)]
+        if end >= archived:
+            ids = self._db._r.zrange(PLAYS_BY_TIME_KEY, max(start - archived, 0), end - archived)
+            if ids:
+                rows.extend(play for play in self._db._r.hmget(PLAYS_KEY, ids) if play is not None)
+        response = []
+        for play in rows:
+            try:
+                response.append(json.loads(play))
+            except Exception as _e:
+                logger.debug('Exception deserializing play: %s' % play)
+                logger.debug(_e)
+        return response
 
     def get_play(self, play_index):
         '''
@@ -57,37 +604,84 @@ class PlayHistory(object):
         the current prosecco queue
 
         '''
-        play = self._db._r.zrange('playhistory', play_index, play_index)
-        try:
-            return json.loads(play[0])
-        except Exception as _e:
-            logger.debug('Exception deserializing play: %s' % play)
-            logger.debug(_e)
-            return {}
+        plays = self._plays_at(play_index, play_index)
+        return plays[0] if plays else {}
 
     def init_history(self):
         logger.info('Initialize play history store from %s' % CONF.LOG_DIR)
         if not os.path.isdir(CONF.LOG_DIR):
             logger.error('Play history dir %s does not exist.  Cannot initialize history.' % CONF.LOG_DIR)
             return
+        self.load_play_logs()
 
-        play_log_files = glob(CONF.LOG_DIR + '/play_log_*.json')
-        start = datetime.now()
-        logger.info("History init starting at %s" % start)
-        map(self._store_play_log_file, play_log_files)
-        logger.info("History init took %s" % (datetime.now() - start))
+    def load_play_logs(self, log_files=None, batch_size=_LOAD_BATCH, report=True):
+        '''
+        bulk load play logs (default: all of them) into the play store.
+        lines are inserted in pipelined batches, and each file resumes from
+        the byte offset recorded in PLAYHISTORY|log-offsets, so a restart
+        only reads lines appended since the last load.  returns stats:
+        files, lines, plays (newly stored), bytes and seconds.
+
+        '''
+        if log_files is None:
+            log_files = play_log_files()
+        self.ensure_play_store()
+        start = time.time()
+        stats = dict.fromkeys(('files', 'lines', 'plays', 'bytes'), 0)
+        offsets = self._db._r.hgetall(LOG_OFFSETS_KEY)
+        for log_file in log_files:
+            self._load_play_log_file(log_file, batch_size, stats, offsets)
+        stats['seconds'] = time.time() - start
+        if report:
+            _log_load_stats(stats)
+        return stats
+
+    def _load_play_log_file(self, log_file, batch_size, stats, offsets):
+        r = self._db._r
+        name = os.path.basename(log_file)
+        try:
+            size = os.path.getsize(log_file)
+        except OSError:
+            logger.warning('Could not read play log %s' % log_file)
+            return
+        offset = int(offsets.get(name) or 0)
+        # offsets count uncompressed bytes, so a gzipped day is instead
+        # skipped while its compressed size matches the last full read
+        compressed = log_file.endswith('.gz')
+        if compressed:
+            if offsets.get(name + '|size') == str(size):
+                return
+        elif offset > size:
+            offset = 0  # file was replaced; dedupe makes a full reread safe
+        elif offset == size:
+            return
 
-    def _store_play_log_file(self, play_log_filename):
-        with open(play_log_filename) as plf:
+        stats['files'] += 1
+        batch = []
+        with open_play_log(log_file, 'rb') as plf:
+            plf.seek(offset)
             for line in plf:
+                if not line.endswith(b'\n'):
+                    break  # partial line still being written
+                offset += len(line)
+                stats['lines'] += 1
+                stats['bytes'] += len(line)
                 try:
-                    self.add_play(json.loads(line), True)
-                except JSONDecodeError as _jde:
+                    batch.append(json.loads(line.decode('utf-8')))
+                except (JSONDecodeError, UnicodeDecodeError):
                     logger.warning('Skipping broken play from file %s -- line is: "%s"'
-                                   % (play_log_filename, line))
+                                   % (log_file, line))
+                if len(batch) >= batch_size:
+                    stats['plays'] += len(self._store_plays(r, batch))
+                    r.hset(LOG_OFFSETS_KEY, name, offset)
+                    batch = []
+        stats['plays'] += len(self._store_plays(r, batch))
+        r.hset(LOG_OFFSETS_KEY, name, offset)
+        if compressed:
+            r.hset(LOG_OFFSETS_KEY, name + '|size', size)
 
     def _jams(self, play):
-        return [jam['user'] if type(jam)==dict else jam for jam in play['jam']]
+        return [jam['user'] if type(jam)==dict else jam for jam in play.get('jam') or []]
 
     def get_historian(self):
         return self._h
@@ -101,112 +695,161 @@ class PlayHistory(object):
             min = highest_play - n_plays
             max = highest_play
 
-        plays = self._db._r.zrange('playhistory', min, max)
-        response = []
-        for play in plays:
-            try:
-                response.append(json.loads(play))
-            except Exception as _e:
-                logger.debug('Exception deserializing play: %s' % play)
-                logger.debug(_e)
-
-        return response
+        return self._plays_at(min, max)
 
     def get_user_plays(self, userid):
-        all_plays = self.get_plays(self.num_plays(), True)
-        user_plays = []
-        for play in all_plays:
-            if DAILY_MIX_USER in self._jams(play):
+        return [play for play in self._load_plays('user', userid)
+                if DAILY_MIX_USER not in self._jams(play)]
+
+    def get_user_jams(self, userid):
+        return self._load_plays('jammer', userid)
+
+    def iter_plays(self, start=None, end=None, user=None, track=None, cursor=None,
+                   batch_size=500):
+        '''
+        yield (play, cursor) for plays ending in [start, end] (history
+        scores, see parse_play_time), oldest first, optionally only one
+        user's or one track's.  passing a yielded cursor resumes after that
+        play.  reads the narrowest index of both tiers (ZRANGEBYSCORE ...
+        LIMIT in redis, keyset pages in the archive) a batch at a time, so
+        memory stays flat however long the range is.
+
+        '''
+        if user:
+            index, value = 'user', user
+        elif track:
+            index, value = 'track', track
+        else:
+            index, value = 'time', None
+        after = decode_history_cursor(cursor) if cursor else None
+        for score, pid, json_play in self._rows(index, value, start, end, after, batch_size):
+            play = json.loads(json_play)
+            if track and play.get('trackid') != track:
                 continue
+            yield play, encode_history_cursor(score, pid)
+
+    def get_plays_page(self, start=None, end=None, user=None, track=None, cursor=None,
+                       limit=100):
+        '''
+        return (plays, next_cursor) for one page of iter_plays; next_cursor
+        is None on the last page.
 
-            if play['user'] == userid:
-                user_plays.append(play)
-        return user_plays
+        '''
+        plays = []
+        next_cursor = None
+        for play, play_cursor in self.iter_plays(start, end, user, track, cursor,
+                                                 batch_size=limit + 1):
+            if len(plays) == limit:
+                return plays, next_cursor
+            plays.append(play)
+            next_cursor = play_cursor
+        return plays, None
+
+    def get_track_plays(self, trackid):
+        return self._load_plays('track', trackid)
+
+    def get_artist_plays(self, artist):
+        return self._load_plays('artist', artist)
+
+    def _index_throwback(self, client, play):
+        '''
+        add a play to its weekday's throwback index.  only human-queued
+        spotify tracks are throwback candidates; the latest queuer wins.
 
-    def get_user_jams(self, userid):
-        all_plays = self.get_plays(self.num_plays(), True)
-        user_jams = []
-        for play in all_plays:
-            if userid in self._jams(play):
-                user_jams.append(play)
-        return user_jams
+        '''
+        trackid = play.get('trackid') or ''
+        user = play.get('user')
+        if play.get('src') != 'spotify' or not trackid.startswith('spotify:track:'):
+            return
+        if not user or user == BENDER_USER:
+            return
+        try:
+            weekday = dateutil.parser.parse(play['endtime']).weekday()
+        except (KeyError, TypeError, ValueError, OverflowError):
+            return
+        client.hset(THROWBACK_INDEX_KEY % weekday, trackid, user)
+
+    def build_throwback_index(self):
+        '''
+        backfill the throwback index from all play history, oldest first:
+        archived days as columns, then the logs not archived yet.  only
+        needed once; add_play keeps the index current afterwards.
+
+        '''
+        from play_archive import PlayArchive
+        start = datetime.now()
+        archive = PlayArchive()
+        pipe = self._db._r.pipeline(transaction=False)
+        self._index_archived_throwbacks(pipe, archive)
+        for n, play in enumerate(iter_logged_plays(archive.pending_logs()), 1):
+            self._index_throwback(pipe, play)
+            if n % _THROWBACK_BACKFILL_BATCH == 0:
+                pipe.execute()
+        pipe.execute()
+        logger.info("Throwback index backfill took %s" % (datetime.now() - start))
+
+    def _index_archived_throwbacks(self, pipe, archive):
+        '''
+        add every archived play to the throwback index without parsing the
+        logs.  same rules as _index_throwback; rows are oldest first, so
+        the latest queuer still wins.
+
+        '''
+        cols = archive.scan(columns=('endtime', 'track', 'user', 'src'))
+        dictionary = archive.dictionary()
+        is_spotify = archive.dictionary_mask('src', lambda src: src == 'spotify')
+        is_track = archive.dictionary_mask('track', lambda t: t.startswith('spotify:track:'))
+        is_human = archive.dictionary_mask('user', lambda u: u and u != BENDER_USER)
+        keep = is_spotify[cols['src']] & is_track[cols['track']] & is_human[cols['user']]
+        # endtimes are epoch seconds of the logged wall-clock time; 1970-01-01 was a Thursday
+        weekdays = (np.floor_divide(cols['endtime'], 86400).astype(np.int64) + 3) % 7
+        for weekday in range(7):
+            rows = np.flatnonzero(keep & (weekdays == weekday))
+            latest = dict(zip(cols['track'][rows].tolist(), cols['user'][rows].tolist()))
+            items = list(latest.items())
+            for i in range(0, len(items), _THROWBACK_BACKFILL_BATCH):
+                batch = items[i:i + _THROWBACK_BACKFILL_BATCH]
+                pipe.hset(THROWBACK_INDEX_KEY % weekday,
+                          mapping={dictionary['track'][t]: dictionary['user'][u] for t, u in batch})
+                pipe.execute()
+
+    def ensure_throwback_index(self):
+        '''
+        build the throwback index on first use.  the built flag is claimed
+        with SET NX so only one process scans the logs.
+
+        '''
+        if self._throwback_index_ready:
+            return
+        r = self._db._r
+        if not r.exists(THROWBACK_INDEX_BUILT_KEY):
+            if r.set(THROWBACK_INDEX_BUILT_KEY, datetime.now().isoformat(), nx=True):
+                try:
+                    self.build_throwback_index()
+                except Exception:
+                    r.delete(THROWBACK_INDEX_BUILT_KEY)
+                    raise
+        self._throwback_index_ready = True
 
     def get_throwback_plays(self, day_of_week=None, limit=50):
         """
-        Get plays from the same day of the week from historical logs.
+        Get plays from the same day of the week from the throwback index.
 
         Args:
             day_of_week: 0=Monday, 6=Sunday. If None, uses today.
             limit: Max number of tracks to return.
 
         Returns:
-            List of dicts with 'trackid' and 'user' from historical plays.
+            List of dicts with 'trackid' and 'user' from historical plays,
+            a random sample of distinct tracks.
         """
-        import os
-        import random
-
         if day_of_week is None:
             day_of_week = datetime.now().weekday()
 
-        # Find all log files for the matching day of week
-        matching_files = []
-        play_log_files = glob(CONF.LOG_DIR + '/play_log_*.json')
-
-        for log_file in play_log_files:
-            # Extract date from filename: play_log_YYYY_MM_DD.json
-            basename = os.path.basename(log_file)
-            try:
-                parts = basename.replace('play_log_', '').replace('.json', '').split('_')
-                if len(parts) == 3:
-                    year, month, day = int(parts[0]), int(parts[1]), int(parts[2])
-                    file_date = datetime(year, month, day)
-                    if file_date.weekday() == day_of_week:
-                        matching_files.append(log_file)
-            except (ValueError, IndexError):
-                continue
-
-        if not matching_files:
-            logger.info("No throwback files found for day of week %d", day_of_week)
-            return []
-
-        logger.info("Found %d throwback files for day of week %d", len(matching_files), day_of_week)
-
-        # Collect all plays from matching files
-        all_plays = []
-        for log_file in matching_files:
-            try:
-                with open(log_file, 'r') as f:
-                    for line in f:
-                        try:
-                            play = json.loads(line.strip())
-                            # Only include Spotify tracks with valid URIs
-                            if play.get('src') == 'spotify' and play.get('trackid', '').startswith('spotify:track:'):
-                                # Skip Benderbot plays for more variety
-                                if play.get('user') != 'the@echonest.com':
-                                    all_plays.append(play)
-                        except JSONDecodeError:
-                            continue
-            except IOError:
-                continue
-
-        if not all_plays:
-            logger.info("No valid throwback plays found")
-            return []
-
-        # Shuffle and deduplicate by track ID, keeping user info
-        random.shuffle(all_plays)
-        seen_tracks = set()
-        unique_plays = []
-        for play in all_plays:
-            track_id = play.get('trackid')
-            if track_id and track_id not in seen_tracks:
-                seen_tracks.add(track_id)
-                unique_plays.append({
-                    'trackid': track_id,
-                    'user': play.get('user', 'the@echonest.com')
-                })
-                if len(unique_plays) >= limit:
-                    break
-
-        logger.info("Returning %d throwback tracks", len(unique_plays))
-        return unique_plays
+        self.ensure_throwback_index()
+        sample = self._db._r.hrandfield(THROWBACK_INDEX_KEY % day_of_week, limit, withvalues=True) or []
+        throwbacks = [{'trackid': trackid, 'user': user}
+                      for trackid, user in zip(sample[::2], sample[1::2])]
+        if not throwbacks:
+            logger.info("No throwback plays indexed for day of week %d", day_of_week)
+        return throwbacks
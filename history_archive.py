@@ -0,0 +1,132 @@
+"""On-disk tier of the play history store.
+
+Redis keeps plays from the last ``HISTORY_REDIS_DAYS`` days (see
+``PlayHistory.trim_recent_history``). Older plays move here: a SQLite file
+(``HISTORY_ARCHIVE_PATH``, default ``LOG_DIR/history.sqlite3``) with the
+same indexes the Redis tier has (time, user, jammer, track, artist), each
+ordered by ``(endtime, id)`` to match Redis score/member order.
+``PlayHistory`` merges both tiers, so callers don't see the split.
+
+Reads page with keyset queries (``LIMIT`` plus a ``(endtime, id)``
+cursor), so no SQLite cursor stays open across yields.
+"""
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS plays (
+    id TEXT PRIMARY KEY,
+    endtime REAL NOT NULL,
+    user TEXT,
+    trackid TEXT,
+    artist TEXT,
+    play TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plays_by_time ON plays (endtime, id);
+CREATE INDEX IF NOT EXISTS plays_by_user ON plays (user, endtime, id);
+CREATE INDEX IF NOT EXISTS plays_by_track ON plays (trackid, endtime, id);
+CREATE INDEX IF NOT EXISTS plays_by_artist ON plays (artist, endtime, id);
+CREATE TABLE IF NOT EXISTS jams (
+    user TEXT NOT NULL,
+    endtime REAL NOT NULL,
+    play_id TEXT NOT NULL,
+    PRIMARY KEY (user, endtime, play_id)
+) WITHOUT ROWID;
+'''
+
+# index name -> (FROM clause, column filtered by value, endtime column, id column)
+_INDEXES = {
+    'time': ('plays p', None, 'p.endtime', 'p.id'),
+    'user': ('plays p', 'p.user', 'p.endtime', 'p.id'),
+    'track': ('plays p', 'p.trackid', 'p.endtime', 'p.id'),
+    'artist': ('plays p', 'p.artist', 'p.endtime', 'p.id'),
+    'jammer': ('jams j JOIN plays p ON p.id = j.play_id', 'j.user', 'j.endtime', 'j.play_id'),
+}
+
+
+class HistoryArchive(object):
+    """SQLite store of archived plays. Missing files read as empty."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+
+    def _connect(self, create=False):
+        if self._conn is None:
+            if self.path != ':memory:' and not os.path.exists(self.path) and not create:
+                return None
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def add_plays(self, entries, jammers):
+        """Insert (id, endtime, play, json) entries; *jammers(play)* lists a
+        play's jammers. Returns the ids that weren't already archived."""
+        if not entries:
+            return set()
+        conn = self._connect(create=True)
+        added = set()
+        with conn:
+            for pid, endtime, play, json_play in entries:
+                cur = conn.execute(
+                    'INSERT OR IGNORE INTO plays (id, endtime, user, trackid, artist, play) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (pid, endtime, play.get('user'), play.get('trackid'), play.get('artist'), json_play))
+                if cur.rowcount:
+                    added.add(pid)
+                    conn.executemany('INSERT OR IGNORE INTO jams (user, endtime, play_id) VALUES (?, ?, ?)',
+                                     [(jammer, endtime, pid) for jammer in set(jammers(play))])
+        return added
+
+    def rows(self, index, value=None, low=None, high=None, after=None, batch_size=500):
+        """Yield (endtime, id, json) in (endtime, id) order for one index.
+
+        *after* is an (endtime, id) cursor; rows at or before it are skipped.
+        """
+        conn = self._connect()
+        if conn is None:
+            return
+        table, column, endtime, pid = _INDEXES[index]
+        while True:
+            where, params = [], []
+            if column:
+                where.append('%s = ?' % column)
+                params.append(value)
+            if high is not None:
+                where.append('%s <= ?' % endtime)
+                params.append(high)
+            if after is not None:
+                where.append('(%s > ? OR (%s = ? AND %s > ?))' % (endtime, endtime, pid))
+                params.extend([after[0], after[0], after[1]])
+            elif low is not None:
+                where.append('%s >= ?' % endtime)
+                params.append(low)
+            sql = 'SELECT %s, %s, p.play FROM %s%s ORDER BY %s, %s LIMIT ?' % (
+                endtime, pid, table, ' WHERE ' + ' AND '.join(where) if where else '',
+                endtime, pid)
+            rows = conn.execute(sql, params + [batch_size]).fetchall()
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][:2]
+
+    def count(self):
+        conn = self._connect()
+        if conn is None:
+            return 0
+        return conn.execute('SELECT count(*) FROM plays').fetchone()[0]
+
+    def rows_at(self, offset, limit):
+        """(endtime, id, json) rows at positions offset.. in time order."""
+        conn = self._connect()
+        if conn is None or limit <= 0:
+            return []
+        return conn.execute('SELECT endtime, id, play FROM plays ORDER BY endtime, id LIMIT ? OFFSET ?',
+                            (limit, max(offset, 0))).fetchall()
@@ -7,8 +7,15 @@ import time
 
 import gevent
 
-from db import DB
-from nests import NestManager, should_delete_nest, count_active_members
+import analytics
+import bender_pools
+import metrics
+import recommender
+from config import CONF
+from db import DB, warm_seed_cache
+from history import PlayHistory
+from nests import NestManager, should_delete_nest, count_active_members, metadata_cache
+from play_archive import PlayArchive
 
 logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -32,7 +39,7 @@ def master_player_tick_all(nest_manager=None, poll_interval=5):
 
     while True:
         try:
-            current_nests = {nid for nid, _ in nest_manager.list_nests()}
+            current_nests = set(nest_manager.nest_ids())
 
             # Spawn for new nests
             for nid in current_nests - set(active_greenlets):
@@ -64,7 +71,8 @@ def _run_nest_player(nest_id):
     """Run the master_player loop for a single nest."""
     logger.info("Starting master player for nest: %s", nest_id)
     try:
-        d = DB(nest_id=nest_id)
+        # Play history is loaded once by main(), not per nest greenlet
+        d = DB(init_history_to_redis=False, nest_id=nest_id)
         d.master_player()
     except Exception:
         logger.exception("master_player crashed for nest %s", nest_id)
@@ -86,7 +94,8 @@ def nest_cleanup_loop(nest_manager=None, interval_seconds=60):
 
     while True:
         try:
-            nests = nest_manager.list_nests()
+            # Only nests idle past the default timeout are candidates
+            nests = nest_manager.inactive_nests(getattr(CONF, 'NEST_MAX_INACTIVE_MINUTES', 5))
             now = datetime.datetime.now()
 
             for nest_id, metadata in nests:
@@ -116,20 +125,136 @@ def nest_cleanup_loop(nest_manager=None, interval_seconds=60):
         time.sleep(interval_seconds)
 
 
+def seed_cache_warm_loop(nest_manager=None, interval_seconds=600):
+    """Keep the shared seed cache warm for every themed nest seed.
+
+    New themed nests then start Bender without any seed API calls. Seeds
+    the Spotify budget can't cover yet are picked up on a later pass.
+    """
+    if nest_manager is None:
+        nest_manager = NestManager()
+
+    while True:
+        try:
+            warm_seed_cache(nest_manager._r)
+        except Exception:
+            logger.exception("Error warming shared seed cache")
+
+        gevent.sleep(interval_seconds)
+
+
+def bender_pool_warm_loop(nest_manager=None, interval_seconds=120):
+    """Keep a warm pool of candidate tracks for every themed nest seed."""
+    if nest_manager is None:
+        nest_manager = NestManager()
+
+    while True:
+        try:
+            bender_pools.warm_pools(nest_manager._r)
+        except Exception:
+            logger.exception("Error warming themed Bender pools")
+
+        gevent.sleep(interval_seconds)
+
+
+def recommender_build_loop(interval_seconds=None):
+    """Rebuild the offline Bender recommender when the play logs change.
+
+    The build parses the logs, so it runs in gevent's threadpool; fills
+    only ever read the last built model.
+    """
+    interval_seconds = interval_seconds or getattr(CONF, 'BENDER_OFFLINE_REFRESH_SECONDS', None) or 3600
+    while True:
+        try:
+            gevent.get_hub().threadpool.apply(recommender.refresh_recommender)
+        except Exception:
+            logger.exception("Error building offline recommender")
+
+        gevent.sleep(interval_seconds)
+
+
+def play_archive_loop(interval_seconds=3600):
+    """Compact closed (or since changed) play-log days into the columnar archive.
+
+    Runs in gevent's threadpool so a long first compaction doesn't stall
+    the nest players.
+    """
+    archive = PlayArchive()
+    while True:
+        try:
+            gevent.get_hub().threadpool.apply(archive.compact_closed_days)
+        except Exception:
+            logger.exception("Error compacting play logs")
+
+        gevent.sleep(interval_seconds)
+
+
+def load_play_history(nest_manager=None):
+    """Ingest play-log lines added since the last load into the history store, once."""
+    if nest_manager is None:
+        nest_manager = NestManager()
+    try:
+        PlayHistory(DB(init_history_to_redis=False, redis_client=nest_manager._r)).init_history()
+    except Exception:
+        logger.exception("Error loading play history")
+
+
+def history_trim_loop(nest_manager=None, interval_seconds=3600):
+    """Move plays older than HISTORY_REDIS_DAYS from Redis to the on-disk archive."""
+    if nest_manager is None:
+        nest_manager = NestManager()
+    historian = PlayHistory(DB(init_history_to_redis=False, redis_client=nest_manager._r))
+
+    while True:
+        try:
+            historian.trim_recent_history()
+        except Exception:
+            logger.exception("Error trimming Redis play history")
+
+        gevent.sleep(interval_seconds)
+
+
+def analytics_rollup_loop(nest_manager=None, interval_seconds=3600):
+    """Roll up closed weeks and months of analytics counters (and fold old user sets into HLLs)."""
+    if nest_manager is None:
+        nest_manager = NestManager()
+
+    while True:
+        try:
+            analytics.migrate_user_sets(nest_manager._r)
+            analytics.rollup(nest_manager._r)
+        except Exception:
+            logger.exception("Error rolling up analytics")
+
+        gevent.sleep(interval_seconds)
+
+
 def main():
     """Start the master player for all nests with a cleanup worker."""
     try:
         nm = NestManager()
     except Exception:
         logger.exception("Failed to initialize NestManager, falling back to single-nest mode")
-        d = DB()
+        d = DB(init_history_to_redis=False)
+        d.get_historian().init_history()
         d.master_player()
         return
 
-    # Both loops run forever — run them as concurrent greenlets
+    # Player greenlets read nest metadata (seed, genre hint) from the cache
+    metadata_cache.start_listener(nm._r)
+    metrics.start(nm._r)
+
+    # All loops run forever — run them as concurrent greenlets
     greenlets = [
+        gevent.spawn(load_play_history, nest_manager=nm),
         gevent.spawn(master_player_tick_all, nest_manager=nm),
         gevent.spawn(nest_cleanup_loop, nest_manager=nm, interval_seconds=60),
+        gevent.spawn(seed_cache_warm_loop, nest_manager=nm),
+        gevent.spawn(bender_pool_warm_loop, nest_manager=nm),
+        gevent.spawn(recommender_build_loop),
+        gevent.spawn(play_archive_loop),
+        gevent.spawn(history_trim_loop, nest_manager=nm),
+        gevent.spawn(analytics_rollup_loop, nest_manager=nm),
     ]
     gevent.joinall(greenlets)
 
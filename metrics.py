@@ -0,0 +1,175 @@
+"""Latency and throughput metrics, exposed at /metrics in Prometheus text format.
+
+Every process (gunicorn workers, the master player) records into a local
+registry: counters with ``inc`` and histograms with ``observe`` / ``timed``.
+``start()`` runs a greenlet that adds the local deltas to one Redis hash
+(``METRICS|series``, HINCRBYFLOAT) every ``METRICS_FLUSH_INTERVAL`` seconds
+(default 5), and again at exit. So ``render`` shows totals across all
+workers, whichever worker serves the scrape. Gauges such as per-nest
+listener counts are read at scrape time instead. The hash never expires,
+so counter and histogram labels must have a fixed set of values: no nest
+codes, users or track ids.
+
+Histograms use cumulative ``le`` buckets, as Prometheus expects, so rates
+and quantiles come from ``rate()`` / ``histogram_quantile()``.
+"""
+import atexit
+import collections
+import contextlib
+import functools
+import json
+import logging
+import time
+
+import gevent
+
+from config import CONF
+from redis_trace import make_redis
+
+logger = logging.getLogger(__name__)
+
+_SERIES_KEY = 'METRICS|series'
+_TYPES_KEY = 'METRICS|types'
+_DEFAULT_FLUSH_INTERVAL = 5.0
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+# Slower operations get wider buckets
+BUCKETS = {
+    'echonest_player_transition_seconds': (.05, .1, .25, .5, 1, 2, 5, 10, 30, 60),
+    'echonest_spotify_request_seconds': (.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+}
+
+_pending = collections.Counter()     # series field -> delta since the last flush
+_types = {}                          # family -> 'counter' | 'histogram'
+_flusher = None
+
+
+def _field(family, suffix, labels, le=None):
+    items = sorted((k, str(v)) for k, v in labels.items())
+    if le is not None:
+        items.append(('le', le))
+    return json.dumps([family, suffix, items])
+
+
+def inc(name, value=1, **labels):
+    """Add *value* to the counter *name* (a ``_total`` suffix is appended)."""
+    _types[name] = 'counter'
+    _pending[_field(name, '_total', labels)] += value
+
+
+def observe(name, value, **labels):
+    """Record one observation (normally seconds) in the histogram *name*."""
+    _types[name] = 'histogram'
+    for bound in BUCKETS.get(name, DEFAULT_BUCKETS):
+        # Empty buckets are written too, so every series has every bucket
+        _pending[_field(name, '_bucket', labels, repr(float(bound)))] += int(value <= bound)
+    _pending[_field(name, '_bucket', labels, '+Inf')] += 1
+    _pending[_field(name, '_sum', labels)] += value
+    _pending[_field(name, '_count', labels)] += 1
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """Observe the duration of the ``with`` block, even if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timed(name, **labels):
+    """Decorator form of ``timer``."""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def flush(r=None):
+    """Add everything recorded since the last flush to the shared totals."""
+    global _pending
+    if not _pending:
+        return 0
+    batch, _pending = _pending, collections.Counter()
+    try:
+        pipe = (r or make_redis()).pipeline(transaction=False)
+        pipe.hset(_TYPES_KEY, mapping=dict(_types))
+        for field, value in batch.items():
+            pipe.hincrbyfloat(_SERIES_KEY, field, value)
+        pipe.execute()
+    except Exception as e:
+        # Keep the deltas for the next flush
+        _pending.update(batch)
+        logger.warning("metrics flush failed, %d series kept for retry: %s", len(batch), e)
+        return 0
+    return len(batch)
+
+
+def _flush_loop(r, interval):
+    while True:
+        gevent.sleep(interval)
+        flush(r)
+
+
+def start(r=None):
+    """Start this process's flusher (once)."""
+    global _flusher
+    if _flusher is None:
+        r = r or make_redis()
+        interval = getattr(CONF, 'METRICS_FLUSH_INTERVAL', None) or _DEFAULT_FLUSH_INTERVAL
+        _flusher = gevent.spawn(_flush_loop, r, interval)
+        atexit.register(flush, r)
+    return _flusher
+
+
+_SUFFIX_ORDER = {'_bucket': 0, '_sum': 1, '_count': 2, '_total': 0}
+
+
+def _format_labels(items):
+    if not items:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, v.replace('\\', '\\\\').replace('"', '\\"'))
+                             for k, v in items)
+
+
+def _format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render(r, gauges=()):
+    """Prometheus text exposition of the shared totals plus *gauges*.
+
+    *gauges* is an iterable of (family, labels dict, value), read by the
+    caller at scrape time.
+    """
+    pipe = r.pipeline(transaction=False)
+    pipe.hgetall(_TYPES_KEY)
+    pipe.hgetall(_SERIES_KEY)
+    types, raw = pipe.execute()
+
+    families = collections.defaultdict(list)
+    for field, value in raw.items():
+        try:
+            family, suffix, items = json.loads(field)
+        except ValueError:
+            continue
+        labels = [tuple(item) for item in items if item[0] != 'le']
+        le = [float(v) for k, v in items if k == 'le']
+        families[family].append(((labels, _SUFFIX_ORDER.get(suffix, 3), le),
+                                 family + suffix, [tuple(item) for item in items], value))
+    for family, labels, value in gauges:
+        types[family] = 'gauge'
+        families[family].append(((sorted(labels.items()), 0, []), family,
+                                 sorted((k, str(v)) for k, v in labels.items()), value))
+
+    lines = []
+    for family in sorted(families):
+        lines.append('# TYPE %s %s' % (family, types.get(family, 'untyped')))
+        for _, name, items, value in sorted(families[family], key=lambda series: series[0]):
+            lines.append('%s%s %s' % (name, _format_labels(items), _format_value(value)))
+    return '\n'.join(lines) + '\n'
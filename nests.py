@@ -3,15 +3,19 @@
 This module provides helper functions for nest key generation, membership
 tracking, and cleanup logic, plus the NestManager class for CRUD operations.
 """
+import collections
 import datetime
 import json
 import logging
 import os
 import random
+import time
 
+import gevent
 import redis
 
 from config import CONF
+from redis_trace import make_redis
 
 logger = logging.getLogger(__name__)
 
@@ -155,6 +159,11 @@ def members_key(nest_id):
     return f"NEST:{nest_id}|MEMBERS"
 
 
+def now_playing_summary_key(nest_id):
+    """Return the Redis key for a nest's now-playing summary (title, artist) hash."""
+    return f"NEST:{nest_id}|MISC|now-playing-summary"
+
+
 def member_key(nest_id, email):
     """Return the Redis key for an individual member's heartbeat TTL."""
     return f"NEST:{nest_id}|MEMBER:{email}"
@@ -247,8 +256,19 @@ def should_delete_nest(metadata, members, queue_size, now):
 # NestManager class
 # ---------------------------------------------------------------------------
 
-# Global registry key (NOT nest-scoped)
+# Global registry keys (NOT nest-scoped). Each nest has a metadata hash with
+# one JSON-encoded value per field, so updates touch only their fields, and
+# a score in the activity sorted set (nest_id -> last activity, epoch
+# seconds), which doubles as the index of registered nests.
+_ACTIVITY_KEY = 'NESTS|activity'
+# Before the split, all metadata was one JSON blob per nest in this hash
 _REGISTRY_KEY = 'NESTS|registry'
+_MIGRATION_LOCK_KEY = 'NESTS|migrating'
+
+
+def _meta_key(nest_id):
+    """Return the Redis key for a nest's metadata hash (global, NOT nest-scoped)."""
+    return f'NESTS|meta:{nest_id}'
 
 
 def _code_key(code):
@@ -261,6 +281,132 @@ def _slug_key(slug):
     return f'NESTS|slug:{slug}'
 
 
+def _encode_meta(meta):
+    """Metadata dict -> hash fields. last_activity lives in the activity set."""
+    return {k: json.dumps(v) for k, v in meta.items() if k != 'last_activity'}
+
+
+def _decode_meta(fields, last_activity):
+    """Hash fields plus activity score -> metadata dict, or None if missing."""
+    if not fields:
+        return None
+    meta = {}
+    for k, v in fields.items():
+        try:
+            meta[k] = json.loads(v)
+        except (json.JSONDecodeError, TypeError):
+            meta[k] = v
+    if last_activity is not None:
+        meta['last_activity'] = datetime.datetime.fromtimestamp(last_activity).isoformat()
+    return meta
+
+
+def _read_nests(redis_client, nest_ids):
+    """[(nest_id, metadata)] for nests that exist, in one round trip."""
+    if not nest_ids:
+        return []
+    pipe = redis_client.pipeline(transaction=False)
+    for nest_id in nest_ids:
+        pipe.hgetall(_meta_key(nest_id))
+        pipe.zscore(_ACTIVITY_KEY, nest_id)
+    results = pipe.execute()
+    nests = []
+    for i, nest_id in enumerate(nest_ids):
+        meta = _decode_meta(results[2 * i], results[2 * i + 1])
+        if meta is not None:
+            nests.append((nest_id, meta))
+    return nests
+
+
+# Resolves a nest_id, code, or slug server side in one round trip. Replies
+# {nest_id, metadata hash fields, activity score}, or nil if not found.
+# KEYS: meta, code and slug keys for the lookup value, then the activity set.
+# ARGV: the lookup value and the metadata key prefix, for the one key a code
+# or slug points at (it can't be declared before the GET).
+_RESOLVE_LUA = """
+local function read(meta_key, nest_id)
+    local fields = redis.call('HGETALL', meta_key)
+    if #fields == 0 then
+        return nil
+    end
+    return {nest_id, fields, redis.call('ZSCORE', KEYS[4], nest_id)}
+end
+local found = read(KEYS[1], ARGV[1])
+if found then
+    return found
+end
+for i = 2, 3 do
+    local nest_id = redis.call('GET', KEYS[i])
+    if nest_id then
+        found = read(ARGV[2] .. nest_id, nest_id)
+        if found then
+            return found
+        end
+    end
+end
+return nil
+"""
+
+# redis target -> registered Script, or None where scripting is unavailable
+_resolve_scripts = {}
+
+
+def _scripting_unavailable(error):
+    """True if *error* means this server will never run the resolve script."""
+    return (isinstance(error, redis.exceptions.NoPermissionError)
+            or 'unknown command' in str(error).lower())
+
+
+def _resolve_with_script(redis_client, nest_id):
+    """Resolve via _RESOLVE_LUA. Raises LookupError if the server can't run it."""
+    target = _redis_target(redis_client)
+    if target not in _resolve_scripts:
+        _resolve_scripts[target] = redis_client.register_script(_RESOLVE_LUA)
+    script = _resolve_scripts[target]
+    if script is None:
+        raise LookupError(nest_id)
+    try:
+        reply = script(keys=[_meta_key(nest_id), _code_key(nest_id), _slug_key(nest_id), _ACTIVITY_KEY],
+                       args=[nest_id, _meta_key('')], client=redis_client)
+    except redis.ResponseError as e:
+        if _scripting_unavailable(e):
+            # EVAL disabled (managed Redis, ACLs) or unsupported (fakeredis without Lua)
+            logger.warning("Nest resolve script unavailable, using pipelined lookups: %s", e)
+            _resolve_scripts[target] = None
+        else:
+            logger.warning("Nest resolve script failed, using pipelined lookups: %s", e)
+        raise LookupError(nest_id)
+    if not reply:
+        return None
+    fields = reply[1]
+    score = reply[2] if len(reply) > 2 else None
+    return _decode_meta(dict(zip(fields[::2], fields[1::2])),
+                        float(score) if score is not None else None)
+
+
+def _resolve_with_pipeline(redis_client, nest_id):
+    """Resolve in one round trip by nest_id, two by code or slug."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(_meta_key(nest_id))
+    pipe.zscore(_ACTIVITY_KEY, nest_id)
+    pipe.get(_code_key(nest_id))
+    pipe.get(_slug_key(nest_id))
+    fields, score, by_code, by_slug = pipe.execute()
+    meta = _decode_meta(fields, score)
+    if meta is not None:
+        return meta
+    found = _read_nests(redis_client, [i for i in (by_code, by_slug) if i])
+    return found[0][1] if found else None
+
+
+def _lookup_nest(redis_client, nest_id):
+    """Read nest metadata by nest_id, code, or slug straight from the registry."""
+    try:
+        return _resolve_with_script(redis_client, nest_id)
+    except LookupError:
+        return _resolve_with_pipeline(redis_client, nest_id)
+
+
 def slugify(name):
     """Convert a nest name to a URL-safe slug.
 
@@ -276,8 +422,9 @@ def slugify(name):
 class NestManager:
     """Manages nest lifecycle: create, read, update, delete.
 
-    Uses Redis hash at NESTS|registry for nest metadata and
-    NESTS|code:{code} for code-to-nest_id lookup.
+    Uses a Redis hash per nest at NESTS|meta:{nest_id} for metadata, the
+    NESTS|activity sorted set for last activity, and NESTS|code:{code} for
+    code-to-nest_id lookup.
     """
 
     def __init__(self, redis_client=None):
@@ -287,17 +434,48 @@ class NestManager:
             redis_host = os.environ.get('REDIS_HOST', 'localhost')
             redis_port = int(os.environ.get('REDIS_PORT', 6379))
             redis_password = os.environ.get('REDIS_PASSWORD') or None
-            self._r = redis.StrictRedis(
-                host=redis_host, port=redis_port,
-                password=redis_password, decode_responses=True
-            )
+            self._r = make_redis(host=redis_host, port=redis_port, password=redis_password)
+        self._migrate_registry()
         # Ensure main nest exists in registry
         self._ensure_main_nest()
 
+    def _migrate_registry(self):
+        """Split legacy NESTS|registry JSON blobs into metadata hashes and activity scores."""
+        if not self._r.exists(_REGISTRY_KEY):
+            return
+        if not self._r.set(_MIGRATION_LOCK_KEY, '1', nx=True, ex=60):
+            return
+        try:
+            legacy = self._r.hgetall(_REGISTRY_KEY)
+            pipe = self._r.pipeline(transaction=False)
+            migrated = []
+            for nest_id, raw_meta in legacy.items():
+                try:
+                    meta = json.loads(raw_meta)
+                except (json.JSONDecodeError, TypeError):
+                    meta = None
+                if not isinstance(meta, dict):
+                    # Left in the legacy hash rather than silently dropped
+                    logger.warning("Unreadable metadata for nest %s, not migrated", nest_id)
+                    continue
+                try:
+                    last_activity = datetime.datetime.fromisoformat(meta['last_activity']).timestamp()
+                except (TypeError, KeyError, ValueError):
+                    # Count the nest as active now; the cleanup loop ages it out normally
+                    last_activity = time.time()
+                pipe.hset(_meta_key(nest_id), mapping=_encode_meta(meta))
+                pipe.zadd(_ACTIVITY_KEY, {nest_id: last_activity}, nx=True)
+                migrated.append(nest_id)
+            if migrated:
+                pipe.hdel(_REGISTRY_KEY, *migrated)
+            pipe.execute()
+            logger.info("Migrated %d nests out of %s", len(migrated), _REGISTRY_KEY)
+        finally:
+            self._r.delete(_MIGRATION_LOCK_KEY)
+
     def _ensure_main_nest(self):
         """Initialize the main nest in the registry if not present."""
-        existing = self._r.hget(_REGISTRY_KEY, 'main')
-        if not existing:
+        if not self._r.exists(_meta_key('main')):
             metadata = {
                 'nest_id': 'main',
                 'code': 'main',
@@ -308,7 +486,11 @@ class NestManager:
                 'last_activity': datetime.datetime.now().isoformat(),
                 'ttl_minutes': 0,  # Never expires
             }
-            self._r.hset(_REGISTRY_KEY, 'main', json.dumps(metadata))
+            pipe = self._r.pipeline(transaction=False)
+            pipe.hset(_meta_key('main'), mapping=_encode_meta(metadata))
+            pipe.zadd(_ACTIVITY_KEY, {'main': time.time()}, nx=True)
+            pipe.execute()
+            self._invalidate('main')
 
     def generate_code(self, length=5):
         """Generate a unique 5-character nest code.
@@ -327,12 +509,14 @@ class NestManager:
 
         If all names are taken, appends a numeric suffix to a random pick.
         """
-        all_data = self._r.hgetall(_REGISTRY_KEY)
+        nest_ids = self.nest_ids()
+        pipe = self._r.pipeline(transaction=False)
+        for nest_id in nest_ids:
+            pipe.hget(_meta_key(nest_id), 'name')
         used_names = set()
-        for raw_meta in all_data.values():
+        for raw_name in pipe.execute() if nest_ids else []:
             try:
-                meta = json.loads(raw_meta)
-                used_names.add(meta.get('name'))
+                used_names.add(json.loads(raw_name))
             except (json.JSONDecodeError, TypeError):
                 continue
 
@@ -350,24 +534,21 @@ class NestManager:
     def _resolve_track_seed(self, seed_track):
         """Resolve a Spotify track URI to (seed_uri, genre_hint).
 
-        Fetches track and artist metadata from Spotify to extract the
-        primary genre. Returns (seed_track, genre) or (seed_track, None)
-        if no genres found or on API error.
+        Uses the shared seed cache, so themed or previously used seeds cost
+        no Spotify calls. Returns (seed_track, genre) or (seed_track, None)
+        if no genres found, over budget, or on API error.
         """
-        from db import spotify_client
+        from db import get_seed_info
+        from spotify_budget import PRIORITY_INTERACTIVE
         try:
-            track_id = seed_track.split(':')[-1]
-            track_data = spotify_client.track(track_id)
-            artists = track_data.get('artists', [])
-            if not artists:
-                return (seed_track, None)
-            artist_id = artists[0]['id']
-            artist_data = spotify_client.artist(artist_id)
-            genres = artist_data.get('genres', [])
-            return (seed_track, genres[0]) if genres else (seed_track, None)
+            info = get_seed_info(self._r, seed_track, PRIORITY_INTERACTIVE)
         except Exception:
+            info = None
+        if info is None:
             logger.warning("Failed to resolve seed track %s, storing URI only", seed_track)
             return (seed_track, None)
+        genres = info.get('genres') or []
+        return (seed_track, genres[0]) if genres else (seed_track, None)
 
     def create_nest(self, creator_email, name=None, seed_track=None):
         """Create a new nest.
@@ -414,13 +595,16 @@ class NestManager:
         if slug:
             metadata['slug'] = slug
 
-        # Store in registry hash (nest_id -> JSON metadata)
-        self._r.hset(_REGISTRY_KEY, nest_id, json.dumps(metadata))
+        pipe = self._r.pipeline(transaction=False)
+        pipe.hset(_meta_key(nest_id), mapping=_encode_meta(metadata))
+        pipe.zadd(_ACTIVITY_KEY, {nest_id: time.time()})
         # Store code lookup (code -> nest_id)
-        self._r.set(_code_key(code), nest_id)
+        pipe.set(_code_key(code), nest_id)
         # Store slug lookup (slug -> nest_id) if we have one
         if slug:
-            self._r.set(_slug_key(slug), nest_id)
+            pipe.set(_slug_key(slug), nest_id)
+        pipe.execute()
+        self._invalidate(nest_id)
 
         return metadata
 
@@ -429,44 +613,104 @@ class NestManager:
 
         Returns dict or None if not found.
         """
-        raw = self._r.hget(_REGISTRY_KEY, nest_id)
-        if raw:
-            return json.loads(raw)
-
-        # Try looking up by code
-        looked_up_id = self._r.get(_code_key(nest_id))
-        if looked_up_id:
-            raw = self._r.hget(_REGISTRY_KEY, looked_up_id)
-            if raw:
-                return json.loads(raw)
-
-        # Try looking up by slug
-        looked_up_id = self._r.get(_slug_key(nest_id))
-        if looked_up_id:
-            raw = self._r.hget(_REGISTRY_KEY, looked_up_id)
-            if raw:
-                return json.loads(raw)
+        return _lookup_nest(self._r, nest_id)
 
-        return None
+    def update_nest(self, nest_id, updates):
+        """Write only the fields in *updates* to a nest's metadata.
+
+        Returns the updated metadata dict, or None if the nest doesn't exist.
+        """
+        key = _meta_key(nest_id)
+        fields = _encode_meta(updates)
+        with self._r.pipeline() as pipe:
+            while True:
+                try:
+                    # Don't resurrect a nest deleted meanwhile
+                    pipe.watch(key)
+                    if not pipe.exists(key):
+                        return None
+                    pipe.multi()
+                    if fields:
+                        pipe.hset(key, mapping=fields)
+                    if 'last_activity' in updates:
+                        last_activity = datetime.datetime.fromisoformat(updates['last_activity'])
+                        pipe.zadd(_ACTIVITY_KEY, {nest_id: last_activity.timestamp()}, xx=True)
+                    pipe.execute()
+                    break
+                except redis.WatchError:
+                    continue
+        self._invalidate(nest_id)
+        return _lookup_nest(self._r, nest_id)
+
+    def nest_ids(self):
+        """IDs of all registered nests."""
+        return self._r.zrange(_ACTIVITY_KEY, 0, -1)
+
+    def inactive_nests(self, idle_minutes):
+        """[(nest_id, metadata)] for nests idle at least *idle_minutes*.
+
+        One ZRANGEBYSCORE on the activity set, then one metadata pipeline.
+        """
+        cutoff = time.time() - idle_minutes * 60
+        return _read_nests(self._r, self._r.zrangebyscore(_ACTIVITY_KEY, '-inf', cutoff))
 
     def list_nests(self):
         """List all registered nests.
 
         Returns list of (nest_id, metadata_dict) tuples.
         """
-        all_data = self._r.hgetall(_REGISTRY_KEY)
-        result = []
-        for nest_id, raw_meta in all_data.items():
-            try:
-                meta = json.loads(raw_meta)
-                # Add member count
-                mkey = members_key(nest_id)
-                meta['member_count'] = self._r.scard(mkey)
-                result.append((nest_id, meta))
-            except (json.JSONDecodeError, TypeError):
-                logger.warning("Invalid metadata for nest %s", nest_id)
-                continue
-        return result
+        return self.page_nests()[1]
+
+    def page_nests(self, offset=0, limit=None, query=None, with_summary=False):
+        """One page of registered nests, main first, then most recently active.
+
+        *query* keeps nests whose name, code or slug contains it (case
+        insensitive). Each metadata dict gets 'member_count'; with
+        *with_summary*, also 'queue_size' and 'now_playing' ({title, artist}
+        or None, from the summary the player keeps). Two round trips: the
+        activity index, then one pipeline for the page's metadata and
+        counts (a *query* needs every nest's metadata, so one more).
+
+        Returns (total matching nests, [(nest_id, metadata_dict), ...]).
+        """
+        nest_ids = self._r.zrevrange(_ACTIVITY_KEY, 0, -1)
+        if 'main' in nest_ids:
+            nest_ids.remove('main')
+            nest_ids.insert(0, 'main')
+        if query:
+            needle = query.lower()
+            entries = [(nest_id, meta) for nest_id, meta in _read_nests(self._r, nest_ids)
+                       if any(needle in str(meta.get(field) or '').lower()
+                              for field in ('name', 'code', 'slug'))]
+            nest_ids = [nest_id for nest_id, _ in entries]
+        total = len(nest_ids)
+        page_ids = nest_ids[offset:offset + limit if limit is not None else None]
+
+        pipe = self._r.pipeline(transaction=False)
+        for nest_id in page_ids:
+            pipe.hgetall(_meta_key(nest_id))
+            pipe.zscore(_ACTIVITY_KEY, nest_id)
+            pipe.scard(members_key(nest_id))
+            if with_summary:
+                pipe.zcard(f"{_nest_prefix(nest_id)}MISC|priority-queue")
+                pipe.hgetall(now_playing_summary_key(nest_id))
+        results = iter(pipe.execute() if page_ids else [])
+        page = []
+        for nest_id in page_ids:
+            meta = _decode_meta(next(results), next(results))
+            member_count = next(results)
+            if with_summary:
+                queue_size, summary = next(results), next(results)
+            if meta is None:
+                continue  # deleted since the index was read
+            meta['member_count'] = member_count
+            if with_summary:
+                meta['queue_size'] = queue_size
+                meta['now_playing'] = ({'title': summary.get('title', ''),
+                                        'artist': summary.get('artist', '')}
+                                       if summary.get('title') else None)
+            page.append((nest_id, meta))
+        return total, page
 
     def delete_nest(self, nest_id):
         """Delete a nest and all its Redis keys.
@@ -485,20 +729,19 @@ class NestManager:
         self._r.setex(deleting_key(nest_id), 30, "1")
 
         # Get metadata to find the code and slug
-        raw = self._r.hget(_REGISTRY_KEY, nest_id)
-        if raw:
-            try:
-                meta = json.loads(raw)
-                code = meta.get('code', nest_id)
-                self._r.delete(_code_key(code))
-                slug = meta.get('slug')
-                if slug:
-                    self._r.delete(_slug_key(slug))
-            except (json.JSONDecodeError, TypeError):
-                pass
+        found = _read_nests(self._r, [nest_id])
+        if found:
+            meta = found[0][1]
+            self._r.delete(_code_key(meta.get('code', nest_id)))
+            slug = meta.get('slug')
+            if slug:
+                self._r.delete(_slug_key(slug))
 
         # Remove from registry
-        self._r.hdel(_REGISTRY_KEY, nest_id)
+        pipe = self._r.pipeline(transaction=False)
+        pipe.delete(_meta_key(nest_id))
+        pipe.zrem(_ACTIVITY_KEY, nest_id)
+        pipe.execute()
 
         # SCAN and unlink all NEST:{nest_id}|* keys (non-blocking)
         prefix = _nest_prefix(nest_id)
@@ -512,17 +755,11 @@ class NestManager:
 
         # Clean up the DELETING flag itself
         self._r.delete(deleting_key(nest_id))
+        self._invalidate(nest_id)
 
     def touch_nest(self, nest_id):
-        """Update the last_activity timestamp for a nest."""
-        raw = self._r.hget(_REGISTRY_KEY, nest_id)
-        if raw:
-            try:
-                meta = json.loads(raw)
-                meta['last_activity'] = datetime.datetime.now().isoformat()
-                self._r.hset(_REGISTRY_KEY, nest_id, json.dumps(meta))
-            except (json.JSONDecodeError, TypeError):
-                pass
+        """Update the last_activity timestamp for a registered nest."""
+        self._r.zadd(_ACTIVITY_KEY, {nest_id: time.time()}, xx=True)
 
     def join_nest(self, nest_id, email):
         """Add a member to a nest's MEMBERS set and broadcast update."""
@@ -540,6 +777,14 @@ class NestManager:
         self._r.delete(mk)
         self._broadcast_member_update(nest_id)
 
+    def _invalidate(self, nest_id):
+        """Drop cached metadata here and tell other processes to do the same."""
+        metadata_cache.invalidate(nest_id)
+        try:
+            self._r.publish(INVALIDATE_CHANNEL, nest_id)
+        except redis.RedisError:
+            logger.warning("Failed to publish nest invalidation for %s", nest_id)
+
     def _broadcast_member_update(self, nest_id):
         """Publish member_update event with current count on the nest's pubsub channel."""
         try:
@@ -551,6 +796,101 @@ class NestManager:
             logger.exception("Failed to broadcast member_update for nest %s", nest_id)
 
 
+# ---------------------------------------------------------------------------
+# In-process nest metadata cache
+# ---------------------------------------------------------------------------
+
+# Published (payload: nest_id) whenever a registry entry changes
+INVALIDATE_CHANNEL = 'NESTS|invalidate'
+
+# Upper bound on staleness if an invalidation message is missed
+_METADATA_CACHE_TTL = 30
+# Lookups kept per process; misses (unknown vanity paths) count too
+_METADATA_CACHE_SIZE = 256
+
+
+def _redis_target(redis_client):
+    """Identify the Redis server behind a client, so clients to one server share entries."""
+    kwargs = redis_client.connection_pool.connection_kwargs
+    return kwargs.get('host'), kwargs.get('port'), kwargs.get('db')
+
+
+class NestMetadataCache(object):
+    """Per-process, versioned view of nest metadata for hot read paths.
+
+    Lookups (by nest_id, code, or slug) are kept in an LRU of *size*
+    entries for a short TTL. Any
+    registry change clears the whole cache and bumps its version: locally
+    via NestManager, and in other processes via NESTS|invalidate, which
+    start_listener() subscribes to. A lookup that races an invalidation
+    is returned but not stored.
+    """
+
+    def __init__(self, ttl=None, clock=time.time, size=None):
+        self.ttl = ttl if ttl is not None else (
+            getattr(CONF, 'NEST_METADATA_CACHE_TTL', None) or _METADATA_CACHE_TTL)
+        self.size = size or getattr(CONF, 'NEST_METADATA_CACHE_SIZE', None) or _METADATA_CACHE_SIZE
+        self._clock = clock
+        # (redis target, lookup key) -> (metadata, expires_at), least recent first
+        self._entries = collections.OrderedDict()
+        self.version = 0
+        self._listeners = {}  # redis target -> greenlet
+
+    def get(self, redis_client, nest_id):
+        """Return a copy of the nest's metadata, or None if it doesn't exist."""
+        key = (_redis_target(redis_client), nest_id)
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= now:
+            version = self.version
+            meta = _lookup_nest(redis_client, nest_id)
+            entry = (meta, now + self.ttl)
+            if version == self.version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return dict(entry[0]) if entry[0] is not None else None
+
+    def invalidate(self, nest_id=None):
+        """Drop all cached entries. Lookups by code or slug may alias any
+        nest_id, and registry writes are rare, so nothing finer is needed."""
+        self.version += 1
+        self._entries.clear()
+
+    def start_listener(self, redis_client):
+        """Subscribe to NESTS|invalidate in a background greenlet (once per server)."""
+        target = _redis_target(redis_client)
+        listener = self._listeners.get(target)
+        if listener is None or listener.dead:
+            self._listeners[target] = gevent.spawn(self._listen, redis_client)
+        return self._listeners[target]
+
+    def _listen(self, redis_client):
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATE_CHANNEL)
+                # Anything published while we were disconnected was missed
+                self.invalidate()
+                for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self.invalidate(message.get('data'))
+            except redis.RedisError as e:
+                logger.warning("Nest invalidation listener error, resubscribing: %s", e)
+                gevent.sleep(5)
+
+
+metadata_cache = NestMetadataCache()
+
+
+def get_cached_nest(redis_client, nest_id):
+    """Nest metadata by nest_id, code, or slug from the process-wide cache."""
+    return metadata_cache.get(redis_client, nest_id)
+
+
 # ---------------------------------------------------------------------------
 # Default NestManager instance (lazy-initialized)
 # ---------------------------------------------------------------------------
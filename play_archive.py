@@ -0,0 +1,288 @@
+"""Columnar, memory-mapped archive of closed play-log days.
+
+The daily ``play_log_YYYY_MM_DD.json`` files are newline JSON, so every
+scan re-parses every line. Once a day is over it never changes, and a
+compaction job (run hourly by the master player) converts it into one
+directory of typed NumPy columns under ``LOG_DIR/archive/YYYY_MM_DD/``:
+
+* ``endtime`` (float64, epoch seconds) and ``duration`` (int32)
+* ``track``, ``user``, ``artist``, ``title``, ``src`` -- int32 codes into one
+  archive-wide, append-only dictionary (``dictionary.json``), so codes
+  mean the same thing in every day and days can be concatenated
+* ``jam_offsets`` / ``jam_users`` -- jams in CSR form: the jammers of
+  play *i* are ``jam_users[jam_offsets[i]:jam_offsets[i + 1]]``
+
+Columns are opened with ``mmap_mode='r'``, so scans are NumPy operations
+over the page cache instead of per-line ``json.loads``. The offline
+recommender and the throwback index read archived days this way and only
+parse the logs of days not archived yet (see pending_logs()).
+
+Each day records the size and mtime of the logs it was built from
+(``source.json``); a day whose logs later change, e.g. late lines or
+gzipping, is compacted again. The JSON logs are left in place.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import datetime
+
+import dateutil.parser
+import numpy as np
+
+from config import CONF
+from history import iter_logged_plays, play_log_files
+
+logger = logging.getLogger(__name__)
+
+_DAY_RE = re.compile(r'(\d{4}_\d{2}_\d{2})$')
+_LOG_DAY_RE = re.compile(r'play_log_(\d{4}_\d{2}_\d{2})\.json(\.gz)?$')
+_EPOCH = datetime(1970, 1, 1)
+
+DICTIONARY_FIELDS = ('track', 'user', 'artist', 'title', 'src')
+COLUMNS = {
+    'endtime': np.float64,
+    'duration': np.int32,
+    'track': np.int32,
+    'user': np.int32,
+    'artist': np.int32,
+    'title': np.int32,
+    'src': np.int32,
+    'jam_offsets': np.int64,
+    'jam_users': np.int32,
+}
+# Columns with one value per play (the jam columns are indexed separately)
+PLAY_COLUMNS = ('endtime', 'duration', 'track', 'user', 'artist', 'title', 'src')
+# Marks a complete day and the logs it was built from
+SOURCE_FILE = 'source.json'
+
+
+def archive_dir(log_dir=None):
+    return os.path.join(log_dir or CONF.LOG_DIR, 'archive')
+
+
+def log_day(log_file):
+    """``YYYY_MM_DD`` for a play log path, or None if it isn't one."""
+    m = _LOG_DAY_RE.search(os.path.basename(log_file))
+    return m.group(1) if m else None
+
+
+def _epoch_seconds(endtime):
+    dt = dateutil.parser.parse(endtime)
+    if dt.tzinfo is not None:
+        return dt.timestamp()
+    return (dt - _EPOCH).total_seconds()
+
+
+def _jammers(play):
+    return [jam['user'] if isinstance(jam, dict) else jam for jam in play.get('jam') or []]
+
+
+def _source_signature(log_files):
+    """{log name: [size, mtime]} for the logs a day is built from."""
+    signature = {}
+    for log_file in log_files:
+        st = os.stat(log_file)
+        signature[os.path.basename(log_file)] = [st.st_size, st.st_mtime]
+    return signature
+
+
+def _duration(play):
+    try:
+        return int(float(play.get('duration') or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+class PlayArchive(object):
+    """Reader and compactor for one archive directory."""
+
+    def __init__(self, path=None):
+        self.path = path or archive_dir()
+        self._dictionary = None
+        self._dictionary_mtime = None
+
+    def _dictionary_path(self):
+        return os.path.join(self.path, 'dictionary.json')
+
+    def dictionary(self):
+        """Return {field: [value, ...]}; a value's code is its list index."""
+        try:
+            mtime = os.path.getmtime(self._dictionary_path())
+        except OSError:
+            mtime = None
+        # Reload when another process (the compactor) has extended it
+        if self._dictionary is None or (mtime is not None and mtime != self._dictionary_mtime):
+            try:
+                with open(self._dictionary_path(), encoding='utf-8') as f:
+                    self._dictionary = json.load(f)
+            except (IOError, ValueError):
+                self._dictionary = {}
+            self._dictionary_mtime = mtime
+            for field in DICTIONARY_FIELDS:
+                self._dictionary.setdefault(field, [])
+        return self._dictionary
+
+    def _save_dictionary(self):
+        tmp = self._dictionary_path() + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._dictionary, f)
+        os.replace(tmp, self._dictionary_path())
+        self._dictionary_mtime = os.path.getmtime(self._dictionary_path())
+
+    def days(self):
+        """Archived days (``YYYY_MM_DD``), oldest first."""
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return []
+        return sorted(n for n in names if _DAY_RE.match(n)
+                      and os.path.isfile(os.path.join(self.path, n, SOURCE_FILE)))
+
+    def _source(self, day):
+        try:
+            with open(os.path.join(self.path, day, SOURCE_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def pending_logs(self, log_dir=None):
+        """Play logs (oldest first) whose day is not archived, so must be parsed."""
+        archived = set(self.days())
+        return [log_file for log_file in play_log_files(log_dir)
+                if log_day(log_file) not in archived]
+
+    def compact_day(self, log_files):
+        """Write the columns for one day's play log(s). Returns plays archived.
+
+        A day can have a gzipped log plus a plain one with late lines.
+        """
+        if isinstance(log_files, str):
+            log_files = [log_files]
+        days = {log_day(log_file) for log_file in log_files}
+        if len(days) != 1 or None in days:
+            raise ValueError('not one day of play logs: %s' % log_files)
+        day = days.pop()
+        source = _source_signature(log_files)
+
+        rows = []
+        for play in iter_logged_plays(log_files):
+            try:
+                rows.append((_epoch_seconds(play['endtime']), play))
+            except (KeyError, TypeError, ValueError, OverflowError):
+                continue
+        rows.sort(key=lambda row: row[0])
+
+        dictionary = self.dictionary()
+        codes = {field: {value: i for i, value in enumerate(dictionary[field])}
+                 for field in DICTIONARY_FIELDS}
+
+        def encode(field, value):
+            value = value or ''
+            code = codes[field].get(value)
+            if code is None:
+                code = codes[field][value] = len(dictionary[field])
+                dictionary[field].append(value)
+            return code
+
+        columns = {name: [] for name in COLUMNS}
+        columns['jam_offsets'].append(0)
+        for endtime, play in rows:
+            columns['endtime'].append(endtime)
+            columns['duration'].append(_duration(play))
+            for field, key in (('track', 'trackid'), ('user', 'user'), ('artist', 'artist'),
+                               ('title', 'title'), ('src', 'src')):
+                columns[field].append(encode(field, play.get(key)))
+            columns['jam_users'].extend(encode('user', jammer) for jammer in _jammers(play))
+            columns['jam_offsets'].append(len(columns['jam_users']))
+
+        # Dictionary first: a day may only reference codes that exist on disk
+        os.makedirs(self.path, exist_ok=True)
+        self._save_dictionary()
+
+        tmp_dir = os.path.join(self.path, day + '.tmp')
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name, dtype in COLUMNS.items():
+            np.save(os.path.join(tmp_dir, name + '.npy'), np.asarray(columns[name], dtype=dtype))
+        with open(os.path.join(tmp_dir, SOURCE_FILE), 'w', encoding='utf-8') as f:
+            json.dump(source, f)
+        final_dir = os.path.join(self.path, day)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+        return len(rows)
+
+    def compact_closed_days(self, log_dir=None, today=None):
+        """Archive every play log before *today* that isn't archived, or changed since.
+
+        Returns the number of days compacted.
+        """
+        today = today or datetime.now().strftime('%Y_%m_%d')
+        by_day = {}
+        for log_file in play_log_files(log_dir):
+            by_day.setdefault(log_day(log_file), []).append(log_file)
+        compacted = 0
+        for day, log_files in sorted(by_day.items(), key=lambda item: item[0] or ''):
+            if day is None or day >= today:
+                continue
+            try:
+                if self._source(day) == _source_signature(log_files):
+                    continue
+            except OSError:
+                continue  # log rotated away mid-scan; next run picks it up
+            plays = self.compact_day(log_files)
+            compacted += 1
+            logger.info("Archived %d plays for %s", plays, day)
+        return compacted
+
+    def columns(self, day):
+        """Memory-mapped columns for one archived day."""
+        day_dir = os.path.join(self.path, day)
+        return {name: np.load(os.path.join(day_dir, name + '.npy'), mmap_mode='r')
+                for name in COLUMNS}
+
+    def scan(self, start_day=None, end_day=None, columns=PLAY_COLUMNS, jams=False):
+        """Concatenate per-play columns for days in [start_day, end_day].
+
+        A single day is returned as its memory maps, without copying. With
+        *jams*, ``jam_play`` and ``jam_users`` are added: one entry per jam,
+        ``jam_play`` indexing the returned rows.
+        """
+        days = [d for d in self.days()
+                if (start_day is None or d >= start_day) and (end_day is None or d <= end_day)]
+        per_day = [self.columns(d) for d in days]
+        if len(per_day) == 1:
+            result = {name: per_day[0][name] for name in columns}
+        else:
+            result = {name: np.concatenate([c[name] for c in per_day]) if per_day
+                      else np.empty(0, dtype=COLUMNS[name])
+                      for name in columns}
+        if jams:
+            jam_play, base = [np.empty(0, dtype=np.int64)], 0
+            for c in per_day:
+                counts = np.diff(c['jam_offsets'])
+                jam_play.append(np.repeat(np.arange(base, base + counts.size), counts))
+                base += counts.size
+            result['jam_play'] = np.concatenate(jam_play)
+            result['jam_users'] = np.concatenate([np.empty(0, dtype=np.int32)]
+                                                 + [c['jam_users'] for c in per_day])
+        return result
+
+    def dictionary_mask(self, field, predicate):
+        """Boolean array over *field* codes: True where predicate(value) holds."""
+        values = self.dictionary()[field]
+        return np.fromiter((bool(predicate(v)) for v in values), dtype=bool, count=len(values))
+
+    def decode(self, field, codes):
+        """Map codes back to dictionary values."""
+        values = np.asarray(self.dictionary()[field], dtype=object)
+        return values[np.asarray(codes, dtype=np.int64)].tolist()
+
+    def count_by(self, field, start_day=None, end_day=None, limit=None):
+        """Return [(value, plays)], most played first, for a dictionary column."""
+        codes = self.scan(start_day, end_day, columns=(field,))[field]
+        counts = np.bincount(codes, minlength=len(self.dictionary()[field]))
+        order = np.argsort(-counts, kind='stable')
+        order = order[counts[order] > 0][:limit]
+        return list(zip(self.decode(field, order), counts[order].tolist()))
@@ -0,0 +1,233 @@
+"""Buffered, asynchronous writer for the daily play logs.
+
+Finishing a song used to open, append to and close the day's
+``play_log_YYYY_MM_DD.json`` inside the player greenlet, and dropped the
+play on any error. Now the player only appends the line to an in-memory
+buffer. A writer greenlet flushes the buffer every
+``PLAY_LOG_FLUSH_SECONDS``, doing the file I/O in gevent's threadpool so a
+stalled disk can't block the hub (and with it track transitions).
+
+* Failed writes stay buffered and are retried with backoff; only a buffer
+  that outgrows ``_MAX_BUFFERED`` lines drops its oldest entries.
+* ``PLAY_LOG_FSYNC``: ``always`` (fsync every flush), ``interval`` (at most
+  every ``_FSYNC_INTERVAL`` seconds, the default) or ``never``.
+* Each line's file is chosen when the play is logged, so a day's lines
+  never spill into the next file. When a flush writes to a new day, the
+  previous day's file is fsynced, closed, and (unless
+  ``PLAY_LOG_COMPRESS`` is false) gzipped to ``play_log_YYYY_MM_DD.json.gz``
+  via a temp file and rename; the plain file is removed afterwards.
+"""
+import atexit
+import collections
+import gzip
+import logging
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+
+import gevent
+import gevent.event
+from gevent.monkey import get_original
+
+from config import CONF
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_FLUSH_SECONDS = 1.0
+_FSYNC_INTERVAL = 5.0
+_MAX_BUFFERED = 100000
+_MAX_RETRY_DELAY = 30
+_LOG_RE = re.compile(r'play_log_(\d{4}_\d{2}_\d{2})\.json$')
+# flush() runs on a threadpool thread, so its locks must be real ones even
+# when threading is monkey-patched
+_native_lock = get_original('_thread', 'allocate_lock')
+
+
+def compress_log(path):
+    """Gzip a closed play log to ``<path>.gz`` atomically, then remove it.
+
+    Late lines for an already compressed day are appended to its ``.gz``
+    as another gzip member rather than replacing it.
+    """
+    tmp = path + '.gz.tmp'
+    if os.path.exists(path + '.gz'):
+        shutil.copyfile(path + '.gz', tmp)
+    else:
+        open(tmp, 'wb').close()
+    with open(path, 'rb') as src, gzip.open(tmp, 'ab') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, path + '.gz')
+    os.remove(path)
+
+
+def compress_closed_logs(log_dir=None, today=None):
+    """Gzip every plain play log from before *today*. Returns files compressed."""
+    log_dir = log_dir or CONF.LOG_DIR
+    today = today or datetime.now().strftime('%Y_%m_%d')
+    compressed = 0
+    try:
+        names = sorted(os.listdir(log_dir))
+    except OSError:
+        return 0
+    for name in names:
+        m = _LOG_RE.match(name)
+        if m and m.group(1) < today:
+            try:
+                compress_log(os.path.join(log_dir, name))
+                compressed += 1
+            except OSError as e:
+                logger.warning("Could not compress play log %s: %s", name, e)
+    return compressed
+
+
+class PlayLogWriter(object):
+    """Process-wide buffered writer; see the module docstring."""
+
+    def __init__(self, flush_seconds=None, fsync=None, compress=None):
+        self._flush_seconds = flush_seconds or getattr(CONF, 'PLAY_LOG_FLUSH_SECONDS', None) \
+            or _DEFAULT_FLUSH_SECONDS
+        self._fsync = fsync or getattr(CONF, 'PLAY_LOG_FSYNC', None) or 'interval'
+        if compress is None:
+            compress = getattr(CONF, 'PLAY_LOG_COMPRESS', None) is not False
+        self._compress = compress
+        self._buffer = collections.deque()
+        self._buffer_lock = _native_lock()  # write() on the hub vs flush() in the pool
+        self._flush_lock = _native_lock()   # one flush at a time, close() included
+        self._files = {}          # path -> open file, normally just today's
+        self._last_fsync = 0.0
+        self._failures = 0
+        self._wake = gevent.event.Event()
+        self._greenlet = None
+
+    def start(self):
+        if self._greenlet is None:
+            self._greenlet = gevent.spawn(self._run)
+            atexit.register(self.close)
+        return self
+
+    def write(self, path, line):
+        """Queue *line* for *path*. Never blocks on the disk."""
+        with self._buffer_lock:
+            self._buffer.append((path, line))
+            self._enforce_cap()
+        if self._fsync == 'always':
+            self._wake.set()
+
+    def _enforce_cap(self):
+        # Caller holds _buffer_lock
+        while len(self._buffer) > _MAX_BUFFERED:
+            dropped = self._buffer.popleft()
+            logger.error('play log buffer full, dropped %s', dropped[1])
+
+    def _run(self):
+        if self._compress:
+            try:
+                gevent.get_hub().threadpool.apply(compress_closed_logs)
+            except Exception:
+                logger.exception('Error compressing closed play logs')
+        while True:
+            self._wake.wait(self._flush_seconds)
+            self._wake.clear()
+            if not self._buffer:
+                continue
+            try:
+                gevent.get_hub().threadpool.apply(self.flush)
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                delay = min(_MAX_RETRY_DELAY, 2 ** self._failures)
+                logger.error('play log write failed (attempt %d, retrying in %ss): %s',
+                             self._failures, delay, e)
+                gevent.sleep(delay)
+
+    def flush(self):
+        """Write out everything buffered. Lines stay buffered on failure."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        # Take the whole buffer, so lines written meanwhile go to a fresh one
+        with self._buffer_lock:
+            batch, self._buffer = self._buffer, collections.deque()
+        if not batch:
+            return 0
+        try:
+            newest = self._write_batch(batch)
+        except Exception:
+            # Put the batch back ahead of anything written since. A retry
+            # after a partial write can repeat lines; history loading
+            # dedupes plays by digest.
+            with self._buffer_lock:
+                batch.extend(self._buffer)
+                self._buffer = batch
+                self._enforce_cap()
+            raise
+
+        # Anything older than the newest day written is closed
+        for path in sorted(p for p in self._files if p < newest):
+            self._rotate(path)
+        return len(batch)
+
+    def _write_batch(self, batch):
+        by_path = collections.OrderedDict()
+        for path, line in batch:
+            by_path.setdefault(path, []).append(line)
+
+        newest = max(by_path)
+        for path, lines in by_path.items():
+            f = self._open(path)
+            f.write(''.join(line + '\n' for line in lines))
+            f.flush()
+        now = time.time()
+        if self._fsync == 'always' or (self._fsync == 'interval'
+                                       and now - self._last_fsync >= _FSYNC_INTERVAL):
+            for f in self._files.values():
+                os.fsync(f.fileno())
+            self._last_fsync = now
+        return newest
+
+    def _open(self, path):
+        f = self._files.get(path)
+        if f is None:
+            f = self._files[path] = open(path, 'a', encoding='utf-8')
+        return f
+
+    def _rotate(self, path):
+        f = self._files.pop(path)
+        f.flush()
+        if self._fsync != 'never':
+            os.fsync(f.fileno())
+        f.close()
+        if self._compress:
+            try:
+                compress_log(path)
+            except OSError as e:
+                logger.warning("Could not compress play log %s: %s", path, e)
+
+    def close(self):
+        """Flush synchronously and close files (at exit).
+
+        Waits for a flush already running in the threadpool, so no line is
+        written twice.
+        """
+        with self._flush_lock:
+            try:
+                self._flush()
+            except Exception as e:
+                logger.error('play log flush at exit failed, %d plays lost: %s', len(self._buffer), e)
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+
+_writer = None
+
+
+def get_writer():
+    """The process-wide writer, started on first use."""
+    global _writer
+    if _writer is None:
+        _writer = PlayLogWriter().start()
+    return _writer
@@ -0,0 +1,335 @@
+"""Offline Bender recommendations built from play history.
+
+Every other Bender strategy needs Spotify search. This one is built purely
+from play history -- the columnar archive of closed days (play_archive.py)
+plus any daily play logs not archived yet -- so it keeps serving fills for
+every nest while we are rate limited or over budget.
+
+Three signals are combined, all computed with NumPy:
+
+* **Taste** -- cosine similarity between tracks' listener vectors (who
+  queued it, who jammed it; jams count double).
+* **Co-occurrence** -- tracks played back to back in the same session.
+* **Artist adjacency** -- artists whose tracks follow each other, so a seed
+  we have never played can still be matched by artist name.
+
+With no usable seed at all, the most popular logged tracks are served.
+"""
+import logging
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+from config import CONF
+from history import BENDER_USER, DAILY_MIX_USER, iter_logged_plays, play_log_files
+from play_archive import PlayArchive
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_WEIGHT = 1.0
+_JAM_WEIGHT = 2.0
+
+# How much each signal contributes to a track's score
+_TASTE_WEIGHT = 0.5
+_COOCCURRENCE_WEIGHT = 0.3
+_ARTIST_WEIGHT = 0.2
+
+_DEFAULT_MAX_TRACKS = 20000
+_DEFAULT_SESSION_GAP = 30 * 60     # seconds between plays that still count as one session
+
+
+def _artist_key(artist):
+    """Primary artist of a logged ``"A, B"`` artist string, normalised for lookup."""
+    return (artist or '').split(', ')[0].strip().lower()
+
+
+def _play_time(play):
+    # Naive endtimes count as UTC, matching the archive's endtime column
+    try:
+        endtime = datetime.fromisoformat(play.get('endtime', ''))
+    except (TypeError, ValueError):
+        return np.nan
+    if endtime.tzinfo is None:
+        endtime = endtime.replace(tzinfo=timezone.utc)
+    return endtime.timestamp()
+
+
+def _normalized(values):
+    peak = values.max() if values.size else 0
+    return values / peak if peak > 0 else values
+
+
+class OfflineRecommender(object):
+    """Track similarity model over logged plays.
+
+    Call build() with an iterable of play dicts (as logged by
+    DB.log_finished_song), then recommend() as often as needed.
+    """
+
+    def __init__(self, max_tracks=None, session_gap=None):
+        self.max_tracks = int(max_tracks or getattr(CONF, 'BENDER_OFFLINE_MAX_TRACKS', None)
+                              or _DEFAULT_MAX_TRACKS)
+        self.session_gap = float(session_gap or _DEFAULT_SESSION_GAP)
+        self._tracks = []       # idx -> trackid
+        self._index = {}        # trackid -> idx
+        self._meta = []         # idx -> (title, artist, duration)
+        self._artist_index = {}
+        self._track_artist = np.zeros(0, dtype=np.int32)
+        self._popularity = np.zeros(0)
+        self._taste = np.zeros((0, 0), dtype=np.float32)
+        self._co_src = self._co_dst = np.zeros(0, dtype=np.int32)
+        self._artist_src = self._artist_dst = np.zeros(0, dtype=np.int32)
+
+    @property
+    def n_tracks(self):
+        return len(self._tracks)
+
+    def build(self, plays, archive=None):
+        """(Re)build the model from an iterable of play dicts, oldest first.
+
+        With a PlayArchive, its archived days are read as columns first
+        and *plays* should hold only the plays logged after them.
+        """
+        index, tracks, meta = {}, [], []
+        users = {}
+        parts = []
+        if archive is not None:
+            parts.append(self._archive_arrays(archive, index, tracks, meta, users))
+        parts.append(self._play_arrays(plays, index, tracks, meta, users))
+        seq, times, rows, cols, weights = (np.concatenate(arrays) for arrays in zip(*parts))
+        n = len(tracks)
+        popularity = (np.bincount(seq, minlength=n)
+                      + np.bincount(rows, weights=weights, minlength=n))
+
+        # Keep only the most played tracks so the model stays small
+        if n > self.max_tracks:
+            keep = np.argsort(-popularity, kind='stable')[:self.max_tracks]
+            remap = np.full(n, -1, dtype=np.int64)
+            remap[keep] = np.arange(keep.size)
+            seq = remap[seq]
+            rows = remap[rows]
+            kept = rows >= 0
+            rows, cols, weights = rows[kept], cols[kept], weights[kept]
+            tracks = [tracks[i] for i in keep]
+            meta = [meta[i] for i in keep]
+            index = {t: i for i, t in enumerate(tracks)}
+            popularity = popularity[keep]
+            n = len(tracks)
+
+        # Listener vectors: log-damped counts, L2-normalised so a dot product is cosine
+        taste = np.zeros((n, len(users)), dtype=np.float32)
+        np.add.at(taste, (rows, cols), weights)
+        np.log1p(taste, out=taste)
+        norms = np.linalg.norm(taste, axis=1, keepdims=True)
+        np.divide(taste, norms, out=taste, where=norms > 0)
+
+        # Back-to-back plays within a session, both directions, sorted for lookup
+        if seq.size > 1:
+            a, b = seq[:-1], seq[1:]
+            gap = times[1:] - times[:-1]
+            pair = (a >= 0) & (b >= 0) & (a != b) & (gap >= 0) & (gap <= self.session_gap)
+            src = np.concatenate([a[pair], b[pair]])
+            dst = np.concatenate([b[pair], a[pair]])
+        else:
+            src = dst = np.zeros(0, dtype=np.int64)
+        order = np.argsort(src, kind='stable')
+        co_src, co_dst = src[order].astype(np.int32), dst[order].astype(np.int32)
+
+        artist_index = {}
+        track_artist = np.fromiter((artist_index.setdefault(_artist_key(m[1]), len(artist_index))
+                                    for m in meta), dtype=np.int32, count=n)
+        a_src, a_dst = track_artist[co_src], track_artist[co_dst]
+        cross = a_src != a_dst
+        order = np.argsort(a_src[cross], kind='stable')
+
+        self._tracks, self._index, self._meta = tracks, index, meta
+        self._artist_index, self._track_artist = artist_index, track_artist
+        self._popularity = popularity.astype(np.float64)
+        self._taste = taste
+        self._co_src, self._co_dst = co_src, co_dst
+        self._artist_src, self._artist_dst = a_src[cross][order], a_dst[cross][order]
+        logger.info("Offline recommender built: %d tracks, %d listeners, %d transitions",
+                    n, len(users), co_src.size // 2)
+        return self
+
+    @staticmethod
+    def _play_arrays(plays, index, tracks, meta, users):
+        """Parse play dicts into (seq, times, rows, cols, weights) arrays."""
+        rows, cols, weights = [], [], []
+        seq, times = [], []
+        for play in plays:
+            trackid = play.get('trackid') or ''
+            if play.get('src') != 'spotify' or not trackid.startswith('spotify:track:'):
+                continue
+            idx = index.get(trackid)
+            if idx is None:
+                idx = index[trackid] = len(tracks)
+                tracks.append(trackid)
+                meta.append((play.get('title', ''), play.get('artist', ''), play.get('duration', 0)))
+
+            listeners = [(play.get('user'), _QUEUE_WEIGHT)]
+            listeners += [(jam.get('user') if isinstance(jam, dict) else jam, _JAM_WEIGHT)
+                          for jam in play.get('jam') or []]
+            for user, weight in listeners:
+                if not user or user in (BENDER_USER, DAILY_MIX_USER):
+                    continue
+                rows.append(idx)
+                cols.append(users.setdefault(user, len(users)))
+                weights.append(weight)
+
+            seq.append(idx)
+            times.append(_play_time(play))
+        return (np.asarray(seq, dtype=np.int64), np.asarray(times, dtype=np.float64),
+                np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64),
+                np.asarray(weights, dtype=np.float32))
+
+    @staticmethod
+    def _archive_arrays(archive, index, tracks, meta, users):
+        """The same arrays as _play_arrays, from archived columns with no per-play parsing."""
+        cols = archive.scan(columns=('endtime', 'duration', 'track', 'user', 'artist', 'title', 'src'),
+                            jams=True)
+        # Read after the columns: codes on disk always exist in the saved dictionary
+        dictionary = archive.dictionary()
+        is_spotify = archive.dictionary_mask('src', lambda src: src == 'spotify')
+        is_track = archive.dictionary_mask('track', lambda t: t.startswith('spotify:track:'))
+        is_listener = archive.dictionary_mask(
+            'user', lambda u: u and u not in (BENDER_USER, DAILY_MIX_USER))
+
+        keep = np.flatnonzero(is_spotify[cols['src']] & is_track[cols['track']])
+        codes, first, inverse = np.unique(cols['track'][keep], return_index=True, return_inverse=True)
+        local = np.empty(codes.size, dtype=np.int64)
+        for i, code in enumerate(codes.tolist()):
+            trackid = dictionary['track'][code]
+            idx = index.get(trackid)
+            if idx is None:
+                idx = index[trackid] = len(tracks)
+                tracks.append(trackid)
+                row = keep[first[i]]
+                meta.append((dictionary['title'][cols['title'][row]],
+                             dictionary['artist'][cols['artist'][row]], int(cols['duration'][row])))
+            local[i] = idx
+        seq = local[inverse.reshape(-1)]
+
+        # Queuers, then jammers (jam_play indexes all scanned rows, so remap to kept ones)
+        queuers = np.asarray(cols['user'])[keep]
+        queued = is_listener[queuers]
+        position = np.full(len(cols['track']), -1, dtype=np.int64)
+        position[keep] = np.arange(keep.size)
+        jam_rows = position[cols['jam_play']]
+        jammed = (jam_rows >= 0) & is_listener[cols['jam_users']]
+        rows = np.concatenate([seq[queued], seq[jam_rows[jammed]]])
+        user_codes = np.concatenate([queuers[queued], cols['jam_users'][jammed]]).astype(np.int64)
+        listeners, listener_inverse = np.unique(user_codes, return_inverse=True)
+        listener_cols = np.asarray([users.setdefault(dictionary['user'][code], len(users))
+                                    for code in listeners.tolist()], dtype=np.int64)
+        weights = np.concatenate([np.full(int(queued.sum()), _QUEUE_WEIGHT, dtype=np.float32),
+                                  np.full(int(jammed.sum()), _JAM_WEIGHT, dtype=np.float32)])
+        return (seq, np.asarray(cols['endtime'], dtype=np.float64)[keep], rows,
+                listener_cols[listener_inverse.reshape(-1)], weights)
+
+    @staticmethod
+    def _neighbours(src, dst, idx):
+        lo, hi = np.searchsorted(src, [idx, idx + 1])
+        return dst[lo:hi]
+
+    def scores(self, seed_uri=None, artist_name=None):
+        """Score every known track against the seed. Returns a float array."""
+        n = self.n_tracks
+        scores = np.zeros(n)
+        artist = None
+        seed = self._index.get(seed_uri)
+        if seed is not None:
+            if self._taste.shape[1]:
+                scores += _TASTE_WEIGHT * (self._taste @ self._taste[seed])
+            near = self._neighbours(self._co_src, self._co_dst, seed)
+            scores += _COOCCURRENCE_WEIGHT * _normalized(np.bincount(near, minlength=n).astype(np.float64))
+            artist = self._track_artist[seed]
+        elif artist_name:
+            artist = self._artist_index.get(_artist_key(artist_name))
+
+        if artist is not None:
+            near = self._neighbours(self._artist_src, self._artist_dst, artist)
+            adjacency = _normalized(np.bincount(near, minlength=len(self._artist_index)).astype(np.float64))
+            adjacency[artist] = 1.0
+            scores += _ARTIST_WEIGHT * adjacency[self._track_artist]
+
+        if seed is not None:
+            scores[seed] = 0
+        return scores
+
+    def recommend(self, seed_uri=None, artist_name=None, limit=10, exclude=(), rng=None):
+        """Return up to *limit* track URIs related to the seed track or artist.
+
+        Picks are sampled from the strongest candidates in proportion to
+        their score, so repeated calls rotate rather than repeat. Falls
+        back to the most popular logged tracks when nothing relates.
+        """
+        if not self.n_tracks or limit <= 0:
+            return []
+        rng = rng or np.random.default_rng()
+        scores = self.scores(seed_uri, artist_name)
+        blocked = [self._index[t] for t in exclude if t in self._index]
+        if seed_uri in self._index:
+            blocked.append(self._index[seed_uri])
+        scores[blocked] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if not candidates.size:
+            scores = self._popularity.copy()
+            scores[blocked] = 0
+            candidates = np.flatnonzero(scores > 0)
+            if not candidates.size:
+                return []
+
+        pool = limit * 4
+        if candidates.size > pool:
+            candidates = candidates[np.argpartition(-scores[candidates], pool - 1)[:pool]]
+        p = scores[candidates] / scores[candidates].sum()
+        picks = rng.choice(candidates, size=min(limit, candidates.size), replace=False, p=p)
+        return [self._tracks[i] for i in picks]
+
+    def track_info(self, trackid):
+        """Logged metadata for a track in FILL-INFO shape, or None if unknown."""
+        idx = self._index.get(trackid)
+        if idx is None:
+            return None
+        title, artist, duration = self._meta[idx]
+        return {'trackid': trackid, 'src': 'spotify', 'title': title or '',
+                'artist': artist or '', 'duration': str(duration or 0)}
+
+
+_recommender = None
+_recommender_signature = None
+
+
+def _log_signature(log_files):
+    stats = [os.stat(f) for f in log_files]
+    return len(stats), max([s.st_mtime for s in stats] or [0]), sum(s.st_size for s in stats)
+
+
+def refresh_recommender():
+    """Rebuild the process-wide recommender if the play logs have changed.
+
+    Archived days are read as columns and only newer logs are parsed,
+    but it still scans all history, so it belongs in a background loop (see
+    master_player.recommender_build_loop), never on the fill path.
+    Returns True if a new model was built.
+    """
+    global _recommender, _recommender_signature
+    log_files = play_log_files()
+    try:
+        signature = _log_signature(log_files)
+    except OSError:
+        signature = None
+    if _recommender is not None and signature == _recommender_signature:
+        return False
+    archive = PlayArchive()
+    _recommender = OfflineRecommender().build(iter_logged_plays(archive.pending_logs()), archive)
+    _recommender_signature = signature
+    return True
+
+
+def get_recommender():
+    """The last recommender built by refresh_recommender(), or None before the first build."""
+    return _recommender
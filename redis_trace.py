@@ -0,0 +1,166 @@
+"""Redis client factory with per-request round-trip tracing.
+
+``make_redis()`` builds the client used by ``DB``, ``NestManager``, the
+metrics flusher and the rate-limit tracker (analytics writes through the
+client it is given). It is a ``TracingRedis``: each command or pipeline
+is timed and, while a trace is active, counted against it:
+
+* ``commands`` -- Redis commands sent (a pipeline of 8 counts 8)
+* ``round_trips`` -- network round trips (a pipeline counts 1)
+* ``seconds`` -- time spent waiting on Redis
+
+The app opens a trace per HTTP request and per WebSocket event or pub/sub
+fan-out (``trace(name)``). When a trace ends:
+
+* over ``REDIS_TRACE_MAX_ROUND_TRIPS`` round trips (default 25) logs a
+  warning with the busiest commands, which catches N+1 loops
+* with ``REDIS_TRACE: true`` the totals are logged at debug level, and HTTP
+  responses carry ``X-Redis-Commands``, ``X-Redis-Round-Trips`` and
+  ``X-Redis-Time-Ms``
+
+Any command or pipeline slower than ``REDIS_SLOW_COMMAND_MS`` (default 20)
+is logged, traced or not.
+"""
+import collections
+import contextlib
+import logging
+import time
+
+import gevent.local
+import redis
+from redis.client import Pipeline
+
+from config import CONF
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_SLOW_COMMAND_MS = 20
+_DEFAULT_MAX_ROUND_TRIPS = 25
+
+_local = gevent.local.local()
+
+
+class Trace(object):
+    """Redis usage of one request or event."""
+
+    def __init__(self, name):
+        self.name = name
+        self.commands = 0
+        self.round_trips = 0
+        self.seconds = 0.0
+        self.by_command = collections.Counter()
+
+    def summary(self):
+        return '%d commands, %d round trips, %.1fms' % (
+            self.commands, self.round_trips, self.seconds * 1000)
+
+
+def current():
+    """The active trace of this greenlet, or None."""
+    return getattr(_local, 'trace', None)
+
+
+def _setting(name, default):
+    value = getattr(CONF, name, None)
+    return default if value is None else value
+
+
+def _record(command, commands, seconds):
+    t = current()
+    if t is not None:
+        t.commands += commands
+        t.round_trips += 1
+        t.seconds += seconds
+        t.by_command[command] += 1
+    if seconds * 1000 >= _setting('REDIS_SLOW_COMMAND_MS', _DEFAULT_SLOW_COMMAND_MS):
+        logger.warning('Slow Redis %s: %.1fms (%d commands) in %s', command, seconds * 1000,
+                       commands, t.name if t is not None else '-')
+
+
+def _report(t):
+    if t.round_trips > _setting('REDIS_TRACE_MAX_ROUND_TRIPS', _DEFAULT_MAX_ROUND_TRIPS):
+        logger.warning('%s made %s; most frequent: %s', t.name, t.summary(),
+                       ', '.join('%s x%d' % c for c in t.by_command.most_common(5)))
+    elif getattr(CONF, 'REDIS_TRACE', None):
+        logger.debug('%s: %s', t.name, t.summary())
+
+
+@contextlib.contextmanager
+def trace(name):
+    """Trace the Redis use of the block; nested traces replace the outer one."""
+    outer = current()
+    t = _local.trace = Trace(name)
+    try:
+        yield t
+    finally:
+        _local.trace = outer
+        _report(t)
+
+
+def start(name):
+    """Begin a trace that ``finish`` ends (for request hooks)."""
+    _local.trace = Trace(name)
+    return _local.trace
+
+
+def finish():
+    """End and return the current trace, or None."""
+    t = current()
+    if t is not None:
+        _local.trace = None
+        _report(t)
+    return t
+
+
+def response_headers(t):
+    """Headers describing *t*, if REDIS_TRACE is on."""
+    if t is None or not getattr(CONF, 'REDIS_TRACE', None):
+        return {}
+    return {
+        'X-Redis-Commands': str(t.commands),
+        'X-Redis-Round-Trips': str(t.round_trips),
+        'X-Redis-Time-Ms': '%.1f' % (t.seconds * 1000),
+    }
+
+
+class TracingPipeline(Pipeline):
+    def execute(self, raise_on_error=True):
+        commands = len(self.command_stack)
+        if not commands:
+            return super(TracingPipeline, self).execute(raise_on_error)
+        start = time.perf_counter()
+        try:
+            return super(TracingPipeline, self).execute(raise_on_error)
+        finally:
+            _record('PIPELINE', commands, time.perf_counter() - start)
+
+    def immediate_execute_command(self, *args, **options):
+        # Commands run directly on a pipeline while WATCHing
+        start = time.perf_counter()
+        try:
+            return super(TracingPipeline, self).immediate_execute_command(*args, **options)
+        finally:
+            _record(str(args[0]).upper(), 1, time.perf_counter() - start)
+
+
+class TracingRedis(redis.StrictRedis):
+    """StrictRedis that reports every round trip to the active trace."""
+
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super(TracingRedis, self).execute_command(*args, **options)
+        finally:
+            _record(str(args[0]).upper(), 1, time.perf_counter() - start)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TracingPipeline(self.connection_pool, self.response_callbacks,
+                               transaction, shard_hint)
+
+
+def make_redis(host=None, port=None, password=None, **kwargs):
+    """The app's Redis client, configured from CONF unless overridden."""
+    kwargs.setdefault('decode_responses', True)
+    return TracingRedis(host=host or CONF.REDIS_HOST or 'localhost',
+                        port=port or CONF.REDIS_PORT or 6379,
+                        password=password or CONF.REDIS_PASSWORD or None, **kwargs)
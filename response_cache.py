@@ -0,0 +1,97 @@
+"""In-process cache for responses that rarely change.
+
+Some pages are rebuilt on every hit although their inputs change rarely:
+``/stats`` and ``/api/stats`` re-read the analytics keys, ``/help``
+re-reads and re-renders ``GETTING_STARTED.md``, ``/config.js`` renders
+config. Dashboards and bots poll them. ``cached`` keeps the rendered body
+in memory, keyed by endpoint, query string and an optional *vary* value,
+until one of these happens:
+
+* *ttl* seconds pass (for data read from Redis)
+* the mtime of one of *files* changes
+* *version()* returns something new (for module state such as the airhorn set)
+
+Every cached response has an ETag (a digest of the body) and a
+Last-Modified header. ``If-None-Match`` / ``If-Modified-Since`` requests get
+a 304 through Werkzeug's ``make_conditional``. Only 200 responses are
+cached. Each worker keeps its own cache, bounded to ``_MAX_ENTRIES``.
+"""
+import collections
+import functools
+import hashlib
+import os
+import time
+
+from flask import Response, make_response, request
+
+_MAX_ENTRIES = 256
+
+_Entry = collections.namedtuple('_Entry', 'stamp expires body status headers etag last_modified')
+
+
+def _mtimes(files):
+    stamps = []
+    for path in files:
+        try:
+            stamps.append(os.path.getmtime(path))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+class ResponseCache(object):
+    """LRU of rendered responses; see the module docstring."""
+
+    def __init__(self, max_entries=_MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+
+    def clear(self):
+        self._entries.clear()
+
+    def cached(self, ttl=None, files=(), version=None, vary=None, private=False):
+        """Decorator for a Flask view; see the module docstring."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                key = (view.__module__, view.__name__, request.full_path,
+                       vary() if vary else None)
+                stamp = (_mtimes(files), version() if version else None)
+                now = time.time()
+                entry = self._entries.get(key)
+                if entry is None or entry.stamp != stamp or (entry.expires and entry.expires <= now):
+                    resp = make_response(view(*args, **kwargs))
+                    if resp.status_code != 200 or resp.direct_passthrough:
+                        return resp
+                    body = resp.get_data()
+                    modified = max([m for m in stamp[0] if m] or [now])
+                    entry = _Entry(stamp, now + ttl if ttl else None, body, resp.status_code,
+                                   list(resp.headers.items()),
+                                   hashlib.sha1(body).hexdigest()[:20], modified)
+                    self._entries[key] = entry
+                    while len(self._entries) > self._max_entries:
+                        self._entries.popitem(last=False)
+                else:
+                    self._entries.move_to_end(key)
+                return self._respond(entry, ttl, private)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _respond(entry, ttl, private):
+        resp = Response(entry.body, status=entry.status, headers=entry.headers)
+        resp.set_etag(entry.etag)
+        resp.last_modified = entry.last_modified
+        if ttl:
+            resp.cache_control.max_age = int(ttl)
+        else:
+            resp.cache_control.no_cache = True
+        if private:
+            resp.cache_control.private = True
+        else:
+            resp.cache_control.public = True
+        return resp.make_conditional(request)
+
+
+response_cache = ResponseCache()
+cached = response_cache.cached
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Bulk load play logs into the Redis play history store.
+
+Resumable: each file picks up from the byte offset recorded by the last
+run, so rerunning only ingests new lines. Use --workers for multi-year
+archives.
+"""
+import argparse
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CONF
+from history import (LOG_OFFSETS_KEY, PlayHistory, load_play_logs_parallel,
+                     play_log_files)
+
+
+def redis_kwargs():
+    return dict(host=CONF.REDIS_HOST or 'localhost', port=CONF.REDIS_PORT or 6379,
+                password=CONF.REDIS_PASSWORD or None, decode_responses=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--log-dir', help='play log directory (default: LOG_DIR)')
+    parser.add_argument('--workers', type=int, default=1, help='loader processes')
+    parser.add_argument('--batch-size', type=int, default=5000, help='plays per pipeline')
+    parser.add_argument('--restart', action='store_true',
+                        help='forget recorded offsets and reread every file')
+    args = parser.parse_args()
+
+    import redis
+    client = redis.StrictRedis(**redis_kwargs())
+    if args.restart:
+        client.delete(LOG_OFFSETS_KEY)
+
+    log_files = play_log_files(args.log_dir)
+    if args.workers > 1:
+        stats = load_play_logs_parallel(redis_kwargs(), log_files, args.workers, args.batch_size)
+    else:
+        history = PlayHistory(types.SimpleNamespace(_r=client))
+        stats = history.load_play_logs(log_files, args.batch_size)
+
+    seconds = max(stats['seconds'], 0.001)
+    print("Read %d lines from %d files, stored %d new plays in %.1fs (%d lines/s)"
+          % (stats['lines'], stats['files'], stats['plays'], stats['seconds'], stats['lines'] / seconds))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
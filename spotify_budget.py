@@ -0,0 +1,139 @@
+"""Cluster-wide Spotify request budget.
+
+All app-level Spotify calls draw from one token bucket stored in Redis
+(``MISC|spotify-budget``), shared by every web worker and the player.
+Each process leases a few tokens at a time and spends them locally, so
+most calls cost no Redis round trip at all.
+
+Callers declare a priority class. Lower classes may only draw while the
+bucket is above a reserve floor, so background work (Bender fills) backs
+off well before interactive traffic (search, adding songs) runs dry, and
+long before Spotify answers with a 429.
+"""
+import logging
+import time
+
+import redis
+
+from config import CONF
+
+logger = logging.getLogger(__name__)
+
+BUDGET_KEY = 'MISC|spotify-budget'
+
+# Priority classes, most important first
+PRIORITY_INTERACTIVE = 'interactive'   # user search / add song / create nest
+PRIORITY_METADATA = 'metadata'         # now-playing + preview track metadata
+PRIORITY_BACKGROUND = 'background'     # Bender seed resolution + strategy fills
+
+# Fraction of bucket capacity each class must leave untouched
+_RESERVE_FRACTION = {
+    PRIORITY_INTERACTIVE: 0.0,
+    PRIORITY_METADATA: 0.25,
+    PRIORITY_BACKGROUND: 0.5,
+}
+
+_DEFAULT_RATE = 1.0         # tokens refilled per second
+_DEFAULT_BURST = 60         # bucket capacity
+_DEFAULT_LEASE = 3          # tokens leased per Redis round trip
+_DEFAULT_LEASE_TTL = 2.0    # seconds before an unused lease is dropped
+_UNAVAILABLE_BACKOFF = 30   # seconds to fail open after a Redis error
+
+
+class SpotifyBudget(object):
+    """Redis token bucket with a per-process lease cache.
+
+    Refill is computed lazily from the stored timestamp, so no background
+    job is needed. Updates use WATCH/MULTI like the queue writes in db.py.
+    """
+
+    def __init__(self, redis_client, rate=None, burst=None, lease_size=None,
+                 lease_ttl=None, clock=time.time):
+        self._r = redis_client
+        self.rate = float(rate or getattr(CONF, 'SPOTIFY_BUDGET_RATE', None) or _DEFAULT_RATE)
+        self.burst = float(burst or getattr(CONF, 'SPOTIFY_BUDGET_BURST', None) or _DEFAULT_BURST)
+        self.lease_size = int(lease_size or getattr(CONF, 'SPOTIFY_BUDGET_LEASE', None) or _DEFAULT_LEASE)
+        self.lease_ttl = float(lease_ttl or getattr(CONF, 'SPOTIFY_BUDGET_LEASE_TTL', None) or _DEFAULT_LEASE_TTL)
+        self._clock = clock
+        self._leases = {}  # priority -> [tokens, expires_at]
+        self._unavailable_until = 0.0
+
+    def floor(self, priority):
+        """Tokens that must remain in the bucket after *priority* draws."""
+        return self.burst * _RESERVE_FRACTION.get(priority, _RESERVE_FRACTION[PRIORITY_BACKGROUND])
+
+    def acquire(self, priority=PRIORITY_BACKGROUND, cost=1):
+        """Take *cost* tokens for a call of the given priority.
+
+        Returns True if the call may proceed. Fails open (returns True)
+        when Redis is unavailable, matching is_spotify_rate_limited().
+        """
+        now = self._clock()
+        lease = self._leases.get(priority)
+        if lease and lease[1] > now and lease[0] >= cost:
+            lease[0] -= cost
+            return True
+
+        if now < self._unavailable_until:
+            return True
+
+        want = max(cost, self.lease_size)
+        try:
+            granted = self._take(want, self.floor(priority), now)
+            if granted < cost and want > cost:
+                granted = self._take(cost, self.floor(priority), now)
+        except redis.RedisError as e:
+            logger.warning("Spotify budget unavailable, allowing call: %s", e)
+            self._unavailable_until = now + _UNAVAILABLE_BACKOFF
+            return True
+
+        if granted < cost:
+            logger.debug("Spotify budget denied %s call (cost=%d)", priority, cost)
+            return False
+        self._leases[priority] = [granted - cost, now + self.lease_ttl]
+        return True
+
+    def _take(self, n, floor, now):
+        """Atomically remove *n* tokens if that leaves at least *floor*. Returns tokens taken."""
+        with self._r.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(BUDGET_KEY)
+                    tokens = self._refilled(pipe.hgetall(BUDGET_KEY), now)
+                    taken = n if tokens - n >= floor else 0
+                    pipe.multi()
+                    pipe.hset(BUDGET_KEY, mapping={'tokens': tokens - taken, 'ts': now})
+                    pipe.expire(BUDGET_KEY, 3600)
+                    pipe.execute()
+                    return taken
+                except redis.WatchError:
+                    continue
+
+    def _refilled(self, state, now):
+        if not state:
+            return self.burst
+        tokens = float(state.get('tokens', self.burst))
+        elapsed = max(0.0, now - float(state.get('ts', now)))
+        return min(self.burst, tokens + elapsed * self.rate)
+
+    def drain(self):
+        """Empty the bucket (after a 429) so recovery ramps up gradually."""
+        self._leases.clear()
+        try:
+            self._r.hset(BUDGET_KEY, mapping={'tokens': 0, 'ts': self._clock()})
+            self._r.expire(BUDGET_KEY, 3600)
+        except redis.RedisError as e:
+            logger.warning("Error draining Spotify budget: %s", e)
+
+    def state(self):
+        """Return current bucket level and reserve floors, for monitoring."""
+        try:
+            tokens = self._refilled(self._r.hgetall(BUDGET_KEY), self._clock())
+        except redis.RedisError:
+            tokens = None
+        return {
+            'tokens': tokens,
+            'burst': self.burst,
+            'rate': self.rate,
+            'floors': {p: self.floor(p) for p in _RESERVE_FRACTION},
+        }
@@ -0,0 +1,138 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def analytics(monkeypatch):
+    import analytics as analytics_module
+    from config import CONF
+
+    monkeypatch.setattr(CONF, "ANALYTICS_FLUSH_INTERVAL", 60, raising=False)
+    monkeypatch.setattr(analytics_module, "_pending", {})
+    monkeypatch.setattr(analytics_module, "_flusher", object())
+    return analytics_module
+
+
+def test_events_are_aggregated_until_flush(fake_redis, analytics):
+    for _ in range(3):
+        analytics.track(fake_redis, "vote", "a@example.com")
+    analytics.track(fake_redis, "vote", "b@example.com")
+    analytics.track(fake_redis, "spotify_api_search")
+    assert analytics.get_daily_stats(fake_redis) == {}
+
+    analytics.flush()
+
+    date = analytics._today()
+    assert analytics.get_daily_stats(fake_redis) == {"vote": 4, "spotify_api_search": 1}
+    assert fake_redis.zscore("ANALYTICS|vote|%s" % date, "a@example.com") == 3
+    assert analytics.get_active_user_count(fake_redis) == 2
+    assert analytics.get_known_user_count(fake_redis) == 2
+    assert analytics.get_daily_active_users(fake_redis) == set()
+    assert 0 < fake_redis.ttl("ANALYTICS|totals|%s" % date) <= analytics._TTL_SECONDS
+    assert analytics._pending == {}
+
+
+def test_flushes_add_to_existing_counts(fake_redis, analytics):
+    analytics.track(fake_redis, "jam", "a@example.com")
+    analytics.flush(fake_redis)
+    analytics.track(fake_redis, "jam", "a@example.com")
+    analytics.flush(fake_redis)
+
+    assert analytics.get_top_users(fake_redis, "jam", days=1) == [("a@example.com", 2)]
+
+
+def test_zero_interval_writes_through(fake_redis, analytics, monkeypatch):
+    from config import CONF
+
+    monkeypatch.setattr(CONF, "ANALYTICS_FLUSH_INTERVAL", 0)
+    analytics.track(fake_redis, "login", "a@example.com")
+
+    assert analytics.get_daily_stats(fake_redis) == {"login": 1}
+
+
+def _seed_day(r, date, event_type, email, count):
+    r.zincrby("ANALYTICS|%s|%s" % (event_type, date), count, email)
+    r.hincrby("ANALYTICS|totals|%s" % date, event_type, count)
+
+
+def test_rollups_cover_closed_periods(fake_redis, analytics):
+    import datetime
+
+    today = datetime.date.today()
+    dates = analytics._dates(analytics._TTL_DAYS, today)
+    for day in dates:
+        _seed_day(fake_redis, day.isoformat(), "vote", "a@example.com", 1)
+    _seed_day(fake_redis, today.isoformat(), "jam", "b@example.com", 2)
+    expected = analytics.get_user_stats(fake_redis, days=60)
+
+    assert analytics.rollup(fake_redis, today) > 0
+    assert analytics.rollup(fake_redis, today) == 0
+
+    segments = analytics._segments(fake_redis, 60)
+    assert len(segments) < 60
+    assert today.isoformat() in segments
+    assert any("-W" in s or len(s) == 7 for s in segments)
+    assert analytics.get_user_stats(fake_redis, days=60) == expected
+    assert expected[0] == {"email": "a@example.com", "vote": 60}
+    assert analytics.get_top_users(fake_redis, "vote", days=60) == [("a@example.com", 60)]
+
+    month = analytics._dates(1, today.replace(day=1) - datetime.timedelta(days=1))[0]
+    assert int(fake_redis.hget("ANALYTICS|totals|%s" % month.strftime("%Y-%m"), "vote")) == month.day
+
+
+def test_active_users_merge_days_and_exact_sets_are_optional(fake_redis, analytics, monkeypatch):
+    import datetime
+    from config import CONF
+
+    yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+    fake_redis.pfadd("ANALYTICS|dau_hll|%s" % yesterday, "a@example.com", "c@example.com")
+    monkeypatch.setattr(CONF, "ANALYTICS_EXACT_USERS", True, raising=False)
+    analytics.track(fake_redis, "vote", "a@example.com")
+    analytics.track(fake_redis, "vote", "b@example.com")
+    analytics.flush()
+
+    assert analytics.get_active_user_count(fake_redis) == 2
+    assert analytics.get_active_user_count(fake_redis, days=7) == 3
+    assert [count for _, count in analytics.get_dau_trend(fake_redis, days=2)] == [2, 2]
+    assert analytics.get_daily_active_users(fake_redis) == {"a@example.com", "b@example.com"}
+
+
+def test_migrate_user_sets_folds_sets_into_hlls(fake_redis, analytics):
+    date = analytics._today()
+    fake_redis.sadd("ANALYTICS|dau|%s" % date, "a@example.com", "b@example.com")
+    fake_redis.expire("ANALYTICS|dau|%s" % date, 3600)
+    fake_redis.sadd("ANALYTICS|known_users", "a@example.com", "b@example.com", "c@example.com")
+
+    assert analytics.migrate_user_sets(fake_redis) == 2
+    assert analytics.get_active_user_count(fake_redis) == 2
+    assert analytics.get_known_user_count(fake_redis) == 3
+    assert not fake_redis.exists("ANALYTICS|dau|%s" % date, "ANALYTICS|known_users")
+    assert 0 < fake_redis.ttl("ANALYTICS|dau_hll|%s" % date) <= 3600
+
+
+def test_kept_exact_sets_are_folded_once(fake_redis, analytics, monkeypatch):
+    from config import CONF
+
+    monkeypatch.setattr(CONF, "ANALYTICS_EXACT_USERS", True, raising=False)
+    fake_redis.sadd("ANALYTICS|dau|%s" % analytics._today(), "a@example.com")
+    fake_redis.sadd("ANALYTICS|known_users", "a@example.com")
+    fake_redis.sadd("ANALYTICS|hll_migrated", "ANALYTICS|dau|2000-01-01")
+
+    assert analytics.migrate_user_sets(fake_redis) == 2
+    assert fake_redis.exists("ANALYTICS|known_users")
+    assert analytics.migrate_user_sets(fake_redis) == 0
+    # Markers for days past the retention window are dropped
+    assert "ANALYTICS|dau|2000-01-01" not in fake_redis.smembers("ANALYTICS|hll_migrated")
@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FUNK_SEED = "spotify:track:4XRkQloZFcRrCONN7ZQ49Y"
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def _track(n):
+    return {
+        "uri": "spotify:track:t%d" % n,
+        "name": "Song %d" % n,
+        "artists": [{"name": "Band %d" % n}],
+        "duration_ms": 180000,
+        "album": {"images": [{"url": "big%d" % n}, {"url": "small%d" % n}]},
+    }
+
+
+@pytest.fixture
+def spotify(monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    import db as db_module
+
+    client = MagicMock()
+    client.search.return_value = {"tracks": {"items": [_track(n) for n in range(8)]
+                                             + [{"uri": FUNK_SEED, "artists": []}]}}
+    monkeypatch.setattr(db_module, "spotify_client", client)
+    monkeypatch.setattr(db_module, "acquire_spotify_budget", lambda priority, cost=1: True)
+    return client
+
+
+def test_refill_pool_stores_metadata_and_trims(fake_redis, spotify):
+    from bender_pools import _POOL_SIZE, pool_key, refill_pool
+
+    assert refill_pool(fake_redis, FUNK_SEED, "funk") == 8
+    assert refill_pool(fake_redis, FUNK_SEED, "funk") == 8
+
+    items = [json.loads(i) for i in fake_redis.lrange(pool_key(FUNK_SEED), 0, -1)]
+    assert len(items) == _POOL_SIZE
+    assert FUNK_SEED not in {i["trackid"] for i in items}
+    assert items[-1] == {"trackid": "spotify:track:t7", "src": "spotify", "title": "Song 7",
+                         "artist": "Band 7", "duration": "180", "img": "small7", "big_img": "big7"}
+    assert 'genre:"funk"' in spotify.search.call_args.kwargs["q"]
+
+
+def test_warm_pools_skips_full_pools(fake_redis, monkeypatch):
+    import bender_pools
+
+    refilled = []
+    monkeypatch.setattr(bender_pools, "refill_pool",
+                        lambda r, seed_uri, genre: refilled.append(seed_uri) or 1)
+    fake_redis.rpush(bender_pools.pool_key(FUNK_SEED), *["x"] * bender_pools._POOL_REFILL_BELOW)
+
+    assert bender_pools.warm_pools(fake_redis) == len(bender_pools.themed_seeds()) - 1
+    assert FUNK_SEED not in refilled
+
+
+def test_cold_themed_nest_adopts_pool(fake_redis, spotify, monkeypatch):
+    from bender_pools import pool_key, refill_pool
+    from db import DB
+    from nests import NestManager, metadata_cache
+
+    metadata_cache.invalidate()
+    nest = NestManager(redis_client=fake_redis).create_nest("c@example.com", name="FunkNest")
+    refill_pool(fake_redis, FUNK_SEED, "funk")
+    spotify.reset_mock()
+
+    nest_db = DB(init_history_to_redis=False, nest_id=nest["code"], redis_client=fake_redis)
+    monkeypatch.setattr(nest_db, "_get_seed_info", lambda: pytest.fail("resolved seed"))
+    nest_db.ensure_fill_songs()
+
+    cached = fake_redis.lrange(nest_db._key("BENDER|cache:genre"), 0, -1)
+    assert len(cached) == nest_db._bender_fetch_limit
+    assert fake_redis.llen(pool_key(FUNK_SEED)) == 8 - len(cached)
+    assert nest_db.get_fill_info(cached[0])["title"].startswith("Song")
+    assert not spotify.method_calls
+
+
+def test_nest_with_own_seed_skips_pool(fake_redis, spotify):
+    from bender_pools import pool_key, refill_pool
+    from db import DB
+
+    refill_pool(fake_redis, FUNK_SEED, "funk")
+    nest_db = DB(init_history_to_redis=False, nest_id="main", redis_client=fake_redis)
+    fake_redis.set(nest_db._key("MISC|last-queued"), "spotify:track:human")
+
+    assert nest_db._adopt_themed_pool() == 0
+    assert fake_redis.llen(pool_key(FUNK_SEED)) == 8
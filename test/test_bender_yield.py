@@ -0,0 +1,91 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def db(fake_redis, monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    from db import DB
+
+    return DB(init_history_to_redis=False, redis_client=fake_redis)
+
+
+def _set_yield(db, strategy, calls, accepted):
+    db._record_yield(strategy, calls=calls, accepted=accepted)
+
+
+def test_fill_records_fetched_and_cached(db, fake_redis, monkeypatch):
+    fake_redis.set(db._key("FILTER|spotify:track:bad"), 1)
+    monkeypatch.setattr(db, "_fetch_album_tracks", lambda seed_info: [
+        "spotify:track:seed", "spotify:track:a", "spotify:track:a", "spotify:track:bad"])
+
+    assert db._fill_strategy_cache("album", {"seed_uri": "spotify:track:seed"}) == 1
+
+    stats = db.get_bender_yield()["album"]
+    assert stats["fetched"] == 4
+    assert stats["cached"] == 1
+
+
+def test_accept_and_reject_are_counted(db, fake_redis, monkeypatch):
+    monkeypatch.setattr(db, "_msg", lambda msg: None)
+    fake_redis.hset(db._key("BENDER|next-preview"),
+                    mapping={"trackid": "spotify:track:a", "strategy": "genre"})
+    db.benderfilter("spotify:track:a", "alice@example.com")
+
+    fake_redis.hset(db._key("BENDER|next-preview"),
+                    mapping={"trackid": "spotify:track:b", "strategy": "genre"})
+    assert db.get_fill_song() == ("the@echonest.com", "spotify:track:b")
+
+    stats = db.get_bender_yield()["genre"]
+    assert stats["rejected"] == 1
+    assert stats["accepted"] == 1
+
+
+def test_weights_follow_yield(db, monkeypatch):
+    from config import CONF
+
+    monkeypatch.setattr(CONF, "BENDER_STRATEGY_WEIGHTS", None, raising=False)
+    _set_yield(db, "genre", calls=40, accepted=0)
+    _set_yield(db, "artist_search", calls=40, accepted=40)
+    _set_yield(db, "album", calls=5, accepted=0)  # too few calls to judge
+
+    weights = db._get_strategy_weights()
+
+    assert weights["genre"] == pytest.approx(35 * 0.25)
+    assert weights["artist_search"] == pytest.approx(25 * 2.0)
+    assert weights["album"] == 5
+    assert weights["offline"] == 10
+    assert db.get_bender_yield()["artist_search"]["calls_per_accepted"] == 1.0
+
+
+def test_adaptive_weights_can_be_disabled(db, monkeypatch):
+    from config import CONF
+
+    monkeypatch.setattr(CONF, "BENDER_STRATEGY_WEIGHTS", None, raising=False)
+    monkeypatch.setattr(CONF, "BENDER_ADAPTIVE_WEIGHTS", False, raising=False)
+    _set_yield(db, "genre", calls=40, accepted=0)
+    _set_yield(db, "artist_search", calls=40, accepted=30)
+
+    assert db._get_strategy_weights()["genre"] == 35
+
+
+def test_counters_decay_past_window(db):
+    _set_yield(db, "genre", calls=db._YIELD_WINDOW, accepted=50)
+    db._record_yield("genre", calls=1)
+
+    stats = db.get_bender_yield()["genre"]
+    assert stats["calls"] == (db._YIELD_WINDOW + 1) // 2
+    assert stats["accepted"] == 25
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def db(fake_redis, monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    from db import DB
+
+    return DB(init_history_to_redis=False, redis_client=fake_redis)
+
+
+def test_fill_releases_lease(db, fake_redis, monkeypatch):
+    monkeypatch.setattr(db, "_fetch_album_tracks",
+                        lambda seed_info: ["spotify:track:a", "spotify:track:b"])
+
+    assert db._fill_strategy_cache("album", {"seed_uri": "spotify:track:seed"}) == 2
+    assert not fake_redis.exists(db._key("BENDER|fill-lock:album"))
+
+
+def test_second_filler_waits_instead_of_fetching(db, fake_redis, monkeypatch):
+    monkeypatch.setattr(db, "_FILL_WAIT_SECONDS", 0.2)
+    monkeypatch.setattr(db, "_fetch_album_tracks", lambda seed_info: pytest.fail("fetched twice"))
+    fake_redis.set(db._key("BENDER|fill-lock:album"), "other-worker")
+
+    assert db._fill_strategy_cache("album", {"seed_uri": "spotify:track:seed"}) == 0
+
+    # The holder's tracks are served as soon as they land
+    fake_redis.rpush(db._key("BENDER|cache:album"), "spotify:track:a")
+    assert db._fill_strategy_cache("album", {"seed_uri": "spotify:track:seed"}) == 1
+    assert fake_redis.get(db._key("BENDER|fill-lock:album")) == "other-worker"
+
+
+def test_filled_cache_short_circuits_under_lease(db, fake_redis, monkeypatch):
+    monkeypatch.setattr(db, "_fetch_album_tracks", lambda seed_info: pytest.fail("refetched"))
+    fake_redis.rpush(db._key("BENDER|cache:album"), "spotify:track:a", "spotify:track:b")
+
+    assert db._fill_strategy_cache("album", {"seed_uri": "spotify:track:seed"}) == 2
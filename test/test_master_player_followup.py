@@ -142,7 +142,7 @@ def test_nest_cleanup_loop_uses_effective_queue_size(monkeypatch):
         def __init__(self):
             self._r = object()
 
-        def list_nests(self):
+        def inactive_nests(self, idle_minutes):
             return [
                 ("nest1", {"is_main": False, "last_activity": "2026-03-10T00:00:00"}),
                 ("main", {"is_main": True}),
@@ -161,3 +161,23 @@ def test_nest_cleanup_loop_uses_effective_queue_size(monkeypatch):
 
     assert calls["queue_sizes"] == [("nest1", True)]
     assert calls["deleted"] == ["nest1"]
+
+
+def test_nest_player_does_not_load_history(monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    mp = importlib.import_module("master_player")
+
+    created = []
+
+    class FakeDB:
+        def __init__(self, init_history_to_redis=True, nest_id="main", redis_client=None):
+            created.append((nest_id, init_history_to_redis))
+
+        def master_player(self):
+            pass
+
+    monkeypatch.setattr(mp, "DB", FakeDB)
+
+    mp._run_nest_player("ABCDE")
+
+    assert created == [("ABCDE", False)]
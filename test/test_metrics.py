@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    import collections
+    import metrics as metrics_module
+
+    monkeypatch.setattr(metrics_module, "_pending", collections.Counter())
+    monkeypatch.setattr(metrics_module, "_types", {})
+    return metrics_module
+
+
+def test_flushes_from_several_workers_are_summed(fake_redis, metrics):
+    metrics.observe("echonest_db_call_seconds", 0.003, op="get_queued")
+    metrics.inc("echonest_pubsub_published", message="playlist_update")
+    assert metrics.flush(fake_redis) > 0
+    # A second worker's flush adds to the same totals
+    metrics.observe("echonest_db_call_seconds", 2, op="get_queued")
+    metrics.inc("echonest_pubsub_published", message="playlist_update")
+    metrics.flush(fake_redis)
+    assert metrics.flush(fake_redis) == 0
+
+    text = metrics.render(fake_redis, [("echonest_nest_listeners", {"nest": "main"}, 3)])
+    lines = text.splitlines()
+    assert "# TYPE echonest_db_call_seconds histogram" in lines
+    assert 'echonest_db_call_seconds_bucket{op="get_queued",le="0.0025"} 0' in lines
+    assert 'echonest_db_call_seconds_bucket{op="get_queued",le="0.005"} 1' in lines
+    assert 'echonest_db_call_seconds_bucket{op="get_queued",le="+Inf"} 2' in lines
+    assert 'echonest_db_call_seconds_count{op="get_queued"} 2' in lines
+    assert 'echonest_db_call_seconds_sum{op="get_queued"} 2.003' in lines
+    assert 'echonest_pubsub_published_total{message="playlist_update"} 2' in lines
+    assert "# TYPE echonest_nest_listeners gauge" in lines
+    assert 'echonest_nest_listeners{nest="main"} 3' in lines
+
+    buckets = [line for line in lines if line.startswith("echonest_db_call_seconds_bucket")]
+    assert buckets[-1].startswith('echonest_db_call_seconds_bucket{op="get_queued",le="+Inf"}')
+
+
+def test_failed_flush_keeps_deltas(fake_redis, metrics, monkeypatch):
+    metrics.inc("echonest_pubsub_published", message="v")
+
+    class Down(object):
+        def pipeline(self, transaction=False):
+            raise ConnectionError("redis down")
+
+    assert metrics.flush(Down()) == 0
+    metrics.flush(fake_redis)
+    assert 'echonest_pubsub_published_total{message="v"} 1' in metrics.render(fake_redis)
+
+
+def test_db_hot_paths_are_timed(fake_redis, metrics, monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    from db import DB
+
+    nest_db = DB(init_history_to_redis=False, nest_id="main", redis_client=fake_redis)
+    nest_db.get_now_playing()
+    metrics.flush(fake_redis)
+
+    assert 'echonest_db_call_seconds_count{op="get_now_playing"} 1' in metrics.render(fake_redis)
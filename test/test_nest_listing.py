@@ -0,0 +1,205 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def traced_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    from redis_trace import TracingRedis
+
+    return TracingRedis(connection_pool=fakeredis.FakeRedis(decode_responses=True).connection_pool)
+
+
+@pytest.fixture
+def manager(traced_redis):
+    from nests import NestManager
+
+    return NestManager(redis_client=traced_redis)
+
+
+def test_page_nests_is_two_round_trips(manager, traced_redis):
+    import redis_trace
+
+    created = [manager.create_nest("c%d@example.com" % i, name="Nest %d" % i)["code"]
+               for i in range(30)]
+    traced_redis.sadd("NEST:%s|MEMBERS" % created[0], "a@example.com", "b@example.com")
+    traced_redis.zadd("NEST:%s|MISC|priority-queue" % created[0], {"song": 1})
+
+    with redis_trace.trace("GET /api/nests") as t:
+        total, page = manager.page_nests(offset=0, limit=10, with_summary=True)
+    assert t.round_trips == 2
+    assert total == 31
+    assert [nest_id for nest_id, _ in page] == ["main"] + created[::-1][:9]
+
+    manager.touch_nest(created[0])
+    _, page = manager.page_nests(offset=0, limit=2, with_summary=True)
+    assert [nest_id for nest_id, _ in page] == ["main", created[0]]
+    meta = page[1][1]
+    assert (meta["member_count"], meta["queue_size"], meta["now_playing"]) == (2, 1, None)
+
+    _, rest = manager.page_nests(offset=30, limit=10)
+    assert [nest_id for nest_id, _ in rest] == [created[1]]
+    assert len(manager.list_nests()) == 31
+
+
+def test_page_nests_filters_by_name_or_code(manager):
+    friday = manager.create_nest("c@example.com", name="Friday Vibes")
+    manager.create_nest("c@example.com", name="Monday Blues")
+
+    total, page = manager.page_nests(query="friday")
+    assert total == 1 and page[0][0] == friday["code"]
+    assert manager.page_nests(query=friday["code"].lower())[0] == 1
+
+
+def test_pop_next_maintains_now_playing_summary(manager, traced_redis, monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    from db import DB
+
+    nest = manager.create_nest("c@example.com", name="Summary")
+    nest_db = DB(init_history_to_redis=False, nest_id=nest["code"], redis_client=traced_redis)
+    traced_redis.zadd(nest_db._key("MISC|priority-queue"), {"s1": 1})
+    traced_redis.hset(nest_db._key("QUEUE|s1"), mapping={
+        "id": "s1", "src": "youtube", "trackid": "yt1", "title": "Song", "artist": "Band",
+        "user": "a@example.com", "duration": "100"})
+
+    nest_db.pop_next()
+    _, page = manager.page_nests(query=nest["code"], with_summary=True)
+    assert page[0][1]["now_playing"] == {"title": "Song", "artist": "Band"}
+    assert page[0][1]["queue_size"] == 0
+
+    nest_db._clear_now_playing_state()
+    _, page = manager.page_nests(query=nest["code"], with_summary=True)
+    assert page[0][1]["now_playing"] is None
+
+
+def test_activity_index_tracks_touches_and_idle_nests(manager, traced_redis):
+    import time
+    import redis_trace
+
+    idle = manager.create_nest("c@example.com", name="Idle")
+    busy = manager.create_nest("c@example.com", name="Busy")
+    traced_redis.zadd("NESTS|activity", {idle["code"]: time.time() - 600})
+
+    with redis_trace.trace("join") as t:
+        manager.touch_nest(busy["code"])
+    assert t.round_trips == 1
+
+    assert [nest_id for nest_id, _ in manager.inactive_nests(5)] == [idle["code"]]
+    assert manager.inactive_nests(5)[0][1]["name"] == "Idle"
+    manager.touch_nest("ghost")
+    assert "ghost" not in manager.nest_ids()
+
+
+def test_update_nest_writes_only_its_fields(manager, traced_redis):
+    nest = manager.create_nest("c@example.com", name="Friday")
+    traced_redis.hset("NESTS|meta:%s" % nest["code"], "seed_uri", '"spotify:track:x"')
+
+    updated = manager.update_nest(nest["code"], {"name": "Saturday"})
+    assert (updated["name"], updated["seed_uri"]) == ("Saturday", "spotify:track:x")
+
+    manager.delete_nest(nest["code"])
+    assert manager.update_nest(nest["code"], {"name": "Sunday"}) is None
+    assert not traced_redis.exists("NESTS|meta:%s" % nest["code"])
+
+
+def test_legacy_registry_is_migrated(traced_redis):
+    import json
+    from nests import NestManager
+
+    traced_redis.hset("NESTS|registry", "OLD12", json.dumps({
+        "nest_id": "OLD12", "code": "OLD12", "name": "Old Nest", "is_main": False,
+        "created_at": "2026-01-01T00:00:00", "last_activity": "2026-01-02T03:04:05",
+        "ttl_minutes": 5}))
+
+    manager = NestManager(redis_client=traced_redis)
+
+    assert not traced_redis.exists("NESTS|registry")
+    nest = manager.get_nest("OLD12")
+    assert (nest["name"], nest["ttl_minutes"], nest["is_main"]) == ("Old Nest", 5, False)
+    assert nest["last_activity"] == "2026-01-02T03:04:05"
+    assert [nest_id for nest_id, _ in manager.inactive_nests(5)] == ["OLD12"]
+    assert sorted(manager.nest_ids()) == ["OLD12", "main"]
+
+
+def test_legacy_entries_without_activity_are_kept(traced_redis):
+    import json
+    from nests import NestManager
+
+    traced_redis.hset("NESTS|registry", mapping={
+        "NOACT": json.dumps({"nest_id": "NOACT", "code": "NOACT", "name": "No Activity"}),
+        "BROKE": "{not json",
+    })
+
+    manager = NestManager(redis_client=traced_redis)
+
+    assert manager.get_nest("NOACT")["name"] == "No Activity"
+    assert "NOACT" in manager.nest_ids()
+    assert [nest_id for nest_id, _ in manager.inactive_nests(5)] == []
+    # Unreadable entries stay in the legacy hash instead of being deleted
+    assert traced_redis.hgetall("NESTS|registry") == {"BROKE": "{not json"}
+
+
+def test_get_nest_falls_back_to_pipelined_resolve(manager, traced_redis, monkeypatch):
+    import nests
+    import redis_trace
+
+    monkeypatch.setattr(nests, "_resolve_scripts", {})
+    nest = manager.create_nest("c@example.com", name="Friday Vibes")
+
+    # fakeredis has no Lua: the first call finds out and stops trying
+    assert manager.get_nest("main")["name"] == "Home Nest"
+    assert nests._resolve_scripts == {nests._redis_target(traced_redis): None}
+
+    with redis_trace.trace("by id") as t:
+        assert manager.get_nest(nest["nest_id"])["code"] == nest["code"]
+    assert t.round_trips == 1
+    with redis_trace.trace("by slug") as t:
+        assert manager.get_nest("friday-vibes")["nest_id"] == nest["nest_id"]
+    assert t.round_trips == 2
+    assert manager.get_nest("nope") is None
+
+
+def test_get_nest_decodes_script_reply(manager, traced_redis, monkeypatch):
+    import nests
+
+    calls = []
+
+    def script(keys, args, client):
+        calls.append((keys, args))
+        return ["ABCDE", ["name", '"Funk"', "code", '"ABCDE"'], "1700000000.5"]
+
+    monkeypatch.setattr(nests, "_resolve_scripts", {nests._redis_target(traced_redis): script})
+
+    meta = manager.get_nest("funk")
+    assert (meta["name"], meta["code"]) == ("Funk", "ABCDE")
+    assert meta["last_activity"].startswith("2023-11-1")
+    assert calls == [(["NESTS|meta:funk", "NESTS|code:funk", "NESTS|slug:funk", "NESTS|activity"],
+                      ["funk", "NESTS|meta:"])]
+
+
+def test_transient_script_errors_keep_the_script(manager, traced_redis, monkeypatch):
+    import redis
+    import nests
+
+    def script(keys, args, client):
+        raise redis.ResponseError("BUSY Redis is busy running a script")
+
+    target = nests._redis_target(traced_redis)
+    monkeypatch.setattr(nests, "_resolve_scripts", {target: script})
+
+    assert manager.get_nest("main")["name"] == "Home Nest"
+    assert nests._resolve_scripts[target] is script
+
+    def denied(keys, args, client):
+        raise redis.exceptions.NoPermissionError("this user has no permissions to run the 'evalsha' command")
+
+    nests._resolve_scripts[target] = denied
+    assert manager.get_nest("main")["name"] == "Home Nest"
+    assert nests._resolve_scripts[target] is None
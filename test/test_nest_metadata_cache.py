@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def manager(fake_redis):
+    from nests import NestManager, metadata_cache
+
+    metadata_cache.invalidate()
+    return NestManager(redis_client=fake_redis)
+
+
+def test_lookups_are_cached_until_invalidated(manager, fake_redis):
+    from nests import get_cached_nest, metadata_cache
+
+    nest = manager.create_nest("c@example.com", name="FunkNest")
+    assert get_cached_nest(fake_redis, nest["code"])["name"] == "FunkNest"
+
+    # A write that bypasses NestManager isn't seen until invalidation
+    fake_redis.hset("NESTS|meta:%s" % nest["nest_id"], "name", json.dumps("Renamed"))
+    assert get_cached_nest(fake_redis, nest["code"])["name"] == "FunkNest"
+
+    metadata_cache.invalidate(nest["nest_id"])
+    assert get_cached_nest(fake_redis, nest["code"])["name"] == "Renamed"
+
+
+def test_cached_copies_are_independent(manager, fake_redis):
+    from nests import get_cached_nest
+
+    get_cached_nest(fake_redis, "main")["name"] = "mutated"
+
+    assert get_cached_nest(fake_redis, "main")["name"] == "Home Nest"
+
+
+def test_update_nest_invalidates_and_publishes(manager, fake_redis):
+    from nests import INVALIDATE_CHANNEL, get_cached_nest
+
+    nest = manager.create_nest("c@example.com", name="FunkNest")
+    get_cached_nest(fake_redis, nest["code"])
+    pubsub = fake_redis.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(INVALIDATE_CHANNEL)
+
+    updated = manager.update_nest(nest["nest_id"], {"name": "BassNest"})
+
+    assert updated["name"] == "BassNest"
+    assert get_cached_nest(fake_redis, nest["code"])["name"] == "BassNest"
+    messages = [pubsub.get_message(timeout=0.1) for _ in range(3)]
+    assert nest["nest_id"] in [m["data"] for m in messages if m]
+    assert manager.update_nest("NOPE1", {"name": "x"}) is None
+
+
+def test_lookup_racing_invalidation_is_not_stored(manager, fake_redis, monkeypatch):
+    import nests
+
+    real_lookup = nests._lookup_nest
+
+    def racing_lookup(client, nest_id):
+        meta = real_lookup(client, nest_id)
+        nests.metadata_cache.invalidate(nest_id)
+        return meta
+
+    monkeypatch.setattr(nests, "_lookup_nest", racing_lookup)
+    assert nests.get_cached_nest(fake_redis, "main")["name"] == "Home Nest"
+    monkeypatch.setattr(nests, "_lookup_nest", real_lookup)
+
+    assert "main" not in {key for _, key in nests.metadata_cache._entries}
+
+
+def test_db_genre_hint_follows_rename(manager, fake_redis, monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    from db import DB
+
+    nest = manager.create_nest("c@example.com", name="FunkNest")
+    db = DB(nest_id=nest["code"], init_history_to_redis=False, redis_client=fake_redis)
+    assert db._get_nest_genre_hint() == "funk"
+
+    manager.update_nest(nest["nest_id"], {"name": "ChordNest"})
+
+    assert db._get_nest_genre_hint() == "jazz"
+
+
+def test_cache_evicts_least_recently_used(manager, fake_redis):
+    from nests import NestMetadataCache
+
+    cache = NestMetadataCache(size=2)
+    cache.get(fake_redis, "main")
+    cache.get(fake_redis, "nope1")
+    cache.get(fake_redis, "main")
+    cache.get(fake_redis, "nope2")
+
+    assert [key for _, key in cache._entries] == ["main", "nope2"]
@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _play(track, user, endtime, jam=(), artist="Band"):
+    return {"src": "spotify", "trackid": "spotify:track:%s" % track, "user": user,
+            "artist": artist, "duration": "200", "endtime": endtime,
+            "jam": [{"user": j} for j in jam]}
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    days = {
+        "2026_10_12": [_play("b", "bob@example.com", "2026-10-12T21:00:00"),
+                       _play("a", "alice@example.com", "2026-10-12T20:00:00", jam=["bob@example.com"])],
+        "2026_10_13": [_play("a", "carol@example.com", "2026-10-13T20:00:00", artist="Other")],
+        "2026_10_14": [_play("c", "alice@example.com", "2026-10-14T20:00:00")],
+    }
+    for day, plays in days.items():
+        (tmp_path / ("play_log_%s.json" % day)).write_text(
+            "".join(json.dumps(p) + "\n" for p in plays) + "broken line\n")
+    return str(tmp_path)
+
+
+@pytest.fixture
+def archive(log_dir):
+    from play_archive import PlayArchive, archive_dir
+
+    archive = PlayArchive(archive_dir(log_dir))
+    assert archive.compact_closed_days(log_dir, today="2026_10_14") == 2
+    return archive
+
+
+def test_closed_days_are_compacted_once(archive, log_dir):
+    assert archive.days() == ["2026_10_12", "2026_10_13"]
+    assert archive.compact_closed_days(log_dir, today="2026_10_14") == 0
+
+
+def test_day_columns_are_memory_mapped_and_sorted(archive):
+    cols = archive.columns("2026_10_12")
+
+    assert isinstance(cols["endtime"], np.memmap)
+    assert np.all(np.diff(cols["endtime"]) > 0)
+    assert archive.decode("track", cols["track"]) == ["spotify:track:a", "spotify:track:b"]
+    assert cols["duration"].tolist() == [200, 200]
+    jammers = cols["jam_users"][cols["jam_offsets"][0]:cols["jam_offsets"][1]]
+    assert archive.decode("user", jammers) == ["bob@example.com"]
+
+
+def test_codes_are_shared_across_days(archive):
+    from play_archive import PlayArchive
+
+    assert archive.count_by("track") == [("spotify:track:a", 2), ("spotify:track:b", 1)]
+    assert archive.count_by("artist", start_day="2026_10_13") == [("Other", 1)]
+    # A fresh reader sees the same dictionary
+    assert PlayArchive(archive.path).count_by("user", limit=1)[0][1] == 1
+    assert len(archive.scan()["endtime"]) == 3
+
+
+def test_changed_days_are_compacted_again(archive, log_dir):
+    log = os.path.join(log_dir, "play_log_2026_10_13.json")
+    with open(log, "a") as f:
+        f.write(json.dumps(_play("late", "dave@example.com", "2026-10-13T23:59:00")) + "\n")
+    os.utime(log, (0, 0))
+
+    assert archive.compact_closed_days(log_dir, today="2026_10_14") == 1
+    assert archive.decode("track", archive.columns("2026_10_13")["track"]) == [
+        "spotify:track:a", "spotify:track:late"]
+    assert archive.compact_closed_days(log_dir, today="2026_10_14") == 0
+
+
+def test_pending_logs_skip_archived_days(archive, log_dir):
+    assert [os.path.basename(f) for f in archive.pending_logs(log_dir)] == ["play_log_2026_10_14.json"]
+    cols = archive.scan(columns=("track",), jams=True)
+    assert cols["jam_play"].tolist() == [0]
+    assert archive.decode("user", cols["jam_users"]) == ["bob@example.com"]
@@ -0,0 +1,125 @@
+import json
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _line(track, minute=0):
+    return json.dumps({"src": "spotify", "trackid": "spotify:track:%s" % track,
+                       "user": "alice@example.com", "endtime": "2026-10-12T20:%02d:00" % minute,
+                       "jam": []})
+
+
+@pytest.fixture
+def writer():
+    from play_log import PlayLogWriter
+
+    return PlayLogWriter(fsync="always", compress=True)
+
+
+def test_writes_are_buffered_until_flush(writer, tmp_path):
+    path = str(tmp_path / "play_log_2026_10_12.json")
+    writer.write(path, _line("a"))
+    assert not os.path.exists(path)
+
+    assert writer.flush() == 1
+    with open(path) as f:
+        assert f.read() == _line("a") + "\n"
+
+
+def test_failed_flush_keeps_lines(writer, tmp_path):
+    path = str(tmp_path / "missing" / "play_log_2026_10_12.json")
+    writer.write(path, _line("a"))
+
+    with pytest.raises(OSError):
+        writer.flush()
+    os.makedirs(os.path.dirname(path))
+    assert writer.flush() == 1
+
+
+def test_writes_during_flush_are_neither_lost_nor_repeated(writer, tmp_path, monkeypatch):
+    import play_log
+
+    monkeypatch.setattr(play_log, "_MAX_BUFFERED", 2)
+    path = str(tmp_path / "play_log_2026_10_12.json")
+    writer.write(path, _line("a"))
+    writer.write(path, _line("b"))
+
+    # Lines logged while the batch is on disk fill (and overflow) a new buffer
+    real_open = writer._open
+
+    def open_and_log(p):
+        for track in "cde":
+            writer.write(path, _line(track))
+        return real_open(p)
+
+    monkeypatch.setattr(writer, "_open", open_and_log)
+    assert writer.flush() == 2
+    monkeypatch.setattr(writer, "_open", real_open)
+    assert writer.flush() == 2
+    with open(path) as f:
+        assert f.read() == "".join(_line(t) + "\n" for t in "abde")
+
+
+def test_failed_flush_requeues_batch_within_cap(writer, tmp_path, monkeypatch):
+    import play_log
+
+    monkeypatch.setattr(play_log, "_MAX_BUFFERED", 3)
+    path = str(tmp_path / "missing" / "play_log_2026_10_12.json")
+    writer.write(path, _line("a"))
+    writer.write(path, _line("b"))
+    real_open = writer._open
+
+    def fail_after_logging(p):
+        writer.write(path, _line("c"))
+        writer.write(path, _line("d"))
+        return real_open(p)
+
+    monkeypatch.setattr(writer, "_open", fail_after_logging)
+    with pytest.raises(OSError):
+        writer.flush()
+    assert [json.loads(line)["trackid"][-1] for _, line in writer._buffer] == ["b", "c", "d"]
+
+
+def test_new_day_rotates_and_compresses_previous(writer, tmp_path):
+    from history import iter_logged_plays, play_log_files
+
+    day1 = str(tmp_path / "play_log_2026_10_12.json")
+    day2 = str(tmp_path / "play_log_2026_10_13.json")
+    writer.write(day1, _line("a"))
+    writer.flush()
+    writer.write(day2, _line("b"))
+    writer.flush()
+
+    assert play_log_files(str(tmp_path)) == [day1 + ".gz", day2]
+    assert [p["trackid"] for p in iter_logged_plays(play_log_files(str(tmp_path)))] == [
+        "spotify:track:a", "spotify:track:b"]
+
+    # A late line for the closed day is appended as another gzip member
+    writer.write(day1, _line("late"))
+    writer.write(day2, _line("c"))
+    writer.flush()
+    assert len(list(iter_logged_plays([day1 + ".gz"]))) == 2
+    assert not os.path.exists(day1)
+
+
+def test_loader_reads_gzipped_day_once(tmp_path):
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    from history import PlayHistory
+    from play_log import compress_closed_logs
+
+    (tmp_path / "play_log_2026_10_12.json").write_text(_line("a") + "\n" + _line("b", 1) + "\n")
+    assert compress_closed_logs(str(tmp_path), today="2026_10_13") == 1
+
+    history = PlayHistory(types.SimpleNamespace(_r=fakeredis.FakeRedis(decode_responses=True)),
+                          archive_path=str(tmp_path / "history.sqlite3"))
+    log_files = [str(tmp_path / "play_log_2026_10_12.json.gz")]
+    assert history.load_play_logs(log_files)["plays"] == 2
+    assert history.load_play_logs(log_files)["files"] == 0
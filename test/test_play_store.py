@@ -0,0 +1,232 @@
+import json
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def history(fake_redis, tmp_path):
+    from history import PlayHistory
+
+    return PlayHistory(types.SimpleNamespace(_r=fake_redis),
+                       archive_path=str(tmp_path / "history.sqlite3"))
+
+
+def _play(track, user, minute, jam=(), artist="Band"):
+    return {"src": "spotify", "trackid": "spotify:track:%s" % track, "user": user,
+            "artist": artist, "endtime": "2026-10-12T20:%02d:00" % minute,
+            "jam": [{"user": j} for j in jam]}
+
+
+def test_plays_are_deduplicated(history, fake_redis):
+    from history import PLAYS_KEY
+
+    play = _play("a", "alice@example.com", 1)
+    history.add_play(play)
+    history.add_play(json.dumps(play))
+
+    assert history.num_plays() == 1
+    assert fake_redis.hlen(PLAYS_KEY) == 1
+
+
+def test_indexes_answer_user_jam_track_and_artist(history):
+    history.add_play(_play("b", "alice@example.com", 3, jam=["bob@example.com"]))
+    history.add_play(_play("a", "alice@example.com", 1, artist="Other"))
+    history.add_play(_play("c", "bob@example.com", 2, jam=["alice@example.com"]))
+    history.add_play(_play("d", "alice@example.com", 4, jam=["dailymix@spotify.com"]))
+
+    assert [p["trackid"][-1] for p in history.get_user_plays("alice@example.com")] == ["a", "b"]
+    assert [p["trackid"][-1] for p in history.get_user_jams("bob@example.com")] == ["b"]
+    assert [p["trackid"][-1] for p in history.get_track_plays("spotify:track:c")] == ["c"]
+    assert [p["trackid"][-1] for p in history.get_artist_plays("Band")] == ["c", "b", "d"]
+    assert [p["trackid"][-1] for p in history.get_plays(2)] == ["b", "d"]
+    assert history.get_play(0)["trackid"] == "spotify:track:a"
+
+
+def test_legacy_plays_are_migrated(history, fake_redis):
+    from history import LEGACY_PLAYS_KEY
+
+    legacy = [_play("a", "alice@example.com", 1), _play("b", "bob@example.com", 2)]
+    fake_redis.zadd(LEGACY_PLAYS_KEY, {json.dumps(p, sort_keys=True): i for i, p in enumerate(legacy)})
+    fake_redis.zadd(LEGACY_PLAYS_KEY, {"not json": 5})
+
+    assert [p["user"] for p in history.get_plays(10)] == ["alice@example.com", "bob@example.com"]
+    assert not fake_redis.exists(LEGACY_PLAYS_KEY)
+
+    history.add_play(legacy[0])
+    assert history.num_plays() == 2
+
+
+def test_store_is_not_ready_while_another_process_migrates(history, fake_redis):
+    from history import LEGACY_PLAYS_KEY, _MIGRATE_LOCK_KEY
+
+    fake_redis.zadd(LEGACY_PLAYS_KEY, {json.dumps(_play("a", "alice@example.com", 1)): 0})
+    fake_redis.set(_MIGRATE_LOCK_KEY, 1)
+
+    history.ensure_play_store()
+    assert not history._play_store_ready
+    assert fake_redis.exists(LEGACY_PLAYS_KEY)
+
+    # The other process died; once its lock expires this one takes over
+    fake_redis.delete(_MIGRATE_LOCK_KEY)
+    assert [p["user"] for p in history.get_plays(10)] == ["alice@example.com"]
+    assert history._play_store_ready
+    assert not fake_redis.exists(LEGACY_PLAYS_KEY)
+
+
+def test_loader_resumes_from_recorded_offsets(history, tmp_path):
+    log = tmp_path / "play_log_2026_10_12.json"
+    log.write_text(json.dumps(_play("a", "alice@example.com", 1)) + "\nnot json\n")
+
+    stats = history.load_play_logs([str(log)], batch_size=1)
+    assert (stats["files"], stats["lines"], stats["plays"]) == (1, 2, 1)
+    assert history.load_play_logs([str(log)])["lines"] == 0
+
+    with open(log, "a") as f:
+        f.write(json.dumps(_play("b", "bob@example.com", 2)) + "\n")
+        f.write(json.dumps(_play("c", "bob@example.com", 3)))  # still being written
+
+    stats = history.load_play_logs([str(log)])
+    assert (stats["lines"], stats["plays"]) == (1, 1)
+    assert [p["trackid"][-1] for p in history.get_user_plays("bob@example.com")] == ["b"]
+
+
+def test_pages_cover_range_once_with_tied_endtimes(history):
+    from history import parse_play_time
+
+    for n in range(7):
+        history.add_play(_play("t%d" % n, "alice@example.com", 10 + n // 3))
+    history.add_play(_play("late", "alice@example.com", 50))
+
+    seen, cursor = [], None
+    while True:
+        plays, cursor = history.get_plays_page(end=parse_play_time("2026-10-12T20:30:00"),
+                                                cursor=cursor, limit=2)
+        seen.extend(p["trackid"] for p in plays)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted("spotify:track:t%d" % n for n in range(7))
+
+    # Tiny batches still get past a run of ties
+    assert len(list(history.iter_plays(cursor=None, batch_size=1))) == 8
+
+
+def test_range_filters_by_user_and_track(history):
+    from history import parse_play_time
+
+    history.add_play(_play("a", "alice@example.com", 1))
+    history.add_play(_play("a", "bob@example.com", 2))
+    history.add_play(_play("b", "bob@example.com", 3))
+
+    start = parse_play_time("2026-10-12T20:02:00")
+    assert [p["user"] for p, _ in history.iter_plays(track="spotify:track:a")] == [
+        "alice@example.com", "bob@example.com"]
+    assert [p["trackid"] for p, _ in history.iter_plays(start=start, user="bob@example.com",
+                                                         track="spotify:track:a")] == ["spotify:track:a"]
+
+
+def test_new_plays_update_leaderboards(history, fake_redis):
+    from datetime import datetime, timedelta
+
+    # Leaderboard keys expire a while after their period, so use recent plays
+    day = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=1)
+
+    def recent(play, minute):
+        return dict(play, endtime=(day + timedelta(minutes=minute)).isoformat())
+
+    history.add_play(recent(_play("a", "alice@example.com", 0,
+                                  jam=["bob@example.com", "carol@example.com"]), 1))
+    history.add_play(recent(_play("a", "bob@example.com", 0, artist="Other"), 2))
+    history.add_play(recent(_play("b", "the@echonest.com", 0), 3))
+    history.add_play(recent(_play("b", "the@echonest.com", 0), 3))  # duplicate, not counted
+
+    assert history.get_leaderboard("track", "day", day) == [
+        ("spotify:track:a", 2), ("spotify:track:b", 1)]
+    assert history.get_leaderboard("user", "week", day) == [
+        ("bob@example.com", 1), ("alice@example.com", 1)]
+    assert history.get_leaderboard("jam", "week", day, limit=1) == [("spotify:track:a", 2)]
+    assert history.get_unique_listeners("day", day) == 3
+    assert history.get_leaderboard("track", "day", day - timedelta(days=1)) == []
+
+
+def test_old_backfilled_plays_skip_leaderboards(history, fake_redis):
+    old = dict(_play("a", "alice@example.com", 1), endtime="2019-01-01T20:00:00")
+    history.add_play(old)
+
+    assert history.num_plays() == 1
+    assert not fake_redis.keys("LEADERBOARD|*")
+
+
+def test_history_spans_redis_and_archive(history, fake_redis, monkeypatch):
+    from datetime import datetime, timedelta
+    from config import CONF
+    from history import PLAYS_KEY
+
+    monkeypatch.setattr(CONF, "HISTORY_REDIS_DAYS", 30, raising=False)
+    now = datetime.now().replace(microsecond=0)
+
+    def aged(track, days):
+        return dict(_play(track, "alice@example.com", 0, jam=["bob@example.com"]),
+                    endtime=(now - timedelta(days=days)).isoformat())
+
+    history.add_play(aged("old", 100))
+    history.add_play(aged("old", 100))      # deduped by the archive
+    history.add_play(aged("mid", 20))
+    history.add_play(aged("new", 1))
+    assert fake_redis.hlen(PLAYS_KEY) == 2
+    assert history.num_plays() == 3
+
+    # The window moves on; the mid play is archived
+    monkeypatch.setattr(CONF, "HISTORY_REDIS_DAYS", 10, raising=False)
+    assert history.trim_recent_history() == 1
+    assert fake_redis.hlen(PLAYS_KEY) == 1
+    assert fake_redis.zcard("PLAYHISTORY|user:alice@example.com") == 1
+
+    expected = ["spotify:track:old", "spotify:track:mid", "spotify:track:new"]
+    assert [p["trackid"] for p in history.get_user_plays("alice@example.com")] == expected
+    assert [p["trackid"] for p in history.get_user_jams("bob@example.com")] == expected
+    assert [p["trackid"] for p in history.get_plays(2)] == expected[1:]
+    assert history.get_play(0)["trackid"] == expected[0]
+
+    page, cursor = history.get_plays_page(limit=2)
+    rest, last = history.get_plays_page(cursor=cursor, limit=2)
+    assert [p["trackid"] for p in page + rest] == expected
+    assert last is None
+
+    # The archive is counted once, and reads past it never query SQLite
+    monkeypatch.setattr(history.archive, "count", lambda: pytest.fail("recounted archive"))
+    monkeypatch.setattr(history.archive, "rows_at", lambda *a: pytest.fail("queried archive"))
+    assert history.get_play(2)["trackid"] == expected[2]
+
+
+def test_trim_drops_unreadable_plays_from_indexes(history, fake_redis, monkeypatch):
+    from datetime import datetime, timedelta
+    from config import CONF
+    from history import PLAYS_KEY
+
+    monkeypatch.setattr(CONF, "HISTORY_REDIS_DAYS", 30, raising=False)
+    endtime = (datetime.now() - timedelta(days=20)).replace(microsecond=0).isoformat()
+    history.add_play(dict(_play("a", "alice@example.com", 0, jam=["bob@example.com"]), endtime=endtime))
+    history.add_play(dict(_play("b", "alice@example.com", 0), endtime=endtime))
+    broken, = [pid for pid, play in fake_redis.hgetall(PLAYS_KEY).items() if "track:a" in play]
+    fake_redis.hset(PLAYS_KEY, broken, "not json")
+
+    monkeypatch.setattr(CONF, "HISTORY_REDIS_DAYS", 10, raising=False)
+    assert history.trim_recent_history() == 2
+    assert [p["trackid"] for p in history.get_user_plays("alice@example.com")] == ["spotify:track:b"]
+    assert not fake_redis.keys("PLAYHISTORY|jammer:*")
+    assert not fake_redis.keys("PLAYHISTORY|track:*")
+    assert not fake_redis.keys("PLAYHISTORY|artist:*")
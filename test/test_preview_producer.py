@@ -0,0 +1,124 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def db(fake_redis, monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    from db import DB
+
+    db = DB(init_history_to_redis=False, redis_client=fake_redis)
+    db._msg = lambda *args, **kwargs: None
+    monkeypatch.setattr(db, "ensure_fill_songs", lambda: None)
+    fake_redis.rpush(db._key("BENDER|cache:genre"), "spotify:track:a", "spotify:track:b")
+    for track in ("a", "b"):
+        fake_redis.hset(db._key("FILL-INFO|spotify:track:%s" % track),
+                        mapping={"title": "Song " + track, "artist": "Band", "img": "img"})
+    monkeypatch.setattr(db, "_select_strategy_excluding",
+                        lambda tried: None if "genre" in tried else "genre")
+    return db
+
+
+def test_queue_read_never_produces_preview(db, monkeypatch):
+    monkeypatch.setattr(db, "_peek_next_fill_song", lambda: pytest.fail("peeked on read"))
+
+    row = db.get_queued()[-1]
+
+    assert row["playlist_src"] is True
+    assert row["title"] == "Picking the next song..."
+
+
+def test_refreshed_preview_is_served(db):
+    db.refresh_preview()
+
+    row = db.get_additional_src()
+    assert row["trackid"] == "spotify:track:a"
+    assert row["title"] == "Band : Song a"
+    assert row["name"] == "Benderbot"
+    assert row["jam"] == []
+    assert row["dm_buttons"] is False
+    assert db._preview_is_current()
+
+
+def test_filter_makes_preview_stale_until_refresh(db):
+    db.refresh_preview()
+    db.benderfilter("spotify:track:a", "alice@example.com")
+
+    assert not db._preview_is_current()
+    assert db.get_additional_src()["title"] == "Picking the next song..."
+
+    db.refresh_preview()
+    assert db.get_additional_src()["trackid"] == "spotify:track:b"
+
+
+def test_no_candidates_stores_fallback(db, fake_redis):
+    fake_redis.delete(db._key("BENDER|cache:genre"))
+    db._fill_strategy_cache = lambda strategy, seed_info: 0
+    db._get_seed_info = lambda: None
+
+    db.refresh_preview()
+
+    assert db.get_additional_src()["title"] == "No songs available"
+    assert db._preview_is_current()
+
+
+def test_producer_refreshes_stale_preview(db, monkeypatch):
+    import gevent
+    import gevent.event
+
+    updates = []
+    monkeypatch.setattr(db, "_msg", updates.append)
+    wake = gevent.event.Event()
+    producer = gevent.spawn(db._preview_producer, wake, 0.01)
+    try:
+        wake.set()
+        gevent.sleep(0.05)
+    finally:
+        producer.kill()
+
+    assert db.get_additional_src()["trackid"] == "spotify:track:a"
+    assert updates == ["playlist_update"]
+
+
+def test_budget_refusal_keeps_candidates(db, fake_redis, monkeypatch):
+    from db import SpotifyBudgetExceeded
+
+    db.refresh_preview()
+    fake_redis.delete(db._key("FILL-INFO|spotify:track:a"))
+    fake_redis.delete(db._key("BENDER|preview-ready"))
+    monkeypatch.setattr(db, "get_spotify_song",
+                        lambda *a, **kw: (_ for _ in ()).throw(SpotifyBudgetExceeded("empty")))
+
+    assert db.refresh_preview() is None
+
+    assert fake_redis.lrange(db._key("BENDER|cache:genre"), 0, -1) == ["spotify:track:a", "spotify:track:b"]
+    assert fake_redis.hget(db._key("BENDER|next-preview"), "trackid") == "spotify:track:a"
+    assert not db._preview_is_current()
+
+
+def test_benderqueue_consumes_preview_only_after_add(db, fake_redis, monkeypatch):
+    from db import SpotifyBudgetExceeded
+
+    db.refresh_preview()
+    monkeypatch.setattr(db, "add_spotify_song",
+                        lambda *a, **kw: (_ for _ in ()).throw(SpotifyBudgetExceeded("empty")))
+
+    with pytest.raises(SpotifyBudgetExceeded):
+        db.benderqueue("spotify:track:a", "alice@example.com")
+
+    assert fake_redis.llen(db._key("BENDER|cache:genre")) == 2
+    assert fake_redis.hget(db._key("BENDER|next-preview"), "trackid") == "spotify:track:a"
+    assert not fake_redis.hget(db._key("BENDER|yield"), "genre:accepted")
@@ -0,0 +1,155 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+
+
+def _play(track, artist, user, minute, jams=()):
+    return {
+        "src": "spotify",
+        "trackid": "spotify:track:%s" % track,
+        "title": track.title(),
+        "artist": artist,
+        "duration": 200,
+        "user": user,
+        "jam": [{"user": j} for j in jams],
+        "endtime": "2026-10-12T%02d:%02d:00" % (20 + minute // 60, minute % 60),
+    }
+
+
+@pytest.fixture
+def plays():
+    # Two listening scenes that never mix, plus one late-night outlier
+    return [
+        _play("punk1", "Ramones", "alice@example.com", 0, jams=["bob@example.com"]),
+        _play("punk2", "The Clash", "bob@example.com", 4, jams=["alice@example.com"]),
+        _play("punk3", "Ramones", "alice@example.com", 8),
+        _play("jazz1", "Miles Davis", "carol@example.com", 60),
+        _play("jazz2", "John Coltrane", "dave@example.com", 64, jams=["carol@example.com"]),
+        _play("jazz3", "Miles Davis", "carol@example.com", 68),
+        _play("punk1", "Ramones", "the@echonest.com", 150),
+    ]
+
+
+@pytest.fixture
+def recommender(plays):
+    from recommender import OfflineRecommender
+
+    return OfflineRecommender().build(plays)
+
+
+def test_recommends_from_same_scene(recommender):
+    picks = recommender.recommend("spotify:track:punk1", limit=2, rng=np.random.default_rng(0))
+
+    assert sorted(picks) == ["spotify:track:punk2", "spotify:track:punk3"]
+
+
+def test_excludes_seed_and_excluded_tracks(recommender):
+    picks = recommender.recommend("spotify:track:jazz1", limit=5,
+                                  exclude=["spotify:track:jazz2"])
+
+    assert "spotify:track:jazz1" not in picks
+    assert "spotify:track:jazz2" not in picks
+    assert "spotify:track:jazz3" in picks
+
+
+def test_unknown_seed_falls_back_to_artist(recommender):
+    picks = recommender.recommend("spotify:track:never-played", artist_name="Miles Davis, Bill Evans",
+                                  limit=3)
+
+    assert picks
+    assert all(p.startswith("spotify:track:jazz") for p in picks)
+
+
+def test_cold_seed_falls_back_to_popular(recommender):
+    picks = recommender.recommend("spotify:track:never-played", limit=10)
+
+    assert len(picks) == 6
+
+
+def test_max_tracks_keeps_most_played(plays):
+    from recommender import OfflineRecommender
+
+    rec = OfflineRecommender(max_tracks=2).build(plays)
+
+    assert rec.n_tracks == 2
+    assert sorted(rec.recommend(limit=5)) == ["spotify:track:punk1", "spotify:track:punk2"]
+    assert rec.track_info("spotify:track:punk1")["artist"] == "Ramones"
+
+
+def test_offline_strategy_fills_while_rate_limited(tmp_path, monkeypatch, plays):
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+
+    import db as db_module
+    import recommender as recommender_module
+    from config import CONF
+
+    with open(tmp_path / "play_log_2026_10_12.json", "w") as f:
+        for play in plays:
+            f.write(json.dumps(play) + "\n")
+    monkeypatch.setattr(CONF, "LOG_DIR", str(tmp_path), raising=False)
+    monkeypatch.setattr(recommender_module, "_recommender", None)
+    recommender_module.refresh_recommender()
+    monkeypatch.setattr(db_module, "is_spotify_rate_limited", lambda: True)
+
+    r = fakeredis.FakeRedis(decode_responses=True)
+    d = db_module.DB(init_history_to_redis=False, nest_id="ABCDE", redis_client=r)
+    r.set(d._key("MISC|last-queued"), "spotify:track:jazz1")
+
+    user, track = d.get_fill_song()
+
+    assert user == "the@echonest.com"
+    assert track.startswith("spotify:track:jazz")
+    assert d.get_fill_info(track)["artist"] in ("Miles Davis", "John Coltrane")
+
+
+def test_fill_path_only_reads_built_model(tmp_path, monkeypatch, plays):
+    import recommender as recommender_module
+    from config import CONF
+
+    monkeypatch.setattr(CONF, "LOG_DIR", str(tmp_path), raising=False)
+    monkeypatch.setattr(recommender_module, "_recommender", None)
+    monkeypatch.setattr(recommender_module, "_recommender_signature", None)
+    with open(tmp_path / "play_log_2026_10_12.json", "w") as f:
+        for play in plays:
+            f.write(json.dumps(play) + "\n")
+
+    assert recommender_module.get_recommender() is None
+    assert recommender_module.refresh_recommender() is True
+    built = recommender_module.get_recommender()
+    assert built.n_tracks > 0
+    assert recommender_module.refresh_recommender() is False
+    assert recommender_module.get_recommender() is built
+
+
+def test_archived_days_build_the_same_model(tmp_path, plays):
+    from history import iter_logged_plays
+    from play_archive import PlayArchive, archive_dir
+    from recommender import OfflineRecommender
+
+    for day, day_plays in (("2026_10_11", plays[:4]), ("2026_10_12", plays[4:])):
+        with open(tmp_path / ("play_log_%s.json" % day), "w") as f:
+            for play in day_plays:
+                f.write(json.dumps(play) + "\n")
+    archive = PlayArchive(archive_dir(str(tmp_path)))
+    assert archive.compact_closed_days(str(tmp_path), today="2026_10_12") == 1
+    pending = archive.pending_logs(str(tmp_path))
+    assert [os.path.basename(f) for f in pending] == ["play_log_2026_10_12.json"]
+
+    from_logs = OfflineRecommender().build(plays)
+    from_archive = OfflineRecommender().build(iter_logged_plays(pending), archive)
+
+    assert from_archive._tracks == from_logs._tracks
+    assert from_archive.track_info("spotify:track:jazz2") == from_logs.track_info("spotify:track:jazz2")
+    np.testing.assert_allclose(from_archive._popularity, from_logs._popularity)
+    for seed in ("spotify:track:punk1", "spotify:track:jazz1"):
+        np.testing.assert_allclose(from_archive.scores(seed), from_logs.scores(seed))
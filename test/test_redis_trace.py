@@ -0,0 +1,82 @@
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def traced_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    from redis_trace import TracingRedis
+
+    return TracingRedis(connection_pool=fakeredis.FakeRedis(decode_responses=True).connection_pool)
+
+
+def test_counts_commands_and_round_trips(traced_redis):
+    import redis_trace
+
+    traced_redis.set("k", "1")   # untraced
+    with redis_trace.trace("GET /queue") as t:
+        traced_redis.get("k")
+        pipe = traced_redis.pipeline(transaction=False)
+        for i in range(8):
+            pipe.incr("n%d" % i)
+        pipe.execute()
+        with traced_redis.pipeline() as pipe:
+            pipe.watch("k")
+            pipe.get("k")
+            pipe.multi()
+            pipe.set("k", "2")
+            pipe.execute()
+
+    assert (t.commands, t.round_trips) == (12, 5)
+    assert t.by_command == {"GET": 2, "PIPELINE": 2, "WATCH": 1}
+    assert t.seconds > 0
+    assert redis_trace.current() is None
+
+
+def test_nested_traces_restore_the_outer_one(traced_redis):
+    import redis_trace
+
+    outer = redis_trace.start("GET /socket")
+    with redis_trace.trace("ws fetch_playlist") as inner:
+        traced_redis.get("k")
+    traced_redis.get("k")
+
+    assert redis_trace.finish() is outer
+    assert (outer.round_trips, inner.round_trips) == (1, 1)
+    assert redis_trace.finish() is None
+
+
+def test_round_trip_budget_and_headers(traced_redis, monkeypatch, caplog):
+    import redis_trace
+    from config import CONF
+
+    monkeypatch.setattr(CONF, "REDIS_TRACE_MAX_ROUND_TRIPS", 3, raising=False)
+    monkeypatch.setattr(CONF, "REDIS_TRACE", None, raising=False)
+    with caplog.at_level(logging.WARNING, logger="redis_trace"):
+        with redis_trace.trace("GET /stats") as t:
+            for i in range(4):
+                traced_redis.get("k%d" % i)
+    assert "GET /stats made 4 commands, 4 round trips" in caplog.text
+    assert redis_trace.response_headers(t) == {}
+
+    monkeypatch.setattr(CONF, "REDIS_TRACE", True)
+    headers = redis_trace.response_headers(t)
+    assert headers["X-Redis-Commands"] == "4"
+    assert headers["X-Redis-Round-Trips"] == "4"
+
+
+def test_slow_commands_are_logged(traced_redis, monkeypatch, caplog):
+    from config import CONF
+
+    monkeypatch.setattr(CONF, "REDIS_SLOW_COMMAND_MS", 0, raising=False)
+    with caplog.at_level(logging.WARNING, logger="redis_trace"):
+        traced_redis.get("k")
+    assert "Slow Redis GET" in caplog.text
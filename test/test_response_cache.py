@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def client_and_calls(tmp_path):
+    from flask import Flask, jsonify
+    from response_cache import ResponseCache
+
+    cache = ResponseCache(max_entries=2)
+    guide = tmp_path / "guide.md"
+    guide.write_text("v1")
+    calls = []
+    version = [0]
+    app = Flask(__name__)
+
+    @app.route("/ttl")
+    @cache.cached(ttl=60)
+    def ttl_view():
+        calls.append("ttl")
+        return jsonify(calls=len(calls))
+
+    @app.route("/file")
+    @cache.cached(files=[str(guide)])
+    def file_view():
+        calls.append("file")
+        return guide.read_text()
+
+    @app.route("/versioned")
+    @cache.cached(version=lambda: version[0])
+    def versioned_view():
+        calls.append("versioned")
+        return "v%d" % version[0]
+
+    @app.route("/missing")
+    @cache.cached(ttl=60)
+    def missing_view():
+        calls.append("missing")
+        return "nope", 404
+
+    return app.test_client(), calls, guide, version
+
+
+def test_hits_are_served_from_memory_with_etag(client_and_calls):
+    client, calls, _, _ = client_and_calls
+
+    first = client.get("/ttl")
+    second = client.get("/ttl")
+    assert calls == ["ttl"]
+    assert first.get_json() == second.get_json() == {"calls": 1}
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert second.headers["Last-Modified"]
+    assert "max-age=60" in second.headers["Cache-Control"]
+
+    not_modified = client.get("/ttl", headers={"If-None-Match": first.headers["ETag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b""
+    assert calls == ["ttl"]
+
+
+def test_file_and_version_changes_invalidate(client_and_calls):
+    client, calls, guide, version = client_and_calls
+
+    etag = client.get("/file").headers["ETag"]
+    assert client.get("/file", headers={"If-None-Match": etag}).status_code == 304
+    guide.write_text("v2")
+    os.utime(guide, (1, 1))
+    changed = client.get("/file", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.data == b"v2"
+
+    assert client.get("/versioned").data == b"v0"
+    version[0] = 1
+    assert client.get("/versioned").data == b"v1"
+    assert calls == ["file", "file", "versioned", "versioned"]
+
+
+def test_errors_are_not_cached(client_and_calls):
+    client, calls, _, _ = client_and_calls
+
+    assert client.get("/missing").status_code == 404
+    assert client.get("/missing").status_code == 404
+    assert calls == ["missing", "missing"]
@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def spotify(monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    import db as db_module
+
+    client = MagicMock()
+    client.track.side_effect = lambda track_id: {
+        "artists": [{"id": "artist-" + track_id[:1], "name": "Artist " + track_id[:1]}],
+        "album": {"id": "album-" + track_id},
+    }
+    client.artist.return_value = {"genres": ["funk", "soul"]}
+    monkeypatch.setattr(db_module, "spotify_client", client)
+    monkeypatch.setattr(db_module, "acquire_spotify_budget", lambda priority, cost=1: True)
+    return client
+
+
+def test_nests_with_same_seed_share_resolution(fake_redis, spotify):
+    from db import DB
+
+    infos = []
+    for nest_id in ("AAAAA", "BBBBB"):
+        nest_db = DB(init_history_to_redis=False, nest_id=nest_id, redis_client=fake_redis)
+        fake_redis.set(nest_db._key("MISC|last-queued"), "spotify:track:a1")
+        infos.append(nest_db._get_seed_info())
+
+    assert infos[0] == infos[1]
+    assert infos[0]["genres"] == ["funk", "soul"]
+    assert infos[0]["album_id"] == "album-a1"
+    assert spotify.track.call_count == 1
+    assert spotify.artist.call_count == 1
+
+
+def test_artist_genres_shared_across_seeds(fake_redis, spotify):
+    from db import get_seed_info
+
+    get_seed_info(fake_redis, "spotify:track:a1")
+    info = get_seed_info(fake_redis, "spotify:track:a2")
+
+    assert info["artist_id"] == "artist-a"
+    assert spotify.track.call_count == 2
+    assert spotify.artist.call_count == 1
+
+
+def test_stale_entry_is_served_and_refreshed_once(fake_redis, spotify, monkeypatch):
+    import db as db_module
+
+    db_module.get_seed_info(fake_redis, "spotify:track:a1")
+    fake_redis.hset("SPOTIFY|seed:spotify:track:a1", "fetched_at", time.time() - 2 * 24 * 3600)
+    spawned = []
+    monkeypatch.setattr(db_module.gevent, "spawn", lambda fn, *args: spawned.append(args))
+
+    assert db_module.get_seed_info(fake_redis, "spotify:track:a1")["artist_name"] == "Artist a"
+    assert db_module.get_seed_info(fake_redis, "spotify:track:a1") is not None
+
+    assert spawned == [(fake_redis, "spotify:track:a1")]
+    assert spotify.track.call_count == 1
+
+
+def test_warm_seed_cache_covers_themed_nests(fake_redis, spotify):
+    from db import warm_seed_cache
+    from nests import NEST_SEED_MAP
+
+    seeds = {uri for uri, _ in NEST_SEED_MAP.values()}
+    assert warm_seed_cache(fake_redis) == len(seeds) + 1
+    calls = spotify.track.call_count
+
+    assert warm_seed_cache(fake_redis) == 0
+    assert spotify.track.call_count == calls
@@ -0,0 +1,138 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _budget(fake_redis, clock, **kwargs):
+    from spotify_budget import SpotifyBudget
+
+    kwargs.setdefault("rate", 1.0)
+    kwargs.setdefault("burst", 10)
+    kwargs.setdefault("lease_size", 1)
+    return SpotifyBudget(fake_redis, clock=clock, **kwargs)
+
+
+def test_background_backs_off_at_reserve_floor(fake_redis):
+    from spotify_budget import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+    budget = _budget(fake_redis, FakeClock())
+
+    granted = sum(budget.acquire(PRIORITY_BACKGROUND) for _ in range(10))
+
+    # Background may only drain the bucket down to half capacity
+    assert granted == 5
+    assert budget.acquire(PRIORITY_INTERACTIVE) is True
+
+
+def test_metadata_reserve_sits_between_classes(fake_redis):
+    from spotify_budget import PRIORITY_METADATA, PRIORITY_INTERACTIVE
+
+    budget = _budget(fake_redis, FakeClock(), burst=8)
+
+    granted = sum(budget.acquire(PRIORITY_METADATA) for _ in range(8))
+    assert granted == 6
+    assert sum(budget.acquire(PRIORITY_INTERACTIVE) for _ in range(8)) == 2
+
+
+def test_bucket_refills_over_time(fake_redis):
+    from spotify_budget import PRIORITY_INTERACTIVE
+
+    clock = FakeClock()
+    budget = _budget(fake_redis, clock)
+    for _ in range(10):
+        assert budget.acquire(PRIORITY_INTERACTIVE)
+    assert budget.acquire(PRIORITY_INTERACTIVE) is False
+
+    clock.now += 3
+    assert sum(budget.acquire(PRIORITY_INTERACTIVE) for _ in range(5)) == 3
+
+
+def test_lease_is_spent_locally(fake_redis):
+    from spotify_budget import PRIORITY_INTERACTIVE, BUDGET_KEY
+
+    budget = _budget(fake_redis, FakeClock(), lease_size=4)
+
+    assert budget.acquire(PRIORITY_INTERACTIVE)
+    assert float(fake_redis.hget(BUDGET_KEY, "tokens")) == 6
+
+    fake_redis.delete(BUDGET_KEY)
+    for _ in range(3):
+        assert budget.acquire(PRIORITY_INTERACTIVE)
+    # Lease was used up without touching Redis again
+    assert fake_redis.exists(BUDGET_KEY) == 0
+
+
+def test_bucket_is_shared_between_processes(fake_redis):
+    from spotify_budget import PRIORITY_INTERACTIVE
+
+    clock = FakeClock()
+    worker_a = _budget(fake_redis, clock)
+    worker_b = _budget(fake_redis, clock)
+
+    for _ in range(6):
+        assert worker_a.acquire(PRIORITY_INTERACTIVE)
+    assert sum(worker_b.acquire(PRIORITY_INTERACTIVE) for _ in range(10)) == 4
+
+
+def test_drain_empties_bucket(fake_redis):
+    from spotify_budget import PRIORITY_INTERACTIVE
+
+    budget = _budget(fake_redis, FakeClock(), lease_size=5)
+    assert budget.acquire(PRIORITY_INTERACTIVE)
+
+    budget.drain()
+
+    assert budget.acquire(PRIORITY_INTERACTIVE) is False
+    assert budget.state()["tokens"] == 0
+
+
+def test_rate_limit_window_is_cached_locally(monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    import db as db_module
+
+    calls = []
+
+    class CountingRedis:
+        def ttl(self, key):
+            calls.append(key)
+            return 120
+
+    monkeypatch.setattr(db_module, "_get_rate_limit_redis", lambda: CountingRedis())
+    monkeypatch.setattr(db_module, "_rate_limit_cache", {"until": 0.0, "checked": 0.0})
+
+    assert db_module.is_spotify_rate_limited() is True
+    assert db_module.is_spotify_rate_limited() is True
+    assert calls == ["MISC|spotify-rate-limited"]
+
+
+def test_retry_after_follows_rate_limit_window(monkeypatch):
+    monkeypatch.setenv("SKIP_SPOTIFY_PREFETCH", "1")
+    import db as db_module
+
+    monkeypatch.setattr(db_module, "_rate_limit_cache",
+                        {"until": db_module.time.time() + 42.5, "checked": 0.0})
+    assert db_module.spotify_retry_after() == 43
+
+    monkeypatch.setattr(db_module, "_rate_limit_cache", {"until": 0.0, "checked": 0.0})
+    monkeypatch.setattr(db_module, "_spotify_budget", _budget(None, FakeClock(), rate=0.5))
+    assert db_module.spotify_retry_after() == 2
@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    try:
+        import fakeredis
+    except ImportError:
+        pytest.skip("fakeredis not installed")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def history(fake_redis, tmp_path):
+    from history import PlayHistory
+
+    return PlayHistory(types.SimpleNamespace(_r=fake_redis),
+                       archive_path=str(tmp_path / "history.sqlite3"))
+
+
+def _play(track, user, endtime, src="spotify"):
+    return {"src": src, "trackid": "spotify:track:%s" % track, "user": user,
+            "endtime": endtime, "jam": []}
+
+
+MONDAY = "2026-10-12T20:00:00"
+TUESDAY = "2026-10-13T20:00:00"
+
+
+def test_add_play_indexes_by_weekday(history, fake_redis):
+    from history import THROWBACK_INDEX_KEY
+
+    history.add_play(_play("a", "alice@example.com", MONDAY))
+    history.add_play(_play("b", "bob@example.com", TUESDAY))
+    history.add_play(_play("c", "the@echonest.com", MONDAY))
+    history.add_play(dict(_play("d", "alice@example.com", MONDAY), src="youtube"))
+
+    assert fake_redis.hgetall(THROWBACK_INDEX_KEY % 0) == {"spotify:track:a": "alice@example.com"}
+    assert fake_redis.hgetall(THROWBACK_INDEX_KEY % 1) == {"spotify:track:b": "bob@example.com"}
+
+
+def test_sample_is_distinct_and_limited(history, fake_redis):
+    from history import THROWBACK_INDEX_BUILT_KEY
+
+    fake_redis.set(THROWBACK_INDEX_BUILT_KEY, "1")
+    for i in range(30):
+        history.add_play(_play("t%d" % i, "alice@example.com", MONDAY.replace(":00:", ":%02d:" % i)))
+    history.add_play(_play("t0", "alice@example.com", "2026-10-19T21:00:00"))
+
+    plays = history.get_throwback_plays(day_of_week=0, limit=20)
+
+    assert len(plays) == 20
+    assert len({p["trackid"] for p in plays}) == 20
+    assert all(p["user"] == "alice@example.com" for p in plays)
+    assert history.get_throwback_plays(day_of_week=3) == []
+
+
+def test_backfills_from_logs_once(history, fake_redis, tmp_path, monkeypatch):
+    from config import CONF
+    from history import THROWBACK_INDEX_BUILT_KEY
+
+    with open(tmp_path / "play_log_2026_10_12.json", "w") as f:
+        f.write(json.dumps(_play("old", "carol@example.com", MONDAY)) + "\n")
+        f.write("{broken\n")
+    monkeypatch.setattr(CONF, "LOG_DIR", str(tmp_path), raising=False)
+
+    assert history.get_throwback_plays(day_of_week=0) == [
+        {"trackid": "spotify:track:old", "user": "carol@example.com"}]
+    assert fake_redis.exists(THROWBACK_INDEX_BUILT_KEY)
+
+    # A second process sees the built flag and doesn't rescan
+    from history import PlayHistory
+    other = PlayHistory(types.SimpleNamespace(_r=fake_redis))
+    monkeypatch.setattr(other, "build_throwback_index", lambda: pytest.fail("rebuilt index"))
+    assert len(other.get_throwback_plays(day_of_week=0)) == 1
+
+
+def test_backfill_reads_archived_days_as_columns(history, fake_redis, tmp_path, monkeypatch):
+    import history as history_module
+    from config import CONF
+    from history import THROWBACK_INDEX_KEY
+    from play_archive import PlayArchive
+
+    with open(tmp_path / "play_log_2026_10_12.json", "w") as f:
+        for play in (_play("a", "alice@example.com", MONDAY),
+                     _play("a", "bob@example.com", "2026-10-12T21:00:00"),
+                     _play("b", "the@echonest.com", MONDAY)):
+            f.write(json.dumps(play) + "\n")
+    with open(tmp_path / "play_log_2026_10_13.json", "w") as f:
+        f.write(json.dumps(_play("c", "carol@example.com", TUESDAY)) + "\n")
+    monkeypatch.setattr(CONF, "LOG_DIR", str(tmp_path), raising=False)
+    assert PlayArchive().compact_closed_days(today="2026_10_13") == 1
+
+    parsed = []
+    real_iter = history_module.iter_logged_plays
+    monkeypatch.setattr(history_module, "iter_logged_plays",
+                        lambda log_files=None: (parsed.append(log_files) or real_iter(log_files)))
+
+    history.build_throwback_index()
+
+    assert fake_redis.hgetall(THROWBACK_INDEX_KEY % 0) == {"spotify:track:a": "bob@example.com"}
+    assert fake_redis.hgetall(THROWBACK_INDEX_KEY % 1) == {"spotify:track:c": "carol@example.com"}
+    assert [[os.path.basename(f) for f in files] for files in parsed] == [["play_log_2026_10_13.json"]]